@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+ANN index benchmark for PharmGPT
+Measures recall@10, query latency and memory of utils.ann_index.IVFIndex against brute-force search,
+with full-precision and int8/binary quantized candidate scoring
+"""
+
+import os
+import sys
+import time
+import logging
+import argparse
+import tempfile
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from utils.ann_index import DEFAULT_NPROBE, IVFIndex
+
+
+def make_embeddings(count: int, dimensions: int, topics: int, seed: int = 0):
+    """Clustered unit vectors: chunks of one document sit near a shared topic direction."""
+    rng = np.random.default_rng(seed)
+    centres = rng.normal(size=(topics, dimensions)).astype(np.float32)
+    labels = rng.integers(0, topics, count)
+    vectors = centres[labels] + rng.normal(scale=1.5, size=(count, dimensions)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def brute_force(vectors, queries, k: int):
+    """Exact top-k row ids per query."""
+    scores = queries @ vectors.T
+    top = np.argpartition(scores, -k, axis=1)[:, -k:]
+    return [set(row) for row in top]
+
+
+def recall_and_latency(index, queries, truth, k: int, nprobe: int):
+    """(recall@k, ms/query) of an index against the exact top k."""
+    started = time.perf_counter()
+    results = [index.search_ids(query, k, nprobe)[0] for query in queries]
+    elapsed_ms = (time.perf_counter() - started) / len(queries) * 1000
+    hits = sum(len(expected.intersection(found.tolist())) for found, expected in zip(results, truth))
+    return hits / (len(queries) * k), elapsed_ms
+
+
+def timed(fn, *args):
+    started = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the local IVF index against brute force")
+    parser.add_argument('--vectors', type=int, default=50000)
+    parser.add_argument('--dimensions', type=int, default=1024, help="mistral-embed dimensions")
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--ingest-batch', type=int, default=64, help="Chunks per incremental add")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    total = args.vectors + args.queries
+    data = make_embeddings(total, args.dimensions, topics=max(1, args.vectors // 500))
+    vectors, queries = data[:args.vectors], data[args.vectors:]
+    rows = [{'document_id': f"doc-{i // 50}", 'chunk_index': i % 50} for i in range(args.vectors)]
+
+    # Bulk build (first search for a user), then incremental adds of the last 10% (ingest)
+    initial = int(args.vectors * 0.9)
+    index = IVFIndex()
+    _, build_seconds = timed(index.add, rows[:initial], vectors[:initial])
+    started = time.perf_counter()
+    for start in range(initial, args.vectors, args.ingest_batch):
+        index.add(rows[start:start + args.ingest_batch], vectors[start:start + args.ingest_batch])
+    ingest_seconds = time.perf_counter() - started
+    ingested = args.vectors - initial
+
+    with tempfile.TemporaryDirectory() as directory:
+        _, save_seconds = timed(index.save, directory)
+        index, load_seconds = timed(IVFIndex.load, directory)
+
+    print(f"{args.vectors:,} vectors x {args.dimensions} dims, {index.nlist} lists, "
+          f"{index.nbytes / 1024 / 1024:.0f} MB")
+    print(f"build {build_seconds:.2f}s for {initial:,}, incremental add {ingest_seconds / ingested * 1000:.3f} ms/chunk, "
+          f"save {save_seconds:.2f}s, load {load_seconds:.2f}s\n")
+
+    truth = brute_force(vectors, queries, args.k)
+    started = time.perf_counter()
+    for query in queries:
+        scores = vectors @ query
+        np.argpartition(scores, -args.k)[-args.k:]
+    brute_ms = (time.perf_counter() - started) / len(queries) * 1000
+
+    print(f"{'search':<16}{'ms/query':>10}{'speedup':>9}{f'recall@{args.k}':>11}")
+    print(f"{'brute force':<16}{brute_ms:>10.2f}{1.0:>8.1f}x{1.0:>11.3f}")
+    for nprobe in (1, 2, 4, 8, 16, 32):
+        if nprobe > index.nlist:
+            break
+        recall, elapsed_ms = recall_and_latency(index, queries, truth, args.k, nprobe)
+        print(f"{f'IVF nprobe={nprobe}':<16}{elapsed_ms:>10.2f}{brute_ms / elapsed_ms:>8.1f}x{recall:>11.3f}")
+
+    # Quantized prefiltering with exact rescoring; float vectors memory-mapped after reload
+    print(f"\n{'quantization':<16}{'bytes/vec':>10}{'resident MB':>13}{'probe':>8}{'ms/query':>10}{f'recall@{args.k}':>11}")
+    for quantization in ('none', 'int8', 'binary'):
+        quantized = IVFIndex(quantization=quantization)
+        quantized.add(rows, vectors)
+        with tempfile.TemporaryDirectory() as directory:
+            quantized.save(directory)
+            quantized = IVFIndex.load(directory, quantization=quantization)
+            per_vector = quantized.codes.shape[1] if quantized.codes is not None else args.dimensions * 4
+            for nprobe in (DEFAULT_NPROBE, quantized.nlist):
+                recall, elapsed_ms = recall_and_latency(quantized, queries, truth, args.k, nprobe)
+                probe = 'all' if nprobe >= quantized.nlist else str(nprobe)
+                print(f"{quantization:<16}{per_vector:>10}{quantized.nbytes / 1024 / 1024:>13.1f}"
+                      f"{probe:>8}{elapsed_ms:>10.2f}{recall:>11.3f}")
+            del quantized  # Release the memory map before the directory is removed
+
+
+if __name__ == "__main__":
+    main()
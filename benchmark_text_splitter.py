@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Text splitter benchmark for PharmGPT
+Compares utils.text_splitter.TextSplitter with LangChain's RecursiveCharacterTextSplitter
+"""
+
+import os
+import sys
+import time
+import random
+import logging
+import argparse
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from utils.text_splitter import TextSplitter
+
+try:
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+except ImportError:
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+# Splitter configurations used by the RAG engines: (name, chunk_size, chunk_overlap, separators)
+CONFIGS = [
+    ("rag_service standard", 1500, 300, ["\n\n", "\n", ". ", "! ", "? ", "; ", ", ", " ", ""]),
+    ("rag_service large", 3000, 500, ["\n\n\n", "\n\n", "\n", ". ", "! ", "? "]),
+    ("rag_service similarity", 800, 200, ["\n\n", "\n", ". ", "! ", "? ", "; ", ", ", " ", ""]),
+    ("core medium", 1000, 100, ["\n\n", "\n", ". ", "? ", "! ", " ", ""]),
+]
+
+WORDS = (
+    "warfarin metformin atorvastatin clearance hepatic renal dose mg/kg CYP3A4 CYP2C9 "
+    "inhibitor substrate half-life bioavailability plasma concentration steady state "
+    "adverse reaction contraindicated monitoring INR eGFR titration"
+).split()
+
+
+def make_document(size_mb: float, seed: int = 0) -> str:
+    """Synthetic monograph-like text with sentences, paragraphs and sections."""
+    rnd = random.Random(seed)
+    target = int(size_mb * 1024 * 1024)
+    parts = []
+    length = 0
+    while length < target:
+        sentence = " ".join(rnd.choice(WORDS) for _ in range(rnd.randint(6, 30)))
+        ending = rnd.choice([". ", ". ", ". ", "; ", "? "])
+        boundary = rnd.choices(["", "\n", "\n\n", "\n\n\n"], weights=[80, 10, 8, 2])[0]
+        piece = sentence.capitalize() + ending + boundary
+        parts.append(piece)
+        length += len(piece)
+    return "".join(parts)
+
+
+def measure(split, text: str, repeat: int):
+    """Best wall time and peak traced memory of split(text)."""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        chunks = split(text)
+        best = min(best, time.perf_counter() - started)
+        del chunks
+
+    tracemalloc.start()
+    chunks = split(text)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak, chunks
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the native text splitter against LangChain")
+    parser.add_argument('--size-mb', type=float, default=5.0)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    # Oversized-chunk warnings are expected for the large splitter
+    logging.disable(logging.WARNING)
+
+    text = make_document(args.size_mb)
+    print(f"Document: {len(text) / 1024 / 1024:.1f} MB, {len(text):,} characters\n")
+    print(f"{'configuration':<24}{'chunks':>8}{'langchain s':>13}{'native s':>10}{'speedup':>9}"
+          f"{'langchain MB':>14}{'native MB':>11}{'spans MB':>10}  identical")
+
+    for name, chunk_size, chunk_overlap, separators in CONFIGS:
+        langchain = RecursiveCharacterTextSplitter(
+            chunk_size=chunk_size, chunk_overlap=chunk_overlap, separators=separators
+        )
+        native = TextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap, separators=separators)
+
+        langchain_time, langchain_peak, langchain_chunks = measure(langchain.split_text, text, args.repeat)
+        native_time, native_peak, native_chunks = measure(native.split_text, text, args.repeat)
+        # Offsets only, for callers that materialise chunks lazily
+        _, spans_peak, _ = measure(native.split_spans, text, 1)
+
+        print(f"{name:<24}{len(native_chunks):>8}{langchain_time:>13.3f}{native_time:>10.3f}"
+              f"{langchain_time / native_time:>8.1f}x{langchain_peak / 1024 / 1024:>14.1f}"
+              f"{native_peak / 1024 / 1024:>11.1f}{spans_peak / 1024 / 1024:>10.1f}"
+              f"  {'yes' if native_chunks == langchain_chunks else 'NO'}")
+
+
+if __name__ == "__main__":
+    main()
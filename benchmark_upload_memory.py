@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Upload memory benchmark for PharmGPT
+Measures peak memory of processing one large upload, before and after zero-copy handling
+"""
+
+import io
+import os
+import sys
+import zipfile
+import random
+import argparse
+import tempfile
+import hashlib
+import importlib
+import tracemalloc
+import multiprocessing
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+DOCX_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Default Extension="bin" ContentType="application/octet-stream"/>'
+    '<Override PartName="/word/document.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+    '</Types>'
+)
+DOCX_PARAGRAPH = '<w:p><w:r><w:t>Warfarin dose {i}: adjust to INR 2-3, monitor CYP2C9 interactions.</w:t></w:r></w:p>'
+
+
+class BenchmarkUpload(io.BytesIO):
+    """Stand-in for Streamlit's UploadedFile (also a BytesIO)."""
+
+    def __init__(self, name: str, content: bytes):
+        super().__init__(content)
+        self.name = name
+        self.size = len(content)
+
+
+def make_file(file_type: str, size_mb: int) -> bytes:
+    """Build a synthetic upload of roughly ``size_mb`` megabytes."""
+    size = size_mb * 1024 * 1024
+    if file_type == 'txt':
+        line = b"Metformin 500 mg twice daily; reduce dose when eGFR < 45 mL/min.\n"
+        return line * (size // len(line))
+
+    # DOCX: a real document part plus an incompressible media part for bulk
+    paragraphs = "".join(DOCX_PARAGRAPH.format(i=i) for i in range(2000))
+    document = (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+        f'<w:body>{paragraphs}</w:body></w:document>'
+    )
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as docx:
+        # Fixed timestamps so every run builds identical bytes (and hashes)
+        for name, data, compression in [
+            ('[Content_Types].xml', DOCX_CONTENT_TYPES, zipfile.ZIP_DEFLATED),
+            ('word/document.xml', document, zipfile.ZIP_DEFLATED),
+            ('word/media/scan.bin', random.Random(0).randbytes(size), zipfile.ZIP_STORED)
+        ]:
+            docx.writestr(zipfile.ZipInfo(name, date_time=(2024, 1, 1, 0, 0, 0)), data, compress_type=compression)
+    return buffer.getvalue()
+
+
+def legacy_process(uploaded_file) -> str:
+    """The previous upload path: three getvalue() calls, a temp file for DOCX, split() word count."""
+    import docx2txt
+
+    file_size = len(uploaded_file.getvalue())
+    file_hash = hashlib.sha256(uploaded_file.getvalue()).hexdigest()
+    file_content = uploaded_file.getvalue()
+
+    if uploaded_file.name.endswith('.docx'):
+        with tempfile.NamedTemporaryFile(suffix='.docx', delete=False) as tmp_file:
+            tmp_file.write(file_content)
+            tmp_file_path = tmp_file.name
+        try:
+            text = docx2txt.process(tmp_file_path)
+        finally:
+            os.unlink(tmp_file_path)
+    else:
+        text = file_content.decode('utf-8')
+    return f"{file_size} {file_hash} {len(text)} {len(text.split())}"
+
+
+def current_process(uploaded_file) -> str:
+    """The zero-copy upload path."""
+    from core.utils import DocumentProcessor
+
+    success, text, message, metadata = DocumentProcessor.process_uploaded_file(uploaded_file)
+    if not success:
+        raise RuntimeError(message)
+    return f"{metadata['file_size']} {metadata['file_hash']} {metadata['text_length']} {metadata['word_count']}"
+
+
+def _rss_peak_kb() -> int:
+    """Peak resident set size of this process (Linux), or 0 if unknown."""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+
+def _reset_rss_peak():
+    """Reset the kernel's peak RSS counter (Linux >= 4.0)."""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+
+def run_case(mode: str, file_type: str, size_mb: int, results):
+    """Process one upload in a fresh process and report its memory peaks."""
+    # Import cost is not part of the measurement
+    importlib.import_module("core.utils")
+    importlib.import_module("docx2txt")
+
+    content = make_file(file_type, size_mb)
+    uploaded_file = BenchmarkUpload(f"benchmark.{file_type}", content)
+    del content
+
+    process = legacy_process if mode == 'legacy' else current_process
+    _reset_rss_peak()
+    rss_before = _rss_peak_kb()
+    tracemalloc.start()
+    summary = process(uploaded_file)
+    _, traced_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    results.put({
+        'mode': mode,
+        'file_type': file_type,
+        'file_mb': uploaded_file.size / 1024 / 1024,
+        'traced_peak_mb': traced_peak / 1024 / 1024,
+        'rss_peak_delta_mb': (_rss_peak_kb() - rss_before) / 1024,
+        'summary': summary
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure peak memory per upload")
+    parser.add_argument('--size-mb', type=int, default=50, help="Upload size (default: MAX_FILE_SIZE_MB)")
+    parser.add_argument('--types', nargs='+', default=['txt', 'docx'], choices=['txt', 'docx'])
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context('spawn')
+    print(f"{'type':<6}{'mode':<9}{'file MB':>9}{'traced peak MB':>16}{'RSS peak +MB':>14}")
+    for file_type in args.types:
+        summaries = set()
+        for mode in ('legacy', 'current'):
+            results = context.Queue()
+            process = context.Process(target=run_case, args=(mode, file_type, args.size_mb, results))
+            process.start()
+            result = results.get()
+            process.join()
+
+            summaries.add(result['summary'])
+            print(f"{file_type:<6}{mode:<9}{result['file_mb']:>9.1f}"
+                  f"{result['traced_peak_mb']:>16.1f}{result['rss_peak_delta_mb']:>14.1f}")
+
+        if len(summaries) != 1:
+            print(f"⚠️ {file_type}: legacy and current paths disagree: {summaries}")
+
+
+if __name__ == "__main__":
+    main()
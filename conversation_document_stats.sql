@@ -0,0 +1,32 @@
+-- PharmGPT conversation document statistics
+-- Run in the Supabase SQL Editor after the RAG functions (get_conversation_chunks, ...) exist
+
+-- Per-document chunk count and content length, aggregated in the database so
+-- the documents summary does not download chunk content or embeddings
+CREATE OR REPLACE FUNCTION get_conversation_document_stats(
+    target_conversation_id TEXT,
+    target_user_uuid UUID
+)
+RETURNS TABLE (
+    document_id TEXT,
+    chunk_count BIGINT,
+    total_content_length BIGINT,
+    created_at TIMESTAMP WITH TIME ZONE
+)
+LANGUAGE sql
+STABLE
+SECURITY DEFINER
+AS $$
+    SELECT
+        dc.document_id::TEXT,
+        COUNT(*) AS chunk_count,
+        COALESCE(SUM(char_length(dc.content)), 0) AS total_content_length,
+        MIN(dc.created_at) AS created_at
+    FROM document_chunks dc
+    WHERE dc.conversation_id::TEXT = target_conversation_id
+      AND dc.user_uuid = target_user_uuid
+    GROUP BY dc.document_id
+    ORDER BY MIN(dc.created_at);
+$$;
+
+GRANT EXECUTE ON FUNCTION get_conversation_document_stats(TEXT, UUID) TO anon, authenticated;
@@ -51,14 +51,39 @@ class Config:
     EMBEDDING_DIMENSIONS = 1024
     DEFAULT_SIMILARITY_THRESHOLD = 0.7
     MAX_CONTEXT_LENGTH = 8000
+    MAX_CONTEXT_TOKENS = 2000  # Prompt budget for retrieved context, in embedding tokens
     MAX_SEARCH_RESULTS = 20
     
+    # Hybrid Retrieval (BM25 + vector, reciprocal rank fusion)
+    HYBRID_SEARCH_ENABLED = os.getenv("PHARMGPT_HYBRID_SEARCH", "true").lower() in ("1", "true", "yes")
+    LEXICAL_SEARCH_RESULTS = 20
+    HYBRID_MATCH_COUNT = 10
+    RRF_K = 60
+    
+    # Drug-entity lookup; questions naming known entities skip the vector search
+    ENTITY_SEARCH_ENABLED = os.getenv("PHARMGPT_ENTITY_SEARCH", "true").lower() in ("1", "true", "yes")
+    ENTITY_SEARCH_RESULTS = 20
+    ENTITY_SKIP_VECTOR_SEARCH = True
+    
+    # Embedding API Limits (Mistral)
+    EMBEDDING_MAX_CONCURRENCY = 4
+    EMBEDDING_REQUESTS_PER_SECOND = 5
+    EMBEDDING_TOKENS_PER_MINUTE = 500000
+    EMBEDDING_MAX_BATCH_TOKENS = 16000
+    
     # Chunking Configuration
+    # 'tokens' sizes chunks with the embedding tokenizer, 'characters' by length
+    CHUNK_SIZE_UNIT = os.getenv("PHARMGPT_CHUNK_SIZE_UNIT", "tokens")
     CHUNK_SIZES = {
         'small': {'size': 500, 'overlap': 50},
         'medium': {'size': 1000, 'overlap': 100},
         'large': {'size': 1500, 'overlap': 150}
     }
+    CHUNK_SIZES_TOKENS = {
+        'small': {'size': 128, 'overlap': 16},
+        'medium': {'size': 256, 'overlap': 32},
+        'large': {'size': 384, 'overlap': 48}
+    }
     DEFAULT_CHUNK_SIZE = 'medium'
     
     # File Upload Configuration
@@ -164,7 +189,13 @@ class Config:
                 'model': cls.EMBEDDING_MODEL,
                 'dimensions': cls.EMBEDDING_DIMENSIONS,
                 'similarity_threshold': cls.DEFAULT_SIMILARITY_THRESHOLD,
-                'max_context_length': cls.MAX_CONTEXT_LENGTH
+                'max_context_length': cls.MAX_CONTEXT_LENGTH,
+                'max_context_tokens': cls.MAX_CONTEXT_TOKENS,
+                'embedding_max_concurrency': cls.EMBEDDING_MAX_CONCURRENCY,
+                'embedding_requests_per_second': cls.EMBEDDING_REQUESTS_PER_SECOND,
+                'chunk_size_unit': cls.CHUNK_SIZE_UNIT,
+                'hybrid_search': cls.HYBRID_SEARCH_ENABLED,
+                'entity_search': cls.ENTITY_SEARCH_ENABLED
             },
             'files': {
                 'max_size_mb': cls.MAX_FILE_SIZE_MB,
@@ -11,6 +11,8 @@ import uuid
 
 from core.supabase_client import supabase_manager
 from core.auth import get_current_user_id
+from utils.bm25_index import bm25_index_cache
+from utils.entity_index import entity_index_cache
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -262,6 +264,10 @@ class ConversationManager:
                 if cache_key in self._cache:
                     del self._cache[cache_key]
                 
+                # Release the conversation's retrieval indexes
+                bm25_index_cache.invalidate((user_id, conversation_id))
+                entity_index_cache.invalidate((user_id, conversation_id))
+                
                 logger.info(f"Deleted conversation {conversation_id}")
                 return True
             
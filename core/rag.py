@@ -6,7 +6,7 @@ Integrates with Mistral AI for 1024-dimensional embeddings
 
 import logging
 import asyncio
-from typing import List, Dict, Optional, Tuple, Any
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
 import uuid
 import json
 from datetime import datetime
@@ -15,7 +15,6 @@ from datetime import datetime
 logger = logging.getLogger(__name__)
 
 try:
-    from langchain.text_splitter import RecursiveCharacterTextSplitter
     from langchain_mistralai import MistralAIEmbeddings
     LANGCHAIN_AVAILABLE = True
 except ImportError:
@@ -23,39 +22,40 @@ except ImportError:
     logger.warning("LangChain not available. Install with: pip install langchain langchain-mistralai")
 
 from core.supabase_client import supabase_manager
+from core.config import config
+# Text extraction from uploads; this module's DocumentProcessor does the chunking
+from core.utils import DocumentProcessor as FileExtractor, FileBuffer
+from utils.embedding_scheduler import EmbeddingScheduler
+from utils.ingestion_pipeline import IngestionPipeline
+from utils.ingestion_jobs import ingestion_jobs
+from utils.embedding_cache import embedding_cache, query_embedding_cache
+from utils.bm25_index import bm25_index_cache, reciprocal_rank_fusion
+from utils.context_packer import pack_context
+from utils.entity_index import entity_index_cache
+from utils.text_splitter import TextSplitter
+from utils.tokenizer import count_tokens, get_tokenizer_stats
+from utils.vector_codec import embedding_columns
 
 
 class DocumentProcessor:
     """Handles document processing and text chunking."""
     
     def __init__(self):
+        token_sized = config.CHUNK_SIZE_UNIT == 'tokens'
+        chunk_sizes = config.CHUNK_SIZES_TOKENS if token_sized else config.CHUNK_SIZES
         self.text_splitters = {
-            'small': RecursiveCharacterTextSplitter(
-                chunk_size=500,
-                chunk_overlap=50,
-                separators=["\n\n", "\n", ". ", "? ", "! ", " ", ""]
-            ) if LANGCHAIN_AVAILABLE else None,
-            'medium': RecursiveCharacterTextSplitter(
-                chunk_size=1000,
-                chunk_overlap=100,
-                separators=["\n\n", "\n", ". ", "? ", "! ", " ", ""]
-            ) if LANGCHAIN_AVAILABLE else None,
-            'large': RecursiveCharacterTextSplitter(
-                chunk_size=1500,
-                chunk_overlap=150,
-                separators=["\n\n", "\n", ". ", "? ", "! ", " ", ""]
-            ) if LANGCHAIN_AVAILABLE else None
+            name: TextSplitter(
+                chunk_size=sizes['size'],
+                chunk_overlap=sizes['overlap'],
+                separators=["\n\n", "\n", ". ", "? ", "! ", " ", ""],
+                length_function=count_tokens if token_sized else None
+            )
+            for name, sizes in chunk_sizes.items()
         }
     
     def chunk_text(self, text: str, chunk_size: str = 'medium') -> List[str]:
         """Split text into chunks."""
-        if not LANGCHAIN_AVAILABLE:
-            # Fallback simple chunking
-            chunk_sizes = {'small': 500, 'medium': 1000, 'large': 1500}
-            size = chunk_sizes.get(chunk_size, 1000)
-            return [text[i:i+size] for i in range(0, len(text), size)]
-        
-        splitter = self.text_splitters.get(chunk_size, self.text_splitters['medium'])
+        splitter = self.text_splitters.get(chunk_size, self.text_splitters[config.DEFAULT_CHUNK_SIZE])
         return splitter.split_text(text)
     
     def extract_metadata(self, filename: str, file_type: str, 
@@ -76,6 +76,8 @@ class EmbeddingManager:
     
     def __init__(self):
         self.embeddings = None
+        self.scheduler = None
+        self.model = "mistral-embed"
         self._initialize_embeddings()
     
     def _initialize_embeddings(self):
@@ -100,9 +102,17 @@ class EmbeddingManager:
             
             if api_key:
                 self.embeddings = MistralAIEmbeddings(
-                    model="mistral-embed",
+                    model=self.model,
                     mistral_api_key=api_key
                 )
+                self.scheduler = EmbeddingScheduler(
+                    self.embeddings.embed_documents,
+                    max_concurrency=config.EMBEDDING_MAX_CONCURRENCY,
+                    requests_per_second=config.EMBEDDING_REQUESTS_PER_SECOND,
+                    tokens_per_minute=config.EMBEDDING_TOKENS_PER_MINUTE,
+                    max_batch_tokens=config.EMBEDDING_MAX_BATCH_TOKENS,
+                    token_counter=count_tokens
+                )
                 logger.info("✅ Mistral AI embeddings initialized")
             else:
                 logger.warning("❌ MISTRAL_API_KEY not found")
@@ -121,20 +131,19 @@ class EmbeddingManager:
             return [[0.0] * 1024 for _ in texts]  # Return zero vectors
         
         try:
-            # Generate embeddings in batches to avoid rate limits
-            batch_size = 20
-            all_embeddings = []
-            
-            for i in range(0, len(texts), batch_size):
-                batch = texts[i:i + batch_size]
-                batch_embeddings = await asyncio.get_event_loop().run_in_executor(
-                    None, self.embeddings.embed_documents, batch
-                )
-                all_embeddings.extend(batch_embeddings)
-                
-                # Small delay between batches
-                await asyncio.sleep(0.1)
+            # Reuse embeddings of chunks seen before (re-uploads, shared material)
+            all_embeddings = await embedding_cache.get_many_async(self.model, texts)
+            missing = [i for i, embedding in enumerate(all_embeddings) if embedding is None]
+            missing_texts = [texts[i] for i in missing]
+            
+            # Token-sized batches, run concurrently under the API rate limits
+            new_embeddings = await self.scheduler.embed(missing_texts)
+            
+            await embedding_cache.put_many_async(self.model, missing_texts, new_embeddings)
+            for i, embedding in zip(missing, new_embeddings):
+                all_embeddings[i] = embedding
             
+            logger.info(f"Embedded {len(missing_texts)} chunks ({len(texts) - len(missing_texts)} from cache)")
             return all_embeddings
             
         except Exception as e:
@@ -147,13 +156,18 @@ class EmbeddingManager:
             return [0.0] * 1024  # Return zero vector
         
         try:
-            embedding = await asyncio.get_event_loop().run_in_executor(
-                None, self.embeddings.embed_query, query
+            return await query_embedding_cache.get_or_compute(
+                self.model, query, self._compute_query_embedding
             )
-            return embedding
         except Exception as e:
             logger.error(f"Error generating query embedding: {e}")
             return [0.0] * 1024  # Return zero vector
+    
+    async def _compute_query_embedding(self, query: str) -> List[float]:
+        """Call the embedding model for a single query."""
+        return await asyncio.get_event_loop().run_in_executor(
+            None, self.embeddings.embed_query, query
+        )
 
 
 class ConversationRAG:
@@ -167,6 +181,25 @@ class ConversationRAG:
                              filename: str, file_content: str, 
                              file_type: str, file_size: int) -> Tuple[bool, str, Optional[str]]:
         """Process and store a document for a specific conversation."""
+        segments = [({}, file_content)] if file_content else []
+        return await self.process_document_stream(
+            conversation_id, user_id, filename, segments, file_type, file_size,
+            content_preview=file_content[:500] if file_content else None
+        )
+    
+    async def process_document_stream(self, conversation_id: str, user_id: str,
+                                    filename: str, segments: Iterable[Tuple[Dict, str]],
+                                    file_type: str, file_size: int,
+                                    content_preview: str = None,
+                                    on_progress: Callable = None) -> Tuple[bool, str, Optional[str]]:
+        """Process a document streamed as (metadata, text) segments, e.g. PDF pages.
+        
+        Extraction, chunking, embedding and storage run as overlapping stages,
+        so memory stays flat and the first chunks are searchable before the
+        last page has been parsed. Progress (chunks stored so far) is written
+        to the document status and passed to ``on_progress(stored, split, finished)``.
+        """
+        document_id = None
         try:
             logger.info(f"Processing document {filename} for conversation {conversation_id}")
             
@@ -177,60 +210,96 @@ class ConversationRAG:
                 filename=filename,
                 file_type=file_type,
                 file_size=file_size,
-                content_preview=file_content[:500] if file_content else None
+                content_preview=content_preview
             )
             
             if not document_id:
                 return False, "Failed to save document metadata", None
             
-            # Chunk the document
-            chunks = self.document_processor.chunk_text(file_content)
-            logger.info(f"Document split into {len(chunks)} chunks")
+            async def store_chunks(batch: List[Dict], embeddings: List[List[float]]) -> int:
+                chunk_data = []
+                for chunk, embedding in zip(batch, embeddings):
+                    metadata = self.document_processor.extract_metadata(
+                        filename, file_type, chunk['chunk_index'], chunk['content']
+                    )
+                    metadata.update(chunk['metadata'])
+                    
+                    chunk_data.append({
+                        'document_id': document_id,
+                        'conversation_id': conversation_id,
+                        'user_id': user_id,
+                        'chunk_index': chunk['chunk_index'],
+                        'content': chunk['content'],
+                        'metadata': metadata,
+                        **embedding_columns(embedding)
+                    })
+                
+                # Tag chunks with the drug entities they mention
+                index_key = (user_id, conversation_id)
+                index_rows = [
+                    {key: row[key] for key in ('document_id', 'chunk_index', 'content', 'metadata')}
+                    for row in chunk_data
+                ]
+                entity_tags = entity_index_cache.tag_chunks(index_key, index_rows)
+                for row, entities in zip(chunk_data, entity_tags):
+                    row['metadata']['entities'] = entities
+                
+                success = await supabase_manager.save_document_chunks(chunk_data)
+                if not success:
+                    return 0
+                
+                # Keep the conversation's lexical and entity indexes current
+                bm25_index_cache.add(index_key, index_rows)
+                entity_index_cache.add(index_key, index_rows, entity_tags)
+                return len(chunk_data)
+            
+            async def report_progress(stored: int, split: int, finished: bool):
+                if not finished:
+                    await supabase_manager.update_document_status(
+                        document_id, 'processing', stored
+                    )
+                if on_progress:
+                    on_progress(stored, split, finished)
+            
+            pipeline = IngestionPipeline(
+                split_fn=self.document_processor.chunk_text,
+                embed_fn=self.embedding_manager.generate_embeddings,
+                store_fn=store_chunks,
+                on_progress=report_progress
+            )
+            totals = await pipeline.run(segments)
+            chunk_count = totals['chunks_split']
+            stored_count = totals['chunks_stored']
+            logger.info(f"Document split into {chunk_count} chunks")
             
-            if not chunks:
+            if not chunk_count:
                 await supabase_manager.update_document_status(
                     document_id, 'failed', 0
                 )
                 return False, "No content to process", document_id
             
-            # Generate embeddings
-            embeddings = await self.embedding_manager.generate_embeddings(chunks)
-            
-            # Prepare chunk data
-            chunk_data = []
-            for i, (chunk, embedding) in enumerate(zip(chunks, embeddings)):
-                metadata = self.document_processor.extract_metadata(
-                    filename, file_type, i, chunk
-                )
-                
-                chunk_data.append({
-                    'document_id': document_id,
-                    'conversation_id': conversation_id,
-                    'user_id': user_id,
-                    'chunk_index': i,
-                    'content': chunk,
-                    'metadata': metadata,
-                    'embedding': embedding
-                })
-            
-            # Save chunks
-            success = await supabase_manager.save_document_chunks(chunk_data)
-            
-            if success:
+            if stored_count == chunk_count:
                 await supabase_manager.update_document_status(
-                    document_id, 'completed', len(chunks)
+                    document_id, 'completed', chunk_count
                 )
-                logger.info(f"Successfully processed {filename} with {len(chunks)} chunks")
-                return True, f"Document processed successfully! Created {len(chunks)} chunks.", document_id
+                logger.info(f"Successfully processed {filename} with {chunk_count} chunks")
+                return True, f"Document processed successfully! Created {chunk_count} chunks.", document_id
             else:
                 await supabase_manager.update_document_status(
-                    document_id, 'failed', 0
+                    document_id, 'failed', stored_count
                 )
                 return False, "Failed to save document chunks", document_id
                 
+        except asyncio.CancelledError:
+            logger.info(f"Processing of {filename} cancelled")
+            if document_id:
+                await asyncio.shield(supabase_manager.update_document_status(
+                    document_id, 'cancelled', 0
+                ))
+            raise
         except Exception as e:
             logger.error(f"Error processing document: {e}")
-            if 'document_id' in locals() and document_id:
+            if document_id:
                 await supabase_manager.update_document_status(
                     document_id, 'failed', 0
                 )
@@ -260,6 +329,62 @@ class ConversationRAG:
             logger.error(f"Error searching conversation documents: {e}")
             return []
     
+    async def search_conversation_lexical(self, query: str, conversation_id: str,
+                                          user_id: str, limit: int = 20) -> List[Dict]:
+        """BM25 keyword search within a conversation (exact drug names, doses, acronyms)."""
+        try:
+            index = await bm25_index_cache.get_or_load(
+                (user_id, conversation_id),
+                lambda: self._load_index_rows(conversation_id, user_id)
+            )
+            if index is None:
+                return []
+            
+            results = bm25_index_cache.search(index, query, limit)
+            logger.info(f"Found {len(results)} keyword matches for query in conversation {conversation_id}")
+            return results
+            
+        except Exception as e:
+            logger.error(f"Error in keyword search: {e}")
+            return []
+    
+    async def search_conversation_entities(self, query: str, conversation_id: str,
+                                           user_id: str, limit: int = 20) -> List[Dict]:
+        """Chunks mentioning the drugs, classes or enzymes named in the query."""
+        try:
+            index = await entity_index_cache.get_or_load(
+                (user_id, conversation_id),
+                lambda: self._load_index_rows(conversation_id, user_id)
+            )
+            if index is None:
+                return []
+            
+            results = entity_index_cache.lookup(index, query, limit)
+            if results:
+                logger.info(f"Found {len(results)} chunks naming the query's entities in conversation {conversation_id}")
+            return results
+            
+        except Exception as e:
+            logger.error(f"Error in entity lookup: {e}")
+            return []
+    
+    async def _load_index_rows(self, conversation_id: str, user_id: str) -> List[Dict]:
+        """Chunk rows of a conversation for building its BM25 and entity indexes."""
+        rows = []
+        for chunk in await supabase_manager.get_conversation_context(conversation_id, user_id):
+            metadata = chunk.get('metadata') or {}
+            if isinstance(metadata, str):
+                metadata = json.loads(metadata)
+            if chunk.get('filename'):
+                metadata.setdefault('filename', chunk['filename'])
+            rows.append({
+                'document_id': chunk.get('document_id'),
+                'chunk_index': chunk.get('chunk_index'),
+                'content': chunk.get('content', ''),
+                'metadata': metadata
+            })
+        return rows
+    
     async def search_all_user_documents(self, query: str, user_id: str,
                                       limit: int = 20,
                                       similarity_threshold: float = 0.7) -> List[Dict]:
@@ -329,44 +454,60 @@ class ConversationRAG:
             return ""
     
     async def get_relevant_context(self, query: str, conversation_id: str,
-                                 user_id: str, max_context_length: int = 8000) -> str:
+                                 user_id: str, max_context_tokens: int = None) -> str:
         """Get relevant context for a query, optimized for token limits."""
         try:
-            # Search for relevant chunks
-            relevant_chunks = await self.search_conversation_documents(
-                query=query,
-                conversation_id=conversation_id,
-                user_id=user_id,
-                limit=20,
-                similarity_threshold=0.6
-            )
+            # Chunks naming the drugs or enzymes asked about, by direct lookup
+            entity_chunks = []
+            if config.ENTITY_SEARCH_ENABLED:
+                entity_chunks = await self.search_conversation_entities(
+                    query, conversation_id, user_id, limit=config.ENTITY_SEARCH_RESULTS
+                )
             
-            if not relevant_chunks:
-                return ""
+            # Search for relevant chunks
+            relevant_chunks = []
+            if not (entity_chunks and config.ENTITY_SKIP_VECTOR_SEARCH):
+                relevant_chunks = await self.search_conversation_documents(
+                    query=query,
+                    conversation_id=conversation_id,
+                    user_id=user_id,
+                    limit=config.MAX_SEARCH_RESULTS,
+                    similarity_threshold=0.6
+                )
             
             # Sort by similarity score (highest first)
             relevant_chunks.sort(key=lambda x: x.get('similarity', 0), reverse=True)
             
-            # Build context within token limit
-            context_parts = []
-            total_length = 0
+            # Fuse with entity and keyword matches, which catch names and codes embeddings miss
+            ranked_lists = [relevant_chunks]
+            if entity_chunks:
+                ranked_lists.append(entity_chunks)
+            if config.HYBRID_SEARCH_ENABLED:
+                ranked_lists.append(await self.search_conversation_lexical(
+                    query, conversation_id, user_id, limit=config.LEXICAL_SEARCH_RESULTS
+                ))
+            score_key = 'similarity'
+            if len(ranked_lists) > 1:
+                relevant_chunks = reciprocal_rank_fusion(
+                    ranked_lists, limit=config.HYBRID_MATCH_COUNT, k=config.RRF_K
+                )
+                score_key = 'rrf_score'
             
-            for chunk in relevant_chunks:
-                content = chunk.get('content', '')
-                chunk_meta = chunk.get('metadata', {})
-                filename = chunk_meta.get('filename', 'Unknown')
-                
-                # Estimate token usage (rough: 4 chars per token)
-                chunk_tokens = len(content) // 4
-                
-                if total_length + chunk_tokens > max_context_length // 4:
-                    break
-                
-                context_parts.append(f"[{filename}] {content}")
-                total_length += len(content)
+            if not relevant_chunks:
+                return ""
             
-            context = "\n\n".join(context_parts)
-            logger.info(f"Built relevant context from {len(context_parts)} chunks ({len(context)} characters)")
+            # Best chunks that fit the token budget, neighbouring chunks merged without their overlap
+            def format_passage(passage: Dict) -> str:
+                filename = (passage['chunks'][0].get('metadata') or {}).get('filename', 'Unknown')
+                return f"[{filename}] {passage['content']}"
+            
+            context = pack_context(
+                relevant_chunks,
+                max_context_tokens or config.MAX_CONTEXT_TOKENS,
+                format_passage=format_passage,
+                score_key=score_key
+            )
+            logger.info(f"Built relevant context from {len(relevant_chunks)} candidate chunks ({len(context)} characters)")
             
             return context
             
@@ -380,7 +521,13 @@ class ConversationRAG:
             'langchain_available': LANGCHAIN_AVAILABLE,
             'embeddings_available': self.embedding_manager.is_available(),
             'model': 'mistral-embed' if self.embedding_manager.is_available() else 'None',
-            'dimensions': 1024
+            'dimensions': 1024,
+            'embedding_cache': embedding_cache.get_stats(),
+            'query_embedding_cache': query_embedding_cache.get_stats(),
+            'scheduler': self.embedding_manager.scheduler.get_stats() if self.embedding_manager.scheduler else None,
+            'tokenizer': get_tokenizer_stats(),
+            'lexical_index': bm25_index_cache.get_stats(),
+            'entity_index': entity_index_cache.get_stats()
         }
 
 
@@ -395,6 +542,25 @@ async def process_document(conversation_id: str, user_id: str, filename: str,
         conversation_id, user_id, filename, file_content, file_type, file_size
     )
 
+def submit_document(conversation_id: str, user_id: str, filename: str,
+                    file_content: FileBuffer, file_type: str, file_size: int,
+                    content_preview: str = None) -> str:
+    """Queue a document for background ingestion and return the job id.
+    
+    The job extracts the text itself (OCRing scanned pages), so the caller
+    only hands over the raw upload.
+    """
+    async def ingest(job_id: str) -> Tuple[bool, str, Optional[str]]:
+        # Lazy: the pipeline pulls segments in an executor, off the worker loop
+        segments = FileExtractor.iter_text_segments(file_content, file_type)
+        return await conversation_rag.process_document_stream(
+            conversation_id, user_id, filename, segments, file_type, file_size,
+            content_preview=content_preview,
+            on_progress=lambda stored, split, finished: ingestion_jobs.update_progress(job_id, stored, split)
+        )
+    
+    return ingestion_jobs.submit(ingest, owner=user_id, conversation_id=conversation_id, filename=filename)
+
 async def search_conversation(query: str, conversation_id: str, user_id: str) -> List[Dict]:
     """Search within conversation documents."""
     return await conversation_rag.search_conversation_documents(
@@ -10,6 +10,9 @@ from typing import Optional, Dict, Any, List, Tuple
 from datetime import datetime, timedelta
 import streamlit as st
 
+from utils.event_loop_cache import EventLoopCache, aclose_client
+from utils.vector_codec import vector_param
+
 # Configure logging
 logger = logging.getLogger(__name__)
 
@@ -36,7 +39,10 @@ class SupabaseManager:
         if not SUPABASE_AVAILABLE:
             raise ImportError("Supabase library not available")
             
-        self._client: Optional[AsyncClient] = None
+        # Async clients hold loop-bound HTTP sessions, so keep one per event loop
+        # (Streamlit script threads and the background ingestion worker),
+        # closing their sessions once the loop's thread is gone
+        self._clients = EventLoopCache(aclose=aclose_client)
         self._sync_client: Optional[Client] = None
         self.stats = {
             'queries': 0,
@@ -69,11 +75,15 @@ class SupabaseManager:
         return url, key
     
     async def get_client(self) -> AsyncClient:
-        """Get or create async Supabase client."""
-        if not self._client:
+        """Get or create the async Supabase client for the running event loop."""
+        client = self._clients.get()
+        if client is None:
             url, key = self._get_credentials()
-            self._client = await create_async_client(url, key)
-        return self._client
+            created = await create_async_client(url, key)
+            client = self._clients.setdefault(created)
+            if client is not created:
+                await aclose_client(created)
+        return client
     
     def get_sync_client(self) -> Client:
         """Get or create sync Supabase client."""
@@ -403,7 +413,7 @@ class SupabaseManager:
             result = await client.rpc(
                 'search_documents',
                 {
-                    'p_query_embedding': query_embedding,
+                    'p_query_embedding': vector_param(query_embedding),
                     'p_user_id': user_id,
                     'p_conversation_id': conversation_id,
                     'p_similarity_threshold': similarity_threshold,
@@ -3,18 +3,24 @@ Utility functions for PharmGPT
 Document processing, error handling, and common operations
 """
 
+import codecs
 import logging
 import asyncio
 import hashlib
 import mimetypes
-from typing import Any, Dict, List, Optional, Tuple, Union
+import re
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
 from datetime import datetime, timedelta
 import io
 import os
 import tempfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 
 import streamlit as st
 
+from utils.tokenizer import count_tokens
+
 # Configure logging
 logger = logging.getLogger(__name__)
 
@@ -29,6 +35,13 @@ except ImportError:
     DOCUMENT_PROCESSING_AVAILABLE = False
     logger.warning("Document processing libraries not available")
 
+try:
+    import openpyxl
+    XLSX_PROCESSING_AVAILABLE = True
+except ImportError:
+    XLSX_PROCESSING_AVAILABLE = False
+    logger.warning("openpyxl not available, XLSX processing disabled. Install with: pip install openpyxl")
+
 
 def run_async(coro) -> Any:
     """Helper to run async functions in Streamlit context."""
@@ -99,9 +112,84 @@ def sanitize_filename(filename: str) -> str:
     return filename
 
 
-def get_file_hash(file_content: bytes) -> str:
-    """Generate hash for file content."""
-    return hashlib.sha256(file_content).hexdigest()
+# Uploads are handled as bytes or a memoryview over Streamlit's upload buffer
+FileBuffer = Union[bytes, bytearray, memoryview]
+
+HASH_BLOCK_SIZE = 1024 * 1024
+
+
+class BufferReader(io.RawIOBase):
+    """Read-only, seekable file object over a bytes-like buffer without copying it.
+    
+    ``io.BytesIO`` copies a memoryview on construction; this reader lets
+    PyPDF2, zipfile (DOCX) and pandas read an upload in place.
+    """
+    
+    def __init__(self, buffer: FileBuffer):
+        super().__init__()
+        self._buffer = memoryview(buffer).cast('B')
+        self._position = 0
+    
+    def readable(self) -> bool:
+        return True
+    
+    def seekable(self) -> bool:
+        return True
+    
+    def readinto(self, target) -> int:
+        size = min(len(target), len(self._buffer) - self._position)
+        if size <= 0:
+            return 0
+        target[:size] = self._buffer[self._position:self._position + size]
+        self._position += size
+        return size
+    
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_SET:
+            position = offset
+        elif whence == io.SEEK_CUR:
+            position = self._position + offset
+        elif whence == io.SEEK_END:
+            position = len(self._buffer) + offset
+        else:
+            raise ValueError(f"Invalid whence: {whence}")
+        if position < 0:
+            raise ValueError(f"Negative seek position {position}")
+        self._position = position
+        return position
+    
+    def tell(self) -> int:
+        return self._position
+
+
+def get_upload_buffer(uploaded_file) -> memoryview:
+    """Read-only view of an uploaded file's content, fetched once.
+    
+    Streamlit's ``UploadedFile`` is a ``BytesIO`` over the received bytes and
+    CPython's ``BytesIO.getvalue`` returns those bytes without copying as long
+    as the file was never written to. ``getbuffer`` would force a private copy,
+    so the view is taken over ``getvalue`` instead.
+    """
+    return memoryview(uploaded_file.getvalue())
+
+
+def _to_bytes(file_content: FileBuffer) -> bytes:
+    """Bytes for handing a buffer to another process, copying only when unavoidable."""
+    if isinstance(file_content, bytes):
+        return file_content
+    if isinstance(file_content, memoryview) and isinstance(file_content.obj, bytes) \
+            and file_content.nbytes == len(file_content.obj):
+        return file_content.obj
+    return bytes(file_content)
+
+
+def get_file_hash(file_content: FileBuffer) -> str:
+    """Generate hash for file content, hashing large buffers block by block."""
+    view = memoryview(file_content).cast('B')
+    digest = hashlib.sha256()
+    for start in range(0, len(view), HASH_BLOCK_SIZE):
+        digest.update(view[start:start + HASH_BLOCK_SIZE])
+    return digest.hexdigest()
 
 
 def validate_file_size(file_size: int, max_size_mb: int = 50) -> Tuple[bool, str]:
@@ -124,68 +212,265 @@ def validate_file_type(filename: str, allowed_types: Dict[str, str]) -> Tuple[bo
     return False, f"File type '{ext}' not supported. Allowed: {', '.join(allowed_types.keys())}"
 
 
+# PDF reader of the current extraction worker process (see DocumentProcessor.iter_pdf_pages)
+_pdf_worker_reader = None
+
+
+def _init_pdf_worker(file_content: Optional[bytes]):
+    """Parse the PDF once per worker process."""
+    global _pdf_worker_reader
+    _pdf_worker_reader = PyPDF2.PdfReader(io.BytesIO(file_content)) if file_content is not None else None
+
+
+def _has_images(page) -> bool:
+    """Whether a PDF page draws images (a scanned page has no text layer but one image)."""
+    try:
+        resources = page.get('/Resources') or {}
+        return bool(resources.get('/XObject'))
+    except Exception:
+        return False
+
+
+def _extract_pdf_pages(start: int, end: int, reader=None) -> List[Tuple[int, str]]:
+    """Extract text from pages [start, end) of the given reader or the worker's PDF.
+    
+    Pages without text are left out, except image-only pages which are
+    returned with empty text so they can be sent to OCR.
+    """
+    reader = reader or _pdf_worker_reader
+    pages = []
+    for page_num in range(start, end):
+        try:
+            page = reader.pages[page_num]
+            text = page.extract_text()
+            if text and text.strip():
+                pages.append((page_num + 1, text))
+            elif _has_images(page):
+                pages.append((page_num + 1, ""))
+        except Exception as e:
+            logger.warning(f"Error extracting text from page {page_num + 1}: {e}")
+    return pages
+
+
+def _format_table_row(values) -> str:
+    """One table row as pipe-separated cells."""
+    return " | ".join("" if value is None else str(value).strip() for value in values)
+
+
+def _iter_row_blocks(header: List[str], rows: Iterator[tuple], max_rows: int, max_length: int,
+                     metadata: Dict = None, length_function=len) -> Iterator[Tuple[Dict, str]]:
+    """Group table rows into (metadata, text) blocks that each repeat the header.
+    
+    Blocks are bounded by row count and by ``length_function`` (characters or
+    tokens, as chunks are sized) so a block fits in one chunk and every chunk
+    of a long table still says what its columns are.
+    """
+    header_line = _format_table_row(header)
+    block: List[str] = []
+    block_length = length_function(header_line)
+    first_row = 1
+    row_number = 0
+    
+    def make_block():
+        block_metadata = dict(metadata or {})
+        block_metadata['rows'] = [first_row, row_number]
+        return block_metadata, "\n".join([header_line] + block)
+    
+    for values in rows:
+        line = _format_table_row(values)
+        if not line.replace("|", "").strip():
+            continue
+        
+        line_length = length_function(line) + 1  # Plus the newline
+        if block and (len(block) >= max_rows or block_length + line_length > max_length):
+            yield make_block()
+            block, block_length = [], length_function(header_line)
+            first_row = row_number + 1
+        
+        row_number += 1
+        block.append(line)
+        block_length += line_length
+    
+    if block:
+        yield make_block()
+
+
 class DocumentProcessor:
     """Handle various document types for text extraction."""
     
+    # Parallel PDF extraction settings
+    PDF_MAX_WORKERS = 4
+    PDF_PAGES_PER_TASK = 8
+    PDF_PARALLEL_MIN_PAGES = 16
+    PDF_OCR_LOOKAHEAD_PAGES = 32
+    
+    # Tabular ingestion settings (blocks fill up to 90% of a default-size chunk, in its unit)
+    TABLE_READ_ROWS = 5000
+    TABLE_BLOCK_MAX_ROWS = 50
+    TABLE_BLOCK_CHUNK_FILL = 0.9
+    TABLE_PREVIEW_ROWS = 10
+    
+    # Upload preview settings (the preview never OCRs and reads only the start of a file)
+    PREVIEW_MAX_CHARS = 1000
+    PREVIEW_MAX_PAGES = 5
+    
     @staticmethod
-    def extract_text_from_pdf(file_content: bytes) -> Tuple[bool, str, str]:
-        """Extract text from PDF file."""
+    def extract_text_from_pdf(file_content: FileBuffer, ocr: bool = True) -> Tuple[bool, str, str]:
+        """Extract text from PDF file (``ocr=False`` leaves scanned pages out)."""
         if not DOCUMENT_PROCESSING_AVAILABLE:
             return False, "", "PDF processing not available"
         
         try:
-            pdf_file = io.BytesIO(file_content)
-            pdf_reader = PyPDF2.PdfReader(pdf_file)
-            
-            text_parts = []
-            for page_num, page in enumerate(pdf_reader.pages):
-                try:
-                    text = page.extract_text()
-                    if text.strip():
-                        text_parts.append(f"--- Page {page_num + 1} ---\n{text}")
-                except Exception as e:
-                    logger.warning(f"Error extracting text from page {page_num + 1}: {e}")
+            text_parts = [
+                f"--- Page {page_number} ---\n{text}"
+                for page_number, text in DocumentProcessor.iter_pdf_pages(file_content, ocr=ocr)
+            ]
             
             full_text = "\n\n".join(text_parts)
             
             if not full_text.strip():
                 return False, "", "No readable text found in PDF"
             
-            return True, full_text, f"Extracted text from {len(pdf_reader.pages)} pages"
+            return True, full_text, f"Extracted text from {len(text_parts)} pages"
             
         except Exception as e:
             return False, "", f"Error processing PDF: {str(e)}"
     
+    @classmethod
+    def iter_pdf_pages(cls, file_content: FileBuffer, max_workers: int = None,
+                       ocr: bool = True) -> Iterator[Tuple[int, str]]:
+        """Yield (page_number, text) for each PDF page that contains text, in page order.
+        
+        Large PDFs are extracted in parallel by a bounded process pool working
+        on page ranges; results stream out as soon as the next range is ready.
+        Image-only (scanned) pages are OCRed in a separate pool while text
+        extraction carries on, and only when Tesseract is available.
+        """
+        pages = cls._iter_extracted_pdf_pages(file_content, max_workers)
+        
+        page_ocr = None
+        if ocr:
+            from utils.ocr_manager import create_pdf_page_ocr
+            page_ocr = create_pdf_page_ocr(_to_bytes(file_content))
+        
+        if page_ocr is None:
+            for page_number, text in pages:
+                if text:
+                    yield page_number, text
+            return
+        
+        with page_ocr:
+            # Pages waiting for an earlier OCR result; None marks a page being OCRed
+            buffered = deque()
+            
+            def ready_pages(wait: bool):
+                while buffered:
+                    page_number, text = buffered[0]
+                    if text is None:
+                        if not wait and not page_ocr.is_done(page_number):
+                            return
+                        text = page_ocr.result(page_number)
+                    buffered.popleft()
+                    if text and text.strip():
+                        yield page_number, text
+            
+            for page_number, text in pages:
+                if text:
+                    buffered.append((page_number, text))
+                else:
+                    page_ocr.request(page_number)
+                    buffered.append((page_number, None))
+                
+                # Bounded lookahead: wait for the oldest OCR page rather than buffer the whole PDF
+                yield from ready_pages(wait=len(buffered) > cls.PDF_OCR_LOOKAHEAD_PAGES)
+            
+            yield from ready_pages(wait=True)
+            
+            if any(page_ocr.stats.values()):
+                logger.info(f"OCR fallback used for PDF pages: {page_ocr.stats}")
+    
+    @classmethod
+    def _iter_extracted_pdf_pages(cls, file_content: FileBuffer, max_workers: int = None) -> Iterator[Tuple[int, str]]:
+        """Yield text-layer extraction results in page order (empty text for image-only pages)."""
+        pdf_reader = PyPDF2.PdfReader(BufferReader(file_content))
+        page_count = len(pdf_reader.pages)
+        max_workers = min(max_workers or cls.PDF_MAX_WORKERS, os.cpu_count() or 1)
+        
+        if page_count < cls.PDF_PARALLEL_MIN_PAGES or max_workers <= 1:
+            for page_num in range(page_count):
+                yield from _extract_pdf_pages(page_num, page_num + 1, pdf_reader)
+            return
+        
+        ranges = [
+            (start, min(start + cls.PDF_PAGES_PER_TASK, page_count))
+            for start in range(0, page_count, cls.PDF_PAGES_PER_TASK)
+        ]
+        
+        # Each worker parses the PDF once; tasks only carry page ranges
+        executor = ProcessPoolExecutor(
+            max_workers=max_workers, initializer=_init_pdf_worker, initargs=(_to_bytes(file_content),)
+        )
+        try:
+            # Keep a bounded number of ranges in flight so memory stays flat
+            pending = deque()
+            next_range = 0
+            while next_range < len(ranges) or pending:
+                while next_range < len(ranges) and len(pending) < max_workers * 2:
+                    pending.append(executor.submit(_extract_pdf_pages, *ranges[next_range]))
+                    next_range += 1
+                
+                for page_number, text in pending.popleft().result():
+                    yield page_number, text
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+    
+    @classmethod
+    def iter_text_segments(cls, file_content: FileBuffer, file_type: str) -> Iterator[Tuple[Dict, str]]:
+        """Yield (metadata, text) segments for streaming ingestion.
+        
+        PDFs are streamed page by page with the page number as metadata, CSV
+        and XLSX files as row blocks; other formats are extracted in full and
+        yielded as a single segment.
+        """
+        if file_type == 'pdf' and DOCUMENT_PROCESSING_AVAILABLE:
+            for page_number, text in cls.iter_pdf_pages(file_content):
+                yield {'page': page_number}, text
+            return
+        
+        if file_type in ('csv', 'xlsx'):
+            yield from cls.iter_table_segments(file_content, file_type)
+            return
+        
+        extractors = {
+            'pdf': cls.extract_text_from_pdf,
+            'docx': cls.extract_text_from_docx,
+            'csv': cls.extract_text_from_csv
+        }
+        extractor = extractors.get(file_type, cls.extract_text_from_txt)
+        success, text, message = extractor(file_content)
+        if not success:
+            raise ValueError(message)
+        yield {}, text
+    
     @staticmethod
-    def extract_text_from_docx(file_content: bytes) -> Tuple[bool, str, str]:
+    def extract_text_from_docx(file_content: FileBuffer) -> Tuple[bool, str, str]:
         """Extract text from DOCX file."""
         if not DOCUMENT_PROCESSING_AVAILABLE:
             return False, "", "DOCX processing not available"
         
         try:
-            # Save to temporary file for docx2txt
-            with tempfile.NamedTemporaryFile(suffix='.docx', delete=False) as tmp_file:
-                tmp_file.write(file_content)
-                tmp_file_path = tmp_file.name
-            
-            try:
-                text = docx2txt.process(tmp_file_path)
-                if text.strip():
-                    return True, text, "Successfully extracted text from DOCX"
-                else:
-                    return False, "", "No text content found in DOCX"
-            finally:
-                # Clean up temporary file
-                try:
-                    os.unlink(tmp_file_path)
-                except:
-                    pass
+            # docx2txt opens the DOCX with zipfile, which reads the buffer in place
+            text = docx2txt.process(BufferReader(file_content))
+            if text.strip():
+                return True, text, "Successfully extracted text from DOCX"
+            else:
+                return False, "", "No text content found in DOCX"
                     
         except Exception as e:
             return False, "", f"Error processing DOCX: {str(e)}"
     
     @staticmethod
-    def extract_text_from_txt(file_content: bytes) -> Tuple[bool, str, str]:
+    def extract_text_from_txt(file_content: FileBuffer) -> Tuple[bool, str, str]:
         """Extract text from plain text file."""
         try:
             # Try different encodings
@@ -193,7 +478,7 @@ class DocumentProcessor:
             
             for encoding in encodings:
                 try:
-                    text = file_content.decode(encoding)
+                    text = str(file_content, encoding)
                     return True, text, f"Successfully decoded as {encoding}"
                 except UnicodeDecodeError:
                     continue
@@ -203,72 +488,218 @@ class DocumentProcessor:
         except Exception as e:
             return False, "", f"Error processing text file: {str(e)}"
     
-    @staticmethod
-    def extract_text_from_csv(file_content: bytes) -> Tuple[bool, str, str]:
-        """Extract text from CSV file."""
-        if not DOCUMENT_PROCESSING_AVAILABLE:
+    @classmethod
+    def iter_table_rows(cls, file_content: FileBuffer, file_type: str) -> Iterator[Tuple[str, List[str], Iterator[tuple]]]:
+        """Yield (sheet name, header, row iterator) per table, streaming the rows.
+        
+        CSV is read in chunks of ``TABLE_READ_ROWS`` rows and XLSX in
+        openpyxl's read-only mode, so memory does not grow with the row count.
+        Each row iterator must be consumed before advancing to the next table.
+        """
+        if file_type == 'csv':
+            if not DOCUMENT_PROCESSING_AVAILABLE:
+                raise ValueError("CSV processing not available")
+            
+            reader = pd.read_csv(
+                BufferReader(file_content), chunksize=cls.TABLE_READ_ROWS, dtype=str,
+                keep_default_na=False, encoding='utf-8', encoding_errors='replace'
+            )
+            with reader:
+                first_chunk = next(iter(reader), None)
+                if first_chunk is None:
+                    return
+                
+                def csv_rows():
+                    yield from first_chunk.itertuples(index=False, name=None)
+                    for chunk in reader:
+                        yield from chunk.itertuples(index=False, name=None)
+                
+                yield "", [str(column) for column in first_chunk.columns], csv_rows()
+            return
+        
+        if not XLSX_PROCESSING_AVAILABLE:
+            raise ValueError("XLSX processing not available")
+        
+        workbook = openpyxl.load_workbook(BufferReader(file_content), read_only=True, data_only=True)
+        try:
+            for worksheet in workbook.worksheets:
+                rows = worksheet.iter_rows(values_only=True)
+                # The first non-empty row is the header
+                header = next((row for row in rows if any(cell is not None for cell in row)), None)
+                if header is None:
+                    continue
+                yield worksheet.title, ["" if cell is None else str(cell) for cell in header], rows
+        finally:
+            workbook.close()
+    
+    @classmethod
+    def iter_table_segments(cls, file_content: FileBuffer, file_type: str) -> Iterator[Tuple[Dict, str]]:
+        """Yield row-block segments of a CSV or XLSX file, each carrying the header."""
+        max_length, length_function = cls._table_block_limit()
+        for sheet, header, rows in cls.iter_table_rows(file_content, file_type):
+            metadata = {'sheet': sheet} if sheet else {}
+            yield from _iter_row_blocks(
+                header, rows, cls.TABLE_BLOCK_MAX_ROWS, max_length, metadata, length_function
+            )
+    
+    @classmethod
+    def _table_block_limit(cls):
+        """(max block length, length function) matching how chunks are sized.
+        
+        Numeric rows run at 1.5-2 characters per token, so with token-sized
+        chunks the blocks must be measured in tokens or the splitter cuts
+        them and later pieces lose the header.
+        """
+        from core.config import config
+        if config.CHUNK_SIZE_UNIT == 'tokens':
+            chunk_sizes, length_function = config.CHUNK_SIZES_TOKENS, count_tokens
+        else:
+            chunk_sizes, length_function = config.CHUNK_SIZES, len
+        chunk_size = chunk_sizes[config.DEFAULT_CHUNK_SIZE]['size']
+        return int(chunk_size * cls.TABLE_BLOCK_CHUNK_FILL), length_function
+    
+    @classmethod
+    def extract_table_summary(cls, file_content: FileBuffer, file_type: str) -> Tuple[bool, str, str]:
+        """Summarise a CSV or XLSX file (shape plus a preview), streaming the rows."""
+        label = file_type.upper()
+        if file_type == 'csv' and not DOCUMENT_PROCESSING_AVAILABLE:
             return False, "", "CSV processing not available"
+        if file_type == 'xlsx' and not XLSX_PROCESSING_AVAILABLE:
+            return False, "", "XLSX processing not available"
         
         try:
-            csv_file = io.StringIO(file_content.decode('utf-8'))
-            df = pd.read_csv(csv_file)
-            
-            # Convert DataFrame to readable text format
-            text_parts = [f"CSV Data ({len(df)} rows, {len(df.columns)} columns)\n"]
-            text_parts.append("Columns: " + ", ".join(df.columns))
-            text_parts.append("\nData Preview:")
-            text_parts.append(df.head(10).to_string())
+            text_parts = []
+            total_rows = 0
+            for sheet, header, rows in cls.iter_table_rows(file_content, file_type):
+                preview = []
+                row_count = 0
+                for values in rows:
+                    row_count += 1
+                    if len(preview) < cls.TABLE_PREVIEW_ROWS:
+                        preview.append(_format_table_row(values))
+                total_rows += row_count
+                
+                title = f"{label} Data" + (f" - sheet '{sheet}'" if sheet else "")
+                text_parts.append(f"{title} ({row_count} rows, {len(header)} columns)\n")
+                text_parts.append("Columns: " + ", ".join(header))
+                text_parts.append("\nData Preview:")
+                text_parts.append("\n".join([_format_table_row(header)] + preview))
+                if row_count > len(preview):
+                    text_parts.append(f"\n... and {row_count - len(preview)} more rows")
             
-            if len(df) > 10:
-                text_parts.append(f"\n... and {len(df) - 10} more rows")
+            if not text_parts:
+                return False, "", f"No data found in {label}"
             
             full_text = "\n".join(text_parts)
-            return True, full_text, f"Processed CSV with {len(df)} rows"
+            return True, full_text, f"Processed {label} with {total_rows} rows"
+            
+        except Exception as e:
+            return False, "", f"Error processing {label}: {str(e)}"
+    
+    @classmethod
+    def extract_text_from_csv(cls, file_content: FileBuffer) -> Tuple[bool, str, str]:
+        """Extract a summary from CSV file; rows are ingested by iter_table_segments."""
+        return cls.extract_table_summary(file_content, 'csv')
+    
+    @classmethod
+    def extract_text_from_xlsx(cls, file_content: FileBuffer) -> Tuple[bool, str, str]:
+        """Extract a summary from XLSX file; rows are ingested by iter_table_segments."""
+        return cls.extract_table_summary(file_content, 'xlsx')
+    
+    @classmethod
+    def preview_text(cls, file_content: FileBuffer, file_type: str, max_chars: int = None) -> str:
+        """The start of a document's text, for the upload preview.
+        
+        Only the first pages or bytes are read and scanned pages are not
+        OCRed; full extraction runs in the ingestion job. Returns "" when
+        nothing can be previewed.
+        """
+        max_chars = max_chars or cls.PREVIEW_MAX_CHARS
+        try:
+            if file_type == 'pdf':
+                if not DOCUMENT_PROCESSING_AVAILABLE:
+                    return ""
+                reader = PyPDF2.PdfReader(BufferReader(file_content))
+                parts = []
+                length = 0
+                for page_num in range(min(len(reader.pages), cls.PREVIEW_MAX_PAGES)):
+                    for page_number, text in _extract_pdf_pages(page_num, page_num + 1, reader):
+                        if text:
+                            parts.append(f"--- Page {page_number} ---\n{text}")
+                            length += len(parts[-1])
+                    if length >= max_chars:
+                        break
+                return "\n\n".join(parts)[:max_chars]
+            
+            if file_type in ('docx', 'csv', 'xlsx'):
+                for _, text in cls.iter_text_segments(file_content, file_type):
+                    return text[:max_chars]
+                return ""
             
+            # Plain text: decode at most 4 bytes per character; a character cut at the end is dropped
+            head = bytes(memoryview(file_content).cast('B')[:max_chars * 4])
+            try:
+                text = codecs.getincrementaldecoder('utf-8')().decode(head)
+            except UnicodeDecodeError:
+                text = head.decode('latin-1')
+            return text[:max_chars]
+        
         except Exception as e:
-            return False, "", f"Error processing CSV: {str(e)}"
+            logger.warning(f"Could not preview {file_type} upload: {e}")
+            return ""
+    
+    @staticmethod
+    def describe_upload(uploaded_file) -> Tuple[memoryview, Dict]:
+        """An upload's content (not copied) and its metadata, without extracting any text."""
+        filename = sanitize_filename(uploaded_file.name)
+        file_content = get_upload_buffer(uploaded_file)
+        metadata = {
+            'filename': filename,
+            'file_type': filename.split('.')[-1].lower() if '.' in filename else '',
+            'file_size': file_content.nbytes,
+            'upload_time': datetime.now().isoformat(),
+            'file_hash': get_file_hash(file_content)
+        }
+        return file_content, metadata
     
     @classmethod
-    def process_uploaded_file(cls, uploaded_file) -> Tuple[bool, str, str, Dict]:
-        """Process uploaded file and extract text content."""
+    def process_uploaded_file(cls, uploaded_file, ocr: bool = True) -> Tuple[bool, str, str, Dict]:
+        """Process uploaded file and extract text content.
+        
+        ``ocr=False`` skips OCR of scanned PDF pages, for previews of files
+        that are OCRed when ingested.
+        """
         if not uploaded_file:
             return False, "", "No file uploaded", {}
         
         try:
             # Get file info
-            filename = sanitize_filename(uploaded_file.name)
-            file_size = len(uploaded_file.getvalue())
-            file_type = filename.split('.')[-1].lower() if '.' in filename else ''
-            
-            # Create metadata
-            metadata = {
-                'filename': filename,
-                'file_type': file_type,
-                'file_size': file_size,
-                'upload_time': datetime.now().isoformat(),
-                'file_hash': get_file_hash(uploaded_file.getvalue())
-            }
+            file_content, metadata = cls.describe_upload(uploaded_file)
+            file_type = metadata['file_type']
             
             # Process based on file type
-            file_content = uploaded_file.getvalue()
             
             if file_type == 'pdf':
-                success, text, message = cls.extract_text_from_pdf(file_content)
+                success, text, message = cls.extract_text_from_pdf(file_content, ocr=ocr)
             elif file_type == 'docx':
                 success, text, message = cls.extract_text_from_docx(file_content)
             elif file_type in ['txt', 'md']:
                 success, text, message = cls.extract_text_from_txt(file_content)
             elif file_type == 'csv':
                 success, text, message = cls.extract_text_from_csv(file_content)
+            elif file_type == 'xlsx':
+                success, text, message = cls.extract_text_from_xlsx(file_content)
             else:
                 # Try as plain text
                 success, text, message = cls.extract_text_from_txt(file_content)
                 if not success:
                     return False, "", f"Unsupported file type: {file_type}", metadata
             
-            if success and text.strip():
+            # isspace() avoids the full copy strip() would make of a large text
+            if success and text and not text.isspace():
                 metadata['text_length'] = len(text)
-                metadata['word_count'] = len(text.split())
+                # Count without materialising a list of every word
+                metadata['word_count'] = sum(1 for _ in re.finditer(r'\S+', text))
                 return True, text, message, metadata
             else:
                 return False, "", message, metadata
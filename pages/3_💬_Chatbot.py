@@ -18,8 +18,9 @@ from core.conversations import (
     create_conversation, get_user_conversations, get_conversation_messages,
     add_message, update_conversation_title, delete_conversation
 )
-from core.rag import process_document, get_relevant_context, get_rag_status
+from core.rag import submit_document, get_relevant_context, get_rag_status
 from core.utils import DocumentProcessor, ErrorHandler, format_file_size, truncate_text, format_timestamp
+from utils.ingestion_jobs import ingestion_jobs, ACTIVE_STATUSES
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -310,55 +311,91 @@ def render_document_upload():
     if uploaded_files:
         for uploaded_file in uploaded_files:
             # Validate file
-            file_size = len(uploaded_file.getvalue())
+            file_size = uploaded_file.size
             
             if file_size > MAX_FILE_SIZE_MB * 1024 * 1024:
                 st.error(f"❌ {uploaded_file.name}: File too large ({format_file_size(file_size)} > {MAX_FILE_SIZE_MB}MB)")
                 continue
             
-            # Process file
+            # Only a short preview is extracted here; the indexing job extracts (and OCRs) the full text
             with st.spinner(f"Processing {uploaded_file.name}..."):
                 try:
-                    # Extract text content
-                    success, text_content, message, metadata = DocumentProcessor.process_uploaded_file(uploaded_file)
+                    file_content, metadata = DocumentProcessor.describe_upload(uploaded_file)
+                    file_type = metadata['file_type']
+                    preview = DocumentProcessor.preview_text(file_content, file_type)
                     
-                    if success and text_content:
-                        st.success(f"✅ Extracted text from {uploaded_file.name}")
-                        
-                        # Show preview
-                        with st.expander(f"Preview: {uploaded_file.name}"):
+                    # Show preview
+                    with st.expander(f"Preview: {uploaded_file.name}"):
+                        if preview:
                             st.text_area(
                                 "Content Preview",
-                                value=truncate_text(text_content, 1000),
+                                value=truncate_text(preview, 1000),
                                 height=200,
                                 disabled=True
                             )
-                            st.json(metadata)
-                        
-                        # Process for RAG
-                        if st.button(f"Add {uploaded_file.name} to Knowledge Base", key=f"add_{uploaded_file.name}"):
-                            with st.spinner("Adding to knowledge base..."):
-                                rag_success, rag_message, doc_id = run_async(process_document(
-                                    conversation_id=st.session_state.current_conversation_id,
-                                    user_id=get_current_user_id(),
-                                    filename=uploaded_file.name,
-                                    file_content=text_content,
-                                    file_type=metadata.get('file_type', ''),
-                                    file_size=metadata.get('file_size', 0)
-                                ))
-                                
-                                if rag_success:
-                                    st.success(f"🎉 {rag_message}")
-                                else:
-                                    st.error(f"❌ {rag_message}")
+                        else:
+                            st.caption("No text to preview yet; scanned pages are read with OCR when the document is added.")
+                        st.json(metadata)
                     
-                    else:
-                        st.error(f"❌ Failed to process {uploaded_file.name}: {message}")
+                    # Process for RAG in the background so chatting stays responsive
+                    if st.button(f"Add {uploaded_file.name} to Knowledge Base", key=f"add_{uploaded_file.name}"):
+                        submit_document(
+                            conversation_id=st.session_state.current_conversation_id,
+                            user_id=get_current_user_id(),
+                            filename=uploaded_file.name,
+                            # The view shares the upload's bytes without copying; the queued job
+                            # holds it, which keeps them alive after this script run ends
+                            file_content=file_content,
+                            file_type=file_type,
+                            file_size=metadata['file_size'],
+                            content_preview=preview[:500] or None
+                        )
+                        st.info(f"⏳ {uploaded_file.name} queued for indexing. You can keep chatting meanwhile.")
                 
                 except Exception as e:
                     ErrorHandler.handle_streamlit_error(e, f"Processing {uploaded_file.name}")
 
 
+def render_ingestion_jobs():
+    """Render background indexing jobs for the current conversation."""
+    user_id = get_current_user_id()
+    jobs = ingestion_jobs.list_jobs(user_id, st.session_state.current_conversation_id)
+    if not jobs:
+        return
+    
+    st.markdown("**Indexing status**")
+    for job in jobs:
+        col1, col2 = st.columns([4, 1])
+        
+        with col1:
+            if job['status'] in ACTIVE_STATUSES:
+                done, total = job['chunks_done'], job['chunks_total']
+                label = f"{job['filename']}: {done}/{total} chunks" if total else f"{job['filename']}: {job['status']}..."
+                st.progress(done / total if total else 0.0, text=label)
+            elif job['status'] == 'completed':
+                st.success(f"🎉 {job['filename']}: {job['message']}")
+            elif job['status'] == 'cancelled':
+                st.warning(f"⏹️ {job['filename']}: {job['message']}")
+            else:
+                st.error(f"❌ {job['filename']}: {job['message']}")
+        
+        with col2:
+            if job['status'] in ACTIVE_STATUSES:
+                if st.button("Cancel", key=f"cancel_{job['id']}"):
+                    ingestion_jobs.cancel(job['id'])
+                    st.rerun()
+    
+    if not any(job['status'] in ACTIVE_STATUSES for job in jobs):
+        if st.button("Clear finished", key="clear_finished_jobs"):
+            ingestion_jobs.clear_finished(user_id, st.session_state.current_conversation_id)
+            st.rerun()
+
+
+# Poll job progress without blocking the rest of the page when fragments are available
+if hasattr(st, 'fragment'):
+    render_ingestion_jobs = st.fragment(run_every=2)(render_ingestion_jobs)
+
+
 def render_messages():
     """Render conversation messages."""
     if not st.session_state.messages:
@@ -539,6 +576,9 @@ def main():
             with tab2:
                 # Document upload
                 render_document_upload()
+                
+                # Background indexing progress
+                render_ingestion_jobs()
         
         else:
             st.error("❌ Selected conversation not found. Please select another conversation.")
@@ -9,6 +9,8 @@ import logging
 from datetime import datetime
 from typing import Dict, List, Optional
 
+from utils.ann_index import user_ann_indexes
+
 # Configure logging
 logger = logging.getLogger(__name__)
 
@@ -239,6 +241,8 @@ class ConversationService:
             
             # Verify deletion was successful by checking affected rows
             if result.data is not None:
+                # The delete cascades to document_chunks; drop them from the user's ANN index too
+                user_ann_indexes.remove_conversation(user_uuid, conversation_id)
                 logger.info(f"Conversation successfully deleted: {conversation_id} by user: {user_uuid}")
                 return True
             else:
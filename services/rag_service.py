@@ -5,18 +5,29 @@ Handles document processing, embeddings, and semantic search
 
 import logging
 import asyncio
-from typing import List, Dict, Optional, Tuple
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
 from datetime import datetime
 import json
 
 # LangChain imports
-from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.schema import Document
 try:
     from langchain_mistralai.embeddings import MistralAIEmbeddings
 except ImportError:
     from langchain_community.embeddings import MistralAIEmbeddings
-from langchain.docstore.document import Document as LangChainDocument
+
+from utils.embedding_cache import embedding_cache, query_embedding_cache
+from utils.embedding_scheduler import EmbeddingScheduler
+from utils.ingestion_pipeline import IngestionPipeline
+from utils.text_splitter import TextSplitter
+from utils.tokenizer import count_tokens
+from utils.ann_index import user_ann_indexes
+from utils.bm25_index import bm25_index_cache
+from utils.context_packer import pack_context, strip_overlap
+from utils.document_context_cache import document_context_cache
+from utils.entity_index import entity_index_cache
+from utils.vector_codec import EMBEDDING_COLUMNS, dumps, embedding_columns, parse_vector, vector_param
+from utils.vector_index import ConversationVectorIndex, vector_index_cache
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -24,34 +35,71 @@ logger = logging.getLogger(__name__)
 class RAGService:
     """Advanced RAG service with LangChain and pgvector - Full Document Processing by Default."""
     
-    def __init__(self, default_full_document_mode: bool = True):
+    # (similarity_threshold, max_chunks) tiers used to build conversation context
+    CONTEXT_RETRIEVAL_TIERS = [
+        (0.7, 5),   # High similarity chunks
+        (0.5, 10)   # Medium similarity chunks for broader context
+    ]
+    
+    # (chunk_size, chunk_overlap) per splitter and unit; token sizes match the character sizes at ~4 chars/token
+    CHUNK_SIZES = {
+        'characters': {'standard': (1500, 300), 'large': (3000, 500), 'similarity': (800, 200)},
+        'tokens': {'standard': (384, 75), 'large': (768, 125), 'similarity': (200, 50)}
+    }
+    
+    # Rows per request when building a user's ANN index from document_chunks
+    ANN_BUILD_PAGE_SIZE = 1000
+    
+    # get_conversation_chunks columns needed to reassemble documents (no embeddings)
+    DOCUMENT_COLUMNS = 'document_id, chunk_index, content, metadata'
+    
+    def __init__(self, default_full_document_mode: bool = True, chunk_size_unit: str = 'tokens'):
         # Lazy initialization - only initialize embeddings when needed
         self.embeddings = None
+        self.embedding_scheduler = None
         self._embeddings_initialized = False
         
+        # Chunks are sized in embedding tokens by default, or in characters
+        sizes = self.CHUNK_SIZES[chunk_size_unit]
+        length_function = count_tokens if chunk_size_unit == 'tokens' else None
+        
         # Initialize text splitter optimized for full document knowledge base
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1500,  # Much larger chunks to preserve more context
-            chunk_overlap=300,  # Substantial overlap to maintain continuity
-            length_function=len,
-            separators=["\n\n", "\n", ". ", "! ", "? ", "; ", ", ", " ", ""]
+        self.text_splitter = TextSplitter(
+            *sizes['standard'],  # Large chunks with substantial overlap to preserve context
+            separators=["\n\n", "\n", ". ", "! ", "? ", "; ", ", ", " ", ""],
+            length_function=length_function
         )
         
         # Alternative splitter for very large documents
-        self.large_doc_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=3000,  # Very large chunks for comprehensive context
-            chunk_overlap=500,  # Large overlap for continuity
-            length_function=len,
-            separators=["\n\n\n", "\n\n", "\n", ". ", "! ", "? "]
+        self.large_doc_splitter = TextSplitter(
+            *sizes['large'],  # Very large chunks for comprehensive context
+            separators=["\n\n\n", "\n\n", "\n", ". ", "! ", "? "],
+            length_function=length_function
+        )
+        
+        # Smaller chunks for similarity search mode
+        self.similarity_splitter = TextSplitter(
+            *sizes['similarity'],
+            separators=["\n\n", "\n", ". ", "! ", "? ", "; ", ", ", " ", ""],
+            length_function=length_function
         )
         
         # Set default processing mode
         self.default_full_document_mode = default_full_document_mode
+        
+        # document_chunks ingest throughput (embedding + storage)
+        self.ingest_stats = {
+            'chunks_stored': 0,
+            'ingest_seconds': 0.0
+        }
         logger.info("RAG Service initialized (lazy mode)")
         
         # Import Supabase connection
         from supabase_manager import connection_manager
         self.db = connection_manager
+        
+        # Cleared when the database lacks the get_conversation_document_stats function
+        self._document_stats_rpc_available = True
     
     def _initialize_embeddings(self):
         """Initialize embeddings model only when needed (lazy loading)."""
@@ -60,8 +108,17 @@ class RAGService:
         
         try:
             from openai_client import get_api_keys
+            from core.config import config
             _, _, mistral_key = get_api_keys()
             self.embeddings = MistralAIEmbeddings(mistral_api_key=mistral_key)
+            self.embedding_scheduler = EmbeddingScheduler(
+                self.embeddings.embed_documents,
+                max_concurrency=config.EMBEDDING_MAX_CONCURRENCY,
+                requests_per_second=config.EMBEDDING_REQUESTS_PER_SECOND,
+                tokens_per_minute=config.EMBEDDING_TOKENS_PER_MINUTE,
+                max_batch_tokens=config.EMBEDDING_MAX_BATCH_TOKENS,
+                token_counter=count_tokens
+            )
             logger.info("Using MistralAI embeddings")
         except Exception as e:
             logger.error(f"Failed to initialize MistralAI embeddings: {e}")
@@ -79,10 +136,49 @@ class RAGService:
         use_full_document_mode: bool = True  # Default to full document processing
     ) -> bool:
         """Process document for full knowledge base (default) or similarity search."""
+        return await self.process_document_stream(
+            [({}, document_content)],
+            document_id,
+            conversation_id,
+            user_uuid,
+            metadata=metadata,
+            use_full_document_mode=use_full_document_mode,
+            expected_length=len(document_content)
+        )
+    
+    def _select_splitter(self, doc_length: Optional[int], use_full_document_mode: bool):
+        """Choose splitter based on document size and mode."""
+        if use_full_document_mode:
+            if doc_length and doc_length > 10000:  # Large documents get very large chunks
+                logger.info(f"Using large document splitter for {doc_length} character document")
+                return self.large_doc_splitter
+            
+            logger.info(f"Using standard splitter for {doc_length or 'streamed'} character document")
+            return self.text_splitter
+        
+        # Fallback to smaller chunks for similarity search
+        return self.similarity_splitter
+    
+    async def process_document_stream(
+        self,
+        segments: Iterable[Tuple[Dict, str]],
+        document_id: str,
+        conversation_id: str,
+        user_uuid: str,
+        metadata: Dict = None,
+        use_full_document_mode: bool = True,
+        expected_length: Optional[int] = None,
+        on_progress: Callable = None
+    ) -> bool:
+        """Process a document streamed as (metadata, text) segments, e.g. PDF pages.
+        
+        Splitting, embedding and storage run as overlapping pipeline stages,
+        so the first chunks are stored while later segments are still coming in.
+        """
         try:
             logger.info(f"Processing document {document_id}")
             
-            # Create LangChain document with enhanced metadata
+            # Enhanced metadata shared by every chunk
             enhanced_metadata = metadata or {}
             enhanced_metadata.update({
                 'processing_mode': 'full_document_knowledge_base',
@@ -91,173 +187,236 @@ class RAGService:
                 'conversation_id': conversation_id
             })
             
-            doc = LangChainDocument(
-                page_content=document_content,
-                metadata=enhanced_metadata
-            )
-            
-            # Choose splitter based on document size and mode
-            doc_length = len(document_content)
-            
-            if use_full_document_mode:
-                if doc_length > 10000:  # Large documents get very large chunks
-                    splitter = self.large_doc_splitter
-                    logger.info(f"Using large document splitter for {doc_length} character document")
-                else:
-                    splitter = self.text_splitter
-                    logger.info(f"Using standard splitter for {doc_length} character document")
-            else:
-                # Fallback to smaller chunks for similarity search
-                splitter = RecursiveCharacterTextSplitter(
-                    chunk_size=800,
-                    chunk_overlap=200,
-                    length_function=len,
-                    separators=["\n\n", "\n", ". ", "! ", "? ", "; ", ", ", " ", ""]
-                )
-            
-            # Split document into chunks
-            chunks = splitter.split_documents([doc])
-            logger.info(f"Split document into {len(chunks)} chunks")
-            
-            # Process chunks in batches
-            batch_size = 10
-            for i in range(0, len(chunks), batch_size):
-                batch = chunks[i:i + batch_size]
-                await self._process_chunk_batch(
-                    batch, document_id, conversation_id, user_uuid, i
-                )
-            
-            logger.info(f"Successfully processed {len(chunks)} chunks")
-            return True
+            splitter = self._select_splitter(expected_length, use_full_document_mode)
             
-        except Exception as e:
-            logger.error(f"Error processing document {document_id}: {e}")
-            return False
-    
-    async def _process_chunk_batch(
-        self,
-        chunks: List[LangChainDocument],
-        document_id: str,
-        conversation_id: str,
-        user_uuid: str,
-        start_index: int
-    ):
-        """Process a batch of chunks with enhanced error handling."""
-        try:
-            # Extract text content from chunks
-            texts = [chunk.page_content for chunk in chunks]
-            
-            # Generate embeddings for the batch
-            embeddings = await self._generate_embeddings(texts)
-            
-            # Store chunks with embeddings
-            successful_inserts = 0
-            for idx, (chunk, embedding) in enumerate(zip(chunks, embeddings)):
-                try:
-                    chunk_data = {
+            async def store_chunks(batch: List[Dict], embeddings: List[List[float]]) -> int:
+                rows = [
+                    {
                         'document_id': document_id,  # Fixed: changed from 'document_uuid' to 'document_id'
                         'conversation_id': conversation_id,
                         'user_uuid': user_uuid,
-                        'chunk_index': start_index + idx,
-                        'content': chunk.page_content,
-                        'embedding': embedding,
-                        'metadata': json.dumps(chunk.metadata)
+                        'chunk_index': chunk['chunk_index'],
+                        'content': chunk['content'],
+                        'metadata': dumps({**enhanced_metadata, **chunk['metadata']}),
+                        **embedding_columns(embedding)
                     }
-                    
-                    # Insert into database with retry logic
-                    result = await self._insert_chunk_with_retry(chunk_data)
-                    
-                    if result:
-                        successful_inserts += 1
-                    else:
-                        logger.warning(f"Failed to insert chunk {start_index + idx}")
-                        
-                except Exception as chunk_error:
-                    logger.error(f"Error inserting chunk {start_index + idx}: {chunk_error}")
-                    # Continue with other chunks
+                    for chunk, embedding in zip(batch, embeddings)
+                ]
+                successful_inserts = await self._insert_chunks_bulk(rows)
+                # The conversation's cached vector index no longer covers all its chunks
+                vector_index_cache.invalidate((user_uuid, conversation_id))
+                document_context_cache.invalidate((user_uuid, conversation_id))
+                if successful_inserts == len(rows):
+                    user_ann_indexes.add(
+                        user_uuid,
+                        [{key: value for key, value in row.items() if key not in EMBEDDING_COLUMNS} for row in rows],
+                        embeddings
+                    )
+                elif successful_inserts:
+                    # Which rows failed isn't known here; rebuild on the next search
+                    user_ann_indexes.drop(user_uuid)
+                logger.info(f"Successfully inserted {successful_inserts}/{len(rows)} chunks")
+                return successful_inserts
+            
+            pipeline = IngestionPipeline(
+                split_fn=splitter.split_text,
+                embed_fn=self._generate_embeddings,
+                store_fn=store_chunks,
+                on_progress=on_progress
+            )
+            totals = await pipeline.run(segments)
             
-            logger.info(f"Successfully inserted {successful_inserts}/{len(chunks)} chunks")
+            self._record_ingest_throughput(totals['chunks_stored'], totals['elapsed'])
+            logger.info(
+                f"Successfully processed {totals['chunks_split']} chunks "
+                f"({totals['chunks_stored'] / totals['elapsed'] if totals['elapsed'] else 0:.1f} document_chunks rows/s)"
+            )
+            return True
             
         except Exception as e:
-            logger.error(f"Error processing chunk batch: {e}")
-            raise
+            logger.error(f"Error processing document {document_id}: {e}")
+            return False
+        finally:
+            user_ann_indexes.flush(user_uuid)
     
-    async def _insert_chunk_with_retry(self, chunk_data: dict, max_retries: int = 3) -> bool:
-        """Insert chunk with retry logic for RLS issues."""
+    async def _insert_chunks_bulk(self, rows: List[Dict], max_retries: int = 3) -> int:
+        """Insert a batch of chunk rows in one request, retrying only failed rows."""
+        if not rows:
+            return 0
         
-        # Ensure user_uuid is properly formatted
-        if 'user_uuid' in chunk_data and chunk_data['user_uuid']:
+        # Ensure user_uuid is properly formatted (all rows share the same user)
+        user_uuid = rows[0].get('user_uuid')
+        if user_uuid:
             try:
                 import uuid
-                # Validate and ensure proper UUID format
-                if isinstance(chunk_data['user_uuid'], str):
-                    uuid_obj = uuid.UUID(chunk_data['user_uuid'])
-                    chunk_data['user_uuid'] = str(uuid_obj)
+                user_uuid = str(uuid.UUID(str(user_uuid)))
             except ValueError as e:
-                logger.error(f"Invalid UUID format: {chunk_data['user_uuid']} - {e}")
-                return False
-        
-        for attempt in range(max_retries):
+                logger.error(f"Invalid UUID format: {user_uuid} - {e}")
+                return 0
+            
+            for row in rows:
+                row['user_uuid'] = user_uuid
+            
+            # Set user context once for the whole batch
             try:
-                # Set user context before insertion
-                if 'user_uuid' in chunk_data:
-                    await self.db.execute_rpc('set_user_context', {'user_uuid_param': chunk_data['user_uuid']})
-                
-                result = await self.db.execute_query(
-                    'document_chunks',
-                    'insert',
-                    data=chunk_data
-                )
-                
-                if result and hasattr(result, 'data') and result.data:
-                    logger.debug(f"Successfully inserted chunk on attempt {attempt + 1}")
-                    return True
-                else:
-                    logger.warning(f"Insert attempt {attempt + 1} failed - no data returned")
-                    
+                await self.db.execute_rpc('set_user_context', {'user_uuid_param': user_uuid})
             except Exception as e:
-                error_msg = str(e)
-                logger.error(f"Insert attempt {attempt + 1} failed: {error_msg}")
-                
-                # Check for specific error types
-                if "relation \"document_chunks\" does not exist" in error_msg.lower():
-                    logger.error("document_chunks table does not exist! Please run the database migration.")
-                    return False
-                elif "row-level security policy" in error_msg.lower():
-                    logger.error(f"RLS policy violation on attempt {attempt + 1}")
-                    # Continue to retry
-                elif "permission denied" in error_msg.lower():
-                    logger.error("Permission denied - check database permissions")
-                    return False
-                
-                if attempt == max_retries - 1:
-                    logger.error(f"All {max_retries} insert attempts failed for chunk")
-                    return False
-                    
-                # Wait before retry
-                await asyncio.sleep(0.5 * (attempt + 1))
+                logger.warning(f"Could not set user context: {e}")
         
-        return False
+        inserted, failed_rows = await self.db.execute_many(
+            'document_chunks', rows, max_retries=max_retries
+        )
+        
+        for row in failed_rows:
+            logger.warning(f"Failed to insert chunk {row.get('chunk_index')}")
+        
+        return inserted
+    
+    def _record_ingest_throughput(self, chunks_stored: int, elapsed: float):
+        """Accumulate document_chunks ingest throughput."""
+        self.ingest_stats['chunks_stored'] += chunks_stored
+        self.ingest_stats['ingest_seconds'] += elapsed
+    
+    def get_ingest_stats(self) -> Dict:
+        """Get document_chunks ingest throughput in rows per second."""
+        stats = self.ingest_stats.copy()
+        seconds = stats['ingest_seconds']
+        stats['rows_per_second'] = stats['chunks_stored'] / seconds if seconds else 0.0
+        return stats
+    
+    def _embedding_model(self) -> str:
+        """Name of the embedding model, used to key cached embeddings."""
+        return getattr(self.embeddings, 'model', None) or "mistral-embed"
     
     async def _generate_embeddings(self, texts: List[str]) -> List[List[float]]:
         """Generate embeddings for a list of texts."""
         try:
+            # Reuse embeddings of chunks seen before (re-uploads, shared material)
+            model = self._embedding_model()
+            embeddings = await embedding_cache.get_many_async(model, texts)
+            missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+            if not missing:
+                return embeddings
+            
             # Initialize embeddings if not already done
             self._initialize_embeddings()
             
-            # Run embedding generation in thread pool to avoid blocking
-            loop = asyncio.get_event_loop()
-            embeddings = await loop.run_in_executor(
-                None, 
-                self.embeddings.embed_documents, 
-                texts
-            )
+            # Token-sized batches, run concurrently under the API rate limits
+            missing_texts = [texts[i] for i in missing]
+            new_embeddings = await self.embedding_scheduler.embed(missing_texts)
+            
+            await embedding_cache.put_many_async(model, missing_texts, new_embeddings)
+            for i, embedding in zip(missing, new_embeddings):
+                embeddings[i] = embedding
             return embeddings
             
         except Exception as e:
             logger.error(f"Error generating embeddings: {e}")
             raise
     
+    async def _embed_query(self, query: str) -> List[float]:
+        """Generate the embedding for a search query (cached, in-flight requests shared)."""
+        return await query_embedding_cache.get_or_compute(
+            self._embedding_model(), query, self._compute_query_embedding
+        )
+    
+    async def _compute_query_embedding(self, query: str) -> List[float]:
+        """Call the embedding model for a search query."""
+        # Initialize embeddings if not already done
+        self._initialize_embeddings()
+        
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(
+            None,
+            self.embeddings.embed_query,
+            query
+        )
+    
+    async def _search_chunks_by_embedding(
+        self,
+        query_embedding: List[float],
+        conversation_id: str,
+        user_uuid: str,
+        similarity_threshold: float,
+        max_chunks: int
+    ) -> List[Dict]:
+        """Search for an already embedded query.
+        
+        Served from the conversation's in-memory vector index when it can be
+        held, otherwise by the pgvector RPC.
+        """
+        index = await vector_index_cache.get_or_load(
+            (user_uuid, conversation_id),
+            lambda: self._load_conversation_index(conversation_id, user_uuid)
+        )
+        if index is not None:
+            try:
+                return index.search(query_embedding, similarity_threshold, max_chunks)
+            except ValueError as e:
+                logger.warning(f"In-memory search unavailable, using pgvector: {e}")
+        
+        result = await self.db.execute_rpc(
+            'search_document_chunks',
+            {
+                'query_embedding': vector_param(query_embedding),
+                'target_conversation_id': conversation_id,
+                'target_user_uuid': user_uuid,
+                'similarity_threshold': similarity_threshold,
+                'match_count': max_chunks
+            }
+        )
+        return result.data or []
+    
+    async def _load_conversation_index(
+        self,
+        conversation_id: str,
+        user_uuid: str
+    ) -> Optional[ConversationVectorIndex]:
+        """Build the in-memory vector index of a conversation's chunks, or None on failure."""
+        try:
+            result = await self.db.execute_rpc(
+                'get_conversation_chunks',
+                {
+                    'target_conversation_id': conversation_id,
+                    'target_user_uuid': user_uuid
+                }
+            )
+            chunks = result.data or []
+            
+            # Older get_conversation_chunks definitions don't return embeddings
+            if chunks and 'embedding' not in chunks[0]:
+                embedding_rows = await self.db.execute_query(
+                    'document_chunks',
+                    'select',
+                    columns='document_id, chunk_index, embedding',
+                    eq={
+                        'conversation_id': conversation_id,
+                        'user_uuid': user_uuid
+                    }
+                )
+                embeddings = {
+                    (row['document_id'], row['chunk_index']): row['embedding']
+                    for row in embedding_rows.data or []
+                }
+                for chunk in chunks:
+                    chunk['embedding'] = embeddings.get((chunk['document_id'], chunk['chunk_index']))
+            
+            rows = []
+            vectors = []
+            for chunk in chunks:
+                embedding = parse_vector(chunk.pop('embedding', None))
+                if embedding is not None:
+                    rows.append(chunk)
+                    vectors.append(embedding)
+            
+            index = ConversationVectorIndex(rows, vectors)
+            logger.info(f"Loaded vector index of {len(index)} chunks for conversation {conversation_id}")
+            return index
+            
+        except Exception as e:
+            logger.warning(f"Could not build vector index for conversation {conversation_id}: {e}")
+            return None
+    
     async def search_similar_chunks(
         self,
         query: str,
@@ -270,184 +429,201 @@ class RAGService:
         try:
             logger.info(f"Searching for similar chunks: '{query[:50]}...'")
             
-            # Initialize embeddings if not already done
-            self._initialize_embeddings()
-            
             # Generate embedding for query
-            loop = asyncio.get_event_loop()
-            query_embedding = await loop.run_in_executor(
-                None,
-                self.embeddings.embed_query,
-                query
-            )
+            query_embedding = await self._embed_query(query)
             
             # Search using pgvector function
-            result = await self.db.execute_rpc(
-                'search_document_chunks',
-                {
-                    'query_embedding': query_embedding,
-                    'target_conversation_id': conversation_id,
-                    'target_user_uuid': user_uuid,
-                    'similarity_threshold': similarity_threshold,
-                    'match_count': max_chunks
-                }
+            chunks = await self._search_chunks_by_embedding(
+                query_embedding, conversation_id, user_uuid, similarity_threshold, max_chunks
             )
             
-            if result.data:
-                logger.info(f"Found {len(result.data)} similar chunks")
-                return result.data
+            if chunks:
+                logger.info(f"Found {len(chunks)} similar chunks")
             else:
                 logger.info("No similar chunks found")
-                return []
+            return chunks
                 
         except Exception as e:
             logger.error(f"Error searching similar chunks: {e}")
             return []
     
+    async def search_tiered_chunks(
+        self,
+        query: str,
+        conversation_id: str,
+        user_uuid: str,
+        tiers: List[Tuple[float, int]] = None
+    ) -> List[Dict]:
+        """Search once and apply several (threshold, max_chunks) tiers locally.
+        
+        The query is embedded once and the widest candidate set (lowest
+        threshold, largest count) is fetched in a single RPC. Each tier then
+        keeps its best chunks above its threshold and the union is returned
+        deduplicated and sorted by similarity.
+        """
+        tiers = tiers or self.CONTEXT_RETRIEVAL_TIERS
+        
+        try:
+            logger.info(f"Searching for similar chunks (tiered): '{query[:50]}...'")
+            
+            query_embedding = await self._embed_query(query)
+            candidates = await self._search_chunks_by_embedding(
+                query_embedding,
+                conversation_id,
+                user_uuid,
+                similarity_threshold=min(threshold for threshold, _ in tiers),
+                max_chunks=max(count for _, count in tiers)
+            )
+        except Exception as e:
+            logger.error(f"Error searching similar chunks: {e}")
+            return []
+        
+        candidates.sort(key=lambda x: x.get('similarity', 0), reverse=True)
+        
+        seen_chunks = set()
+        selected = []
+        for threshold, count in tiers:
+            tier_chunks = [c for c in candidates if c.get('similarity', 0) >= threshold][:count]
+            for chunk in tier_chunks:
+                chunk_id = f"{chunk['document_id']}_{chunk['chunk_index']}"
+                if chunk_id not in seen_chunks:
+                    seen_chunks.add(chunk_id)
+                    selected.append(chunk)
+        
+        selected.sort(key=lambda x: x.get('similarity', 0), reverse=True)
+        logger.info(f"Found {len(selected)} similar chunks from {len(candidates)} candidates")
+        return selected
+    
     async def get_full_document_context(
         self,
         conversation_id: str,
         user_uuid: str,
         max_context_length: int = 15000  # Much larger for full document context
     ) -> str:
-        """Get complete document context for conversation (entire documents as knowledge base)."""
+        """Get complete document context for conversation (entire documents as knowledge base).
+        
+        Documents are reassembled once per conversation and the rendered
+        context is cached per length budget until a document is added or
+        deleted.
+        """
         try:
             logger.info(f"Getting document context for conversation {conversation_id}")
             
-            # Get ALL chunks for this conversation (not just similar ones)
-            result = await self.db.execute_rpc(
-                'get_conversation_chunks',
-                {
-                    'target_conversation_id': conversation_id,
-                    'target_user_uuid': user_uuid
-                }
+            full_context = await document_context_cache.get_or_build(
+                (user_uuid, conversation_id),
+                max_context_length,
+                lambda: self._load_conversation_documents(conversation_id, user_uuid),
+                self._render_document_context
             )
             
-            if not result.data:
+            if not full_context:
                 logger.info("No document chunks found for conversation")
-                return ""
-            
-            # Group chunks by document
-            documents = {}
-            for chunk in result.data:
-                doc_id = chunk['document_id']  # Fixed: changed from 'document_uuid' to 'document_id'
-                if doc_id not in documents:
-                    documents[doc_id] = {
-                        'chunks': [],
-                        'metadata': chunk.get('metadata', {})
-                    }
-                documents[doc_id]['chunks'].append(chunk)
-            
-            # Build complete document context
-            context_parts = []
-            current_length = 0
-            
-            for doc_uuid, doc_data in documents.items():
-                # Sort chunks by index to maintain document order
-                sorted_chunks = sorted(doc_data['chunks'], key=lambda x: x['chunk_index'])
-                
-                # Reconstruct full document content
-                doc_content = ""
-                doc_filename = "Unknown Document"
-                
-                # Try to get filename from metadata
-                try:
-                    if isinstance(doc_data['metadata'], str):
-                        import json
-                        metadata = json.loads(doc_data['metadata'])
-                    else:
-                        metadata = doc_data['metadata']
-                    
-                    doc_filename = metadata.get('filename', doc_filename)
-                except:
-                    pass
-                
-                # Combine all chunks to reconstruct full document
-                for chunk in sorted_chunks:
-                    doc_content += chunk['content'] + "\n"
-                
-                # Add document to context if it fits
-                doc_section = f"\n=== DOCUMENT: {doc_filename} ===\n{doc_content.strip()}\n"
-                
-                if current_length + len(doc_section) <= max_context_length:
-                    context_parts.append(doc_section)
-                    current_length += len(doc_section)
-                else:
-                    # If document is too long, include as much as possible
-                    remaining_space = max_context_length - current_length - 100  # Leave some buffer
-                    if remaining_space > 500:  # Only add if meaningful space left
-                        truncated_content = doc_content[:remaining_space] + "\n[... document continues ...]"
-                        doc_section = f"\n=== DOCUMENT: {doc_filename} ===\n{truncated_content}\n"
-                        context_parts.append(doc_section)
-                    break
-            
-            full_context = "".join(context_parts)
-            logger.info(f"Built document context: {len(full_context)} chars from {len(documents)} documents")
-            
             return full_context
             
         except Exception as e:
             logger.error(f"Error getting full document context: {e}")
             return ""
     
+    async def _load_conversation_documents(
+        self,
+        conversation_id: str,
+        user_uuid: str
+    ) -> List[Tuple[str, str, str]]:
+        """Reassemble a conversation's documents from their chunks as (document_id, filename, content)."""
+        # Get ALL chunks for this conversation (not just similar ones)
+        result = await self.db.execute_rpc(
+            'get_conversation_chunks',
+            {
+                'target_conversation_id': conversation_id,
+                'target_user_uuid': user_uuid
+            },
+            columns=self.DOCUMENT_COLUMNS
+        )
+        
+        # Group chunks by document
+        documents = {}
+        for chunk in result.data or []:
+            documents.setdefault(chunk['document_id'], []).append(chunk)  # Fixed: changed from 'document_uuid' to 'document_id'
+        
+        assembled = []
+        for doc_id, chunks in documents.items():
+            # Sort chunks by index to maintain document order
+            chunks.sort(key=lambda x: x['chunk_index'])
+            
+            # Filename from the document's metadata, parsed once per document
+            doc_filename = "Unknown Document"
+            try:
+                metadata = chunks[0].get('metadata') or {}
+                if isinstance(metadata, str):
+                    metadata = json.loads(metadata)
+                doc_filename = metadata.get('filename', doc_filename)
+            except (ValueError, AttributeError):
+                pass
+            
+            # Combine all chunks, dropping the text each repeats from its predecessor
+            parts = [chunks[0]['content']]
+            for previous, chunk in zip(chunks, chunks[1:]):
+                if chunk['chunk_index'] == previous['chunk_index'] + 1:
+                    parts.append(strip_overlap(previous['content'], chunk['content']))
+                else:
+                    parts.append(chunk['content'])
+            assembled.append((doc_id, doc_filename, "\n".join(parts).strip()))
+        
+        logger.info(f"Reassembled {len(assembled)} documents from {len(result.data or [])} chunks")
+        return assembled
+    
+    @staticmethod
+    def _render_document_context(documents: List[Tuple[str, str, str]], max_context_length: int) -> str:
+        """Build the full-document context from reassembled documents within a length budget."""
+        context_parts = []
+        current_length = 0
+        
+        for _, doc_filename, doc_content in documents:
+            # Add document to context if it fits
+            doc_section = f"\n=== DOCUMENT: {doc_filename} ===\n{doc_content}\n"
+            
+            if current_length + len(doc_section) <= max_context_length:
+                context_parts.append(doc_section)
+                current_length += len(doc_section)
+            else:
+                # If document is too long, include as much as possible
+                remaining_space = max_context_length - current_length - 100  # Leave some buffer
+                if remaining_space > 500:  # Only add if meaningful space left
+                    truncated_content = doc_content[:remaining_space] + "\n[... document continues ...]"
+                    doc_section = f"\n=== DOCUMENT: {doc_filename} ===\n{truncated_content}\n"
+                    context_parts.append(doc_section)
+                break
+        
+        full_context = "".join(context_parts)
+        logger.info(f"Built document context: {len(full_context)} chars from {len(context_parts)} documents")
+        return full_context
+    
     async def get_conversation_context(
         self,
         query: str,
         conversation_id: str,
         user_uuid: str,
-        max_context_length: int = 4000  # Increased for more thorough context
+        max_context_tokens: int = 1000  # Embedding tokens of retrieved context
     ) -> str:
         """Get relevant context from conversation documents for a query."""
         try:
-            # Search for relevant chunks with multiple strategies
-            # Strategy 1: High similarity chunks
-            high_sim_chunks = await self.search_similar_chunks(
-                query, conversation_id, user_uuid, similarity_threshold=0.7, max_chunks=5
+            # High similarity chunks plus medium similarity chunks for broader
+            # context, retrieved with a single embedding and a single RPC
+            similar_chunks = await self.search_tiered_chunks(
+                query, conversation_id, user_uuid
             )
             
-            # Strategy 2: Medium similarity chunks for broader context
-            med_sim_chunks = await self.search_similar_chunks(
-                query, conversation_id, user_uuid, similarity_threshold=0.5, max_chunks=10
-            )
-            
-            # Combine and deduplicate
-            seen_chunks = set()
-            similar_chunks = []
-            
-            for chunk in high_sim_chunks + med_sim_chunks:
-                chunk_id = f"{chunk['document_id']}_{chunk['chunk_index']}"  # Fixed: changed from 'document_uuid' to 'document_id'
-                if chunk_id not in seen_chunks:
-                    seen_chunks.add(chunk_id)
-                    similar_chunks.append(chunk)
-            
-            # Sort by similarity score
-            similar_chunks.sort(key=lambda x: x.get('similarity', 0), reverse=True)
-            
             if not similar_chunks:
                 return ""
             
-            # Build context from similar chunks
-            context_parts = []
-            current_length = 0
-            
-            for chunk in similar_chunks:
-                content = chunk['content']
-                similarity = chunk['similarity']
-                
-                # Add chunk if it fits within length limit
-                if current_length + len(content) <= max_context_length:
-                    context_parts.append(f"[Similarity: {similarity:.2f}] {content}")
-                    current_length += len(content)
-                else:
-                    # Truncate last chunk if needed
-                    remaining_space = max_context_length - current_length
-                    if remaining_space > 100:  # Only add if meaningful space left
-                        truncated = content[:remaining_space - 20] + "..."
-                        context_parts.append(f"[Similarity: {similarity:.2f}] {truncated}")
-                    break
-            
-            context = "\n\n".join(context_parts)
-            logger.info(f"Built context: {len(context)} chars from {len(context_parts)} chunks")
+            # Whole chunks chosen by similarity within the token budget,
+            # adjacent chunks merged without their repeated overlap
+            context = pack_context(
+                similar_chunks,
+                max_context_tokens,
+                format_passage=lambda passage: f"[Similarity: {passage['score']:.2f}] {passage['content']}"
+            )
+            logger.info(f"Built context: {len(context)} chars from {len(similar_chunks)} candidate chunks")
             
             return context
             
@@ -471,6 +647,12 @@ class RAGService:
                 }
             )
             
+            vector_index_cache.invalidate_document(document_id)
+            document_context_cache.invalidate_document(document_id)
+            user_ann_indexes.remove_document(user_uuid, document_id)
+            bm25_index_cache.remove_document(document_id)
+            entity_index_cache.remove_document(document_id)
+            
             logger.info(f"Deleted chunks for document {document_id}")
             return True
             
@@ -484,42 +666,133 @@ class RAGService:
         user_uuid: str
     ) -> Dict:
         """Get summary of documents in a conversation."""
+        params = {
+            'target_conversation_id': conversation_id,
+            'target_user_uuid': user_uuid
+        }
         try:
-            result = await self.db.execute_rpc(
-                'get_conversation_chunks',
-                {
-                    'target_conversation_id': conversation_id,
-                    'target_user_uuid': user_uuid
-                }
-            )
-            
-            if not result.data:
-                return {'total_chunks': 0, 'documents': {}}
-            
-            # Group chunks by document
-            documents = {}
-            for chunk in result.data:
-                doc_id = chunk['document_id']  # Fixed: changed from 'document_uuid' to 'document_id'
-                if doc_id not in documents:
-                    documents[doc_id] = {
-                        'chunk_count': 0,
-                        'total_content_length': 0,
-                        'created_at': chunk['created_at']
-                    }
-
-                documents[doc_id]['chunk_count'] += 1
-                documents[doc_id]['total_content_length'] += len(chunk['content'])
-                documents[doc_id]['total_content_length'] += len(chunk['content'])
+            documents = None
+            if self._document_stats_rpc_available:
+                documents = await self._get_document_stats(params)
+            
+            if documents is None:
+                # Aggregate client-side, fetching only the columns counted
+                result = await self.db.execute_rpc(
+                    'get_conversation_chunks',
+                    params,
+                    columns='document_id, content, created_at'
+                )
+                documents = {}
+                for chunk in result.data or []:
+                    doc_id = chunk['document_id']  # Fixed: changed from 'document_uuid' to 'document_id'
+                    if doc_id not in documents:
+                        documents[doc_id] = {
+                            'chunk_count': 0,
+                            'total_content_length': 0,
+                            'created_at': chunk['created_at']
+                        }
+                    
+                    documents[doc_id]['chunk_count'] += 1
+                    documents[doc_id]['total_content_length'] += len(chunk['content'])
             
             return {
-                'total_chunks': len(result.data),
+                'total_chunks': sum(doc['chunk_count'] for doc in documents.values()),
                 'documents': documents
             }
             
         except Exception as e:
             logger.error(f"Error getting conversation documents summary: {e}")
             return {'total_chunks': 0, 'documents': {}}
+    
+    async def _get_document_stats(self, params: Dict) -> Optional[Dict]:
+        """Per-document chunk counts and content lengths aggregated in the database, or None if unavailable."""
+        try:
+            result = await self.db.execute_rpc('get_conversation_document_stats', params)
+        except Exception as e:
+            if "does not exist" in str(e).lower() or "could not find the function" in str(e).lower():
+                logger.warning("get_conversation_document_stats not installed, summarising chunks client-side")
+                self._document_stats_rpc_available = False
+            return None
+        
+        return {
+            row['document_id']: {
+                'chunk_count': row['chunk_count'],
+                'total_content_length': row['total_content_length'],
+                'created_at': row['created_at']
+            }
+            for row in result.data or []
+        }
 
+    async def _search_user_chunks(
+        self,
+        query_embedding: List[float],
+        user_uuid: str,
+        similarity_threshold: float,
+        limit: int
+    ) -> List[Dict]:
+        """Search all of a user's chunks for an already embedded query.
+        
+        Uses the user's local ANN index when enabled, otherwise the pgvector RPC.
+        """
+        index = await user_ann_indexes.get_or_build(
+            user_uuid,
+            lambda: self._load_user_chunks(user_uuid),
+            lambda: self._count_user_chunks(user_uuid)
+        )
+        if index is not None:
+            try:
+                return user_ann_indexes.search(index, query_embedding, limit, similarity_threshold)
+            except ValueError as e:
+                logger.warning(f"Local ANN search unavailable, using pgvector: {e}")
+        
+        result = await self.db.execute_rpc(
+            'search_document_chunks',
+            {
+                'query_embedding': vector_param(query_embedding),
+                'match_threshold': similarity_threshold,
+                'match_count': limit,
+                'filter_user_uuid': user_uuid
+            }
+        )
+        return result.data or []
+    
+    async def _load_user_chunks(self, user_uuid: str) -> Tuple[List[Dict], List[List[float]]]:
+        """All of a user's chunk rows and their embeddings, fetched page by page."""
+        rows = []
+        embeddings = []
+        start = 0
+        while True:
+            result = await self.db.execute_query(
+                'document_chunks',
+                'select',
+                columns='id, document_id, conversation_id, chunk_index, content, metadata, embedding',
+                eq={'user_uuid': user_uuid},
+                order='id.asc',
+                range=(start, start + self.ANN_BUILD_PAGE_SIZE - 1)
+            )
+            page = result.data or []
+            for row in page:
+                embedding = parse_vector(row.pop('embedding', None))
+                if embedding is not None:
+                    rows.append(row)
+                    embeddings.append(embedding)
+            if len(page) < self.ANN_BUILD_PAGE_SIZE:
+                return rows, embeddings
+            start += self.ANN_BUILD_PAGE_SIZE
+    
+    async def _count_user_chunks(self, user_uuid: str) -> int:
+        """Number of the user's chunks with an embedding, i.e. the rows a fresh ANN index holds."""
+        result = await self.db.execute_query(
+            'document_chunks',
+            'select',
+            columns='id',
+            eq={'user_uuid': user_uuid},
+            not_null=['embedding'],
+            count='exact',
+            limit=1
+        )
+        return result.count or 0
+    
     async def search_documents(
         self,
         query: str,
@@ -531,31 +804,14 @@ class RAGService:
         try:
             logger.info(f"Searching documents for user {user_uuid}: '{query[:50]}...'")
 
-            # Ensure embeddings are initialized
-            self._initialize_embeddings()
-
-            # Generate embedding for the query using the embeddings object (may be CPU-bound)
-            loop = asyncio.get_event_loop()
-            query_embedding = await loop.run_in_executor(
-                None,
-                self.embeddings.embed_query,
-                query
-            )
+            # Generate embedding for the query (served from the query cache when repeated)
+            query_embedding = await self._embed_query(query)
 
-            # Call the DB RPC to search document chunks for this user
-            result = await self.db.execute_rpc(
-                'search_document_chunks',
-                {
-                    'query_embedding': query_embedding,
-                    'match_threshold': similarity_threshold,
-                    'match_count': limit,
-                    'filter_user_uuid': user_uuid
-                }
-            )
+            chunks = await self._search_user_chunks(query_embedding, user_uuid, similarity_threshold, limit)
 
-            if result.data:
-                logger.info(f"Found {len(result.data)} matching documents")
-                return result.data
+            if chunks:
+                logger.info(f"Found {len(chunks)} matching documents")
+                return chunks
             else:
                 logger.info("No matching documents found")
                 return []
@@ -578,32 +834,15 @@ async def search_documents(
     try:
         logger.info(f"Searching documents for user {user_uuid}: '{query[:50]}...'")
 
-        # Initialize embeddings if not already done
-        rag_service._initialize_embeddings()
-
-        # Generate embedding for query
-        import asyncio
-        loop = asyncio.get_event_loop()
-        query_embedding = await loop.run_in_executor(
-            None,
-            rag_service.embeddings.embed_query,
-            query
-        )
+        # Generate embedding for query (served from the query cache when repeated)
+        query_embedding = await rag_service._embed_query(query)
 
-        # Search using the database function with user filter
-        result = await rag_service.db.execute_rpc(
-            'search_document_chunks',
-            {
-                'query_embedding': query_embedding,
-                'match_threshold': similarity_threshold,
-                'match_count': limit,
-                'filter_user_uuid': user_uuid
-            }
-        )
+        # Search the user's local ANN index, or the database function with user filter
+        chunks = await rag_service._search_user_chunks(query_embedding, user_uuid, similarity_threshold, limit)
 
-        if result.data:
-            logger.info(f"Found {len(result.data)} matching documents")
-            return result.data
+        if chunks:
+            logger.info(f"Found {len(chunks)} matching documents")
+            return chunks
         else:
             logger.info("No matching documents found")
             return []
@@ -4,11 +4,15 @@ Simple, robust database connection handling without event loop issues
 """
 
 import os
+import time
 import asyncio
 import logging
-from typing import Optional, Dict, Any
+from contextlib import asynccontextmanager
+from typing import Optional, Dict, Any, List, Tuple
 from datetime import datetime
 
+from utils.event_loop_cache import EventLoopCache, aclose_client
+
 # Configure logging
 logger = logging.getLogger(__name__)
 
@@ -27,18 +31,92 @@ try:
 except ImportError:
     pass
 
+DEFAULT_POOL_SIZE = 10
+
+# Errors that will not go away by retrying the same rows
+NON_RETRYABLE_ERRORS = ('does not exist', 'permission denied', 'invalid input syntax')
+
+
+def _get_pool_size() -> int:
+    """Get the pool size from the core configuration, with a safe fallback."""
+    try:
+        from core.config import Config
+        return max(1, int(Config.CONNECTION_POOL_SIZE))
+    except Exception:
+        return DEFAULT_POOL_SIZE
+
+
+class _ClientPool:
+    """Bounded pool of Supabase clients bound to a single event loop.
+    
+    Each AsyncClient keeps its own HTTP session, so handing the same client
+    back out reuses the underlying keep-alive connections.
+    """
+    
+    def __init__(self, size: int, factory):
+        self.size = size
+        self._factory = factory
+        self._idle: asyncio.Queue = asyncio.Queue()
+        self._created = 0
+    
+    async def acquire(self) -> Tuple[AsyncClient, bool]:
+        """Return an idle client, creating one while under the size limit.
+        
+        The second tuple element tells whether the client was reused.
+        """
+        if self._idle.empty() and self._created < self.size:
+            self._created += 1
+            try:
+                return await self._factory(), False
+            except Exception:
+                self._created -= 1
+                raise
+        
+        return await self._idle.get(), True
+    
+    def release(self, client: AsyncClient):
+        """Return a client to the pool."""
+        self._idle.put_nowait(client)
+    
+    async def aclose(self):
+        """Close the HTTP sessions of the idle clients."""
+        while not self._idle.empty():
+            await aclose_client(self._idle.get_nowait())
+            self._created -= 1
+
+
 class SimpleSupabaseManager:
-    """Simple Supabase manager that creates fresh clients per operation."""
+    """Supabase manager backed by a per-event-loop pool of reusable clients."""
     
-    def __init__(self):
+    def __init__(self, pool_size: Optional[int] = None):
+        self.pool_size = pool_size or _get_pool_size()
+        self._credentials: Optional[Tuple[str, str]] = None
+        
+        # httpx sessions are bound to the loop they were created on, so every
+        # event loop (Streamlit script thread) gets its own pool, closed and dropped with its thread.
+        self._pools = EventLoopCache(aclose=_ClientPool.aclose)
+        
         self.stats = {
             'total_queries': 0,
             'successful_queries': 0,
-            'failed_queries': 0
+            'failed_queries': 0,
+            'pool_acquisitions': 0,
+            'pool_clients_created': 0,
+            'pool_clients_reused': 0,
+            'pool_wait_time_total': 0.0,
+            'bulk_requests': 0,
+            'bulk_rows_written': 0,
+            'bulk_rows_failed': 0
         }
+        
+        # Rows written and seconds spent per table by execute_many
+        self.throughput: Dict[str, Dict[str, float]] = {}
     
     def _get_credentials(self):
         """Get Supabase credentials from Streamlit secrets or environment variables (fallback)."""
+        if self._credentials:
+            return self._credentials
+        
         import streamlit as st
         
         # Try Streamlit secrets first, fallback to environment variables
@@ -54,7 +132,8 @@ class SimpleSupabaseManager:
             logger.error("Missing Supabase credentials")
             raise ValueError("SUPABASE_URL and SUPABASE_ANON_KEY must be set in Streamlit secrets or environment")
         
-        return url, key
+        self._credentials = (url, key)
+        return self._credentials
     
     async def _create_client(self) -> AsyncClient:
         """Create a fresh Supabase client."""
@@ -64,8 +143,35 @@ class SimpleSupabaseManager:
         url, key = self._get_credentials()
         return await create_async_client(url, key)
     
+    def _get_pool(self) -> _ClientPool:
+        """Get the client pool for the running event loop."""
+        pool = self._pools.get()
+        if pool is None:
+            pool = self._pools.setdefault(_ClientPool(self.pool_size, self._create_client))
+        return pool
+    
+    @asynccontextmanager
+    async def _client(self):
+        """Borrow a pooled client for the duration of one operation."""
+        pool = self._get_pool()
+        
+        started = time.perf_counter()
+        client, reused = await pool.acquire()
+        
+        self.stats['pool_acquisitions'] += 1
+        self.stats['pool_wait_time_total'] += time.perf_counter() - started
+        if reused:
+            self.stats['pool_clients_reused'] += 1
+        else:
+            self.stats['pool_clients_created'] += 1
+        
+        try:
+            yield client
+        finally:
+            pool.release(client)
+    
     async def execute_query(self, table: str, operation: str, **kwargs) -> Any:
-        """Execute a database query with a fresh client."""
+        """Execute a database query with a pooled client."""
         self.stats['total_queries'] += 1
         
         # Set user context for RLS if user_uuid is provided in data
@@ -76,65 +182,71 @@ class SimpleSupabaseManager:
             user_uuid = kwargs['eq'].get('user_uuid')
         
         try:
-            # Create fresh client for this operation
-            client = await self._create_client()
-            
-            # Get table reference
-            table_ref = client.table(table)
-            
-            # Execute operation
-            if operation == 'select':
-                result = table_ref.select(kwargs.get('columns', '*'))
+            async with self._client() as client:
+                # Get table reference
+                table_ref = client.table(table)
                 
-                # Apply filters
-                if 'eq' in kwargs:
-                    for column, value in kwargs['eq'].items():
-                        result = result.eq(column, value)
+                # Execute operation
+                if operation == 'select':
+                    # count='exact' also returns the number of matching rows in result.count
+                    result = table_ref.select(kwargs.get('columns', '*'), count=kwargs.get('count'))
+                    
+                    # Apply filters
+                    if 'eq' in kwargs:
+                        for column, value in kwargs['eq'].items():
+                            result = result.eq(column, value)
+                    
+                    for column in kwargs.get('not_null', ()):
+                        result = result.not_.is_(column, 'null')
+                    
+                    if 'limit' in kwargs:
+                        result = result.limit(kwargs['limit'])
+                    
+                    if 'order' in kwargs:
+                        order_clause = kwargs['order']
+                        if '.' in order_clause:
+                            column, direction = order_clause.rsplit('.', 1)
+                            desc = (direction == 'desc')
+                        else:
+                            column = order_clause
+                            desc = True
+                        result = result.order(column, desc=desc)
+                    
+                    if 'range' in kwargs:
+                        start, end = kwargs['range']
+                        result = result.range(start, end)
+                    
+                    return await result.execute()
                 
-                if 'limit' in kwargs:
-                    result = result.limit(kwargs['limit'])
+                elif operation == 'insert':
+                    data = kwargs.get('data', {})
+                    return await table_ref.insert(data).execute()
                 
-                if 'order' in kwargs:
-                    order_clause = kwargs['order']
-                    if '.' in order_clause:
-                        column, direction = order_clause.rsplit('.', 1)
-                        desc = (direction == 'desc')
-                    else:
-                        column = order_clause
-                        desc = True
-                    result = result.order(column, desc=desc)
+                elif operation == 'update':
+                    data = kwargs.get('data', {})
+                    result = table_ref.update(data)
+                    
+                    if 'eq' in kwargs:
+                        for column, value in kwargs['eq'].items():
+                            result = result.eq(column, value)
+                    
+                    return await result.execute()
                 
-                return await result.execute()
-            
-            elif operation == 'insert':
-                data = kwargs.get('data', {})
-                return await table_ref.insert(data).execute()
-            
-            elif operation == 'update':
-                data = kwargs.get('data', {})
-                result = table_ref.update(data)
+                elif operation == 'delete':
+                    result = table_ref.delete()
+                    
+                    if 'eq' in kwargs:
+                        for column, value in kwargs['eq'].items():
+                            result = result.eq(column, value)
+                    
+                    return await result.execute()
                 
-                if 'eq' in kwargs:
-                    for column, value in kwargs['eq'].items():
-                        result = result.eq(column, value)
+                elif operation == 'upsert':
+                    data = kwargs.get('data', {})
+                    return await table_ref.upsert(data).execute()
                 
-                return await result.execute()
-            
-            elif operation == 'delete':
-                result = table_ref.delete()
-                
-                if 'eq' in kwargs:
-                    for column, value in kwargs['eq'].items():
-                        result = result.eq(column, value)
-                
-                return await result.execute()
-            
-            elif operation == 'upsert':
-                data = kwargs.get('data', {})
-                return await table_ref.upsert(data).execute()
-            
-            else:
-                raise ValueError(f"Unsupported operation: {operation}")
+                else:
+                    raise ValueError(f"Unsupported operation: {operation}")
         
         except Exception as e:
             self.stats['failed_queries'] += 1
@@ -144,29 +256,105 @@ class SimpleSupabaseManager:
         finally:
             self.stats['successful_queries'] += 1
     
+    async def execute_many(
+        self,
+        table: str,
+        rows: List[Dict],
+        operation: str = 'insert',
+        max_retries: int = 3
+    ) -> Tuple[int, List[Dict]]:
+        """Write many rows in a single request, retrying only the rows that fail.
+        
+        A bulk insert is one statement, so one bad row fails the whole request.
+        On failure the batch is bisected until the failing rows are isolated;
+        each failing row is retried up to ``max_retries`` times with backoff.
+        
+        Returns a tuple of (rows written, rows that could not be written).
+        """
+        if not rows:
+            return 0, []
+        
+        if operation not in ('insert', 'upsert'):
+            raise ValueError(f"Unsupported bulk operation: {operation}")
+        
+        started = time.perf_counter()
+        failed_rows: List[Dict] = []
+        written = 0
+        
+        pending = [list(rows)]
+        while pending:
+            batch = pending.pop()
+            attempts = max_retries if len(batch) == 1 else 1
+            
+            for attempt in range(attempts):
+                self.stats['total_queries'] += 1
+                self.stats['bulk_requests'] += 1
+                try:
+                    async with self._client() as client:
+                        table_ref = client.table(table)
+                        query = table_ref.insert(batch) if operation == 'insert' else table_ref.upsert(batch)
+                        await query.execute()
+                    
+                    self.stats['successful_queries'] += 1
+                    written += len(batch)
+                    break
+                
+                except Exception as e:
+                    self.stats['failed_queries'] += 1
+                    error_msg = str(e)
+                    logger.error(f"Bulk {operation} of {len(batch)} rows on {table} failed: {error_msg}")
+                    
+                    if any(marker in error_msg.lower() for marker in NON_RETRYABLE_ERRORS):
+                        # Same failure for every row - give up on everything still pending
+                        failed_rows.extend(batch)
+                        for remaining in pending:
+                            failed_rows.extend(remaining)
+                        pending = []
+                        break
+                    
+                    if len(batch) > 1:
+                        middle = len(batch) // 2
+                        pending.extend([batch[middle:], batch[:middle]])
+                    elif attempt == attempts - 1:
+                        failed_rows.extend(batch)
+                    else:
+                        await asyncio.sleep(0.5 * (attempt + 1))
+        
+        elapsed = time.perf_counter() - started
+        table_stats = self.throughput.setdefault(table, {'rows': 0, 'seconds': 0.0})
+        table_stats['rows'] += written
+        table_stats['seconds'] += elapsed
+        
+        self.stats['bulk_rows_written'] += written
+        self.stats['bulk_rows_failed'] += len(failed_rows)
+        
+        if written:
+            logger.info(f"Bulk {operation}: {written} rows into {table} in {elapsed:.2f}s ({written / elapsed:.1f} rows/s)")
+        
+        return written, failed_rows
+    
     async def execute_raw_sql(self, query: str, params: list = None) -> Any:
         """Execute raw SQL query using Supabase client directly."""
         self.stats['total_queries'] += 1
         
         try:
-            client = await self._create_client()
-            
-            # Use postgrest for raw SQL - this is a workaround
-            # In practice, you'd need to create a custom RPC function in Supabase
-            # For now, let's use a different approach
-            
-            # Simple table queries for testing
-            if 'pg_extension' in query and 'vector' in query:
-                # Check for pgvector extension
-                result = await client.rpc('check_extension', {'ext_name': 'vector'}).execute()
-            elif 'information_schema.columns' in query:
-                # Get table columns
-                table_name = query.split("table_name = '")[1].split("'")[0]
-                result = await client.rpc('get_table_columns', {'table_name': table_name}).execute()
-            else:
-                # For other queries, we'll need to implement specific RPC functions
-                # For now, return empty result
-                result = type('Result', (), {'data': []})()
+            async with self._client() as client:
+                # Use postgrest for raw SQL - this is a workaround
+                # In practice, you'd need to create a custom RPC function in Supabase
+                # For now, let's use a different approach
+                
+                # Simple table queries for testing
+                if 'pg_extension' in query and 'vector' in query:
+                    # Check for pgvector extension
+                    result = await client.rpc('check_extension', {'ext_name': 'vector'}).execute()
+                elif 'information_schema.columns' in query:
+                    # Get table columns
+                    table_name = query.split("table_name = '")[1].split("'")[0]
+                    result = await client.rpc('get_table_columns', {'table_name': table_name}).execute()
+                else:
+                    # For other queries, we'll need to implement specific RPC functions
+                    # For now, return empty result
+                    result = type('Result', (), {'data': []})()
             
             self.stats['successful_queries'] += 1
             return result
@@ -177,17 +365,24 @@ class SimpleSupabaseManager:
             # Return empty result instead of raising for testing
             return type('Result', (), {'data': []})()
     
-    async def execute_rpc(self, function_name: str, params: dict = None) -> Any:
-        """Execute a stored procedure/function."""
+    async def execute_rpc(self, function_name: str, params: dict = None, columns: str = None) -> Any:
+        """Execute a stored procedure/function.
+        
+        ``columns`` projects set-returning functions server-side (e.g.
+        'document_id, content'), so unneeded columns such as embeddings are
+        never sent.
+        """
         self.stats['total_queries'] += 1
         
         try:
-            client = await self._create_client()
-            
-            if params:
-                result = await client.rpc(function_name, params).execute()
-            else:
-                result = await client.rpc(function_name).execute()
+            async with self._client() as client:
+                if params:
+                    query = client.rpc(function_name, params)
+                else:
+                    query = client.rpc(function_name)
+                if columns:
+                    query = query.select(columns)
+                result = await query.execute()
             
             self.stats['successful_queries'] += 1
             return result
@@ -206,6 +401,23 @@ class SimpleSupabaseManager:
         except Exception as e:
             logger.error(f"❌ Database connection test failed: {e}")
             return False
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get query and connection pool statistics."""
+        stats = self.stats.copy()
+        acquisitions = stats['pool_acquisitions']
+        
+        stats.update({
+            'pool_size': self.pool_size,
+            'active_pools': len(self._pools),
+            'pool_reuse_ratio': stats['pool_clients_reused'] / acquisitions if acquisitions else 0.0,
+            'pool_avg_wait_ms': stats['pool_wait_time_total'] / acquisitions * 1000 if acquisitions else 0.0,
+            'rows_per_second': {
+                table: table_stats['rows'] / table_stats['seconds'] if table_stats['seconds'] else 0.0
+                for table, table_stats in self.throughput.items()
+            }
+        })
+        return stats
 
 # Global instance
 connection_manager = SimpleSupabaseManager()
@@ -221,7 +433,7 @@ async def test_supabase_connection() -> bool:
 
 def get_connection_stats() -> Dict:
     """Get connection statistics."""
-    return connection_manager.stats.copy()
+    return connection_manager.get_stats()
 
 # Health check
 async def health_check() -> Dict[str, Any]:
@@ -230,5 +442,5 @@ async def health_check() -> Dict[str, Any]:
         'timestamp': datetime.now().isoformat(),
         'supabase_available': SUPABASE_AVAILABLE,
         'connection_test': await connection_manager.test_connection(),
-        'stats': connection_manager.stats
+        'stats': connection_manager.get_stats()
     }
\ No newline at end of file
@@ -0,0 +1,100 @@
+"""
+Tests for utils.ann_index
+Per-user IVF index: conversation removal, freshness checks and on-disk privacy
+"""
+
+import asyncio
+import os
+import stat
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from utils.ann_index import IVFIndex, UserANNIndexes
+
+DIMENSIONS = 16
+
+
+def make_rows(count: int = 60):
+    rng = np.random.default_rng(0)
+    rows = [
+        {'id': i, 'document_id': f"doc-{i % 3}", 'conversation_id': f"conv-{i % 2}", 'chunk_index': i,
+         'content': f"chunk {i}"}
+        for i in range(count)
+    ]
+    return rows, rng.standard_normal((count, DIMENSIONS)).astype(np.float32).tolist()
+
+
+def make_indexes(tmp_path):
+    return UserANNIndexes(index_dir=str(tmp_path / "ann_index"), enabled=True, quantization='none')
+
+
+def test_remove_conversation():
+    rows, embeddings = make_rows()
+    index = IVFIndex()
+    index.add(rows, embeddings)
+
+    assert index.remove_conversation('conv-1') == 30
+    results = index.search(embeddings[1], k=60, similarity_threshold=-1.0)
+    assert len(results) == 30
+    assert {row['conversation_id'] for row in results} == {'conv-0'}
+
+
+def test_deleted_conversation_is_removed_from_disk_copy(tmp_path):
+    rows, embeddings = make_rows()
+
+    async def load_rows():
+        return rows, embeddings
+
+    indexes = make_indexes(tmp_path)
+    asyncio.run(indexes.get_or_build('user', load_rows))
+    indexes.remove_conversation('user', 'conv-1')
+
+    # A new process reloads the saved index without the conversation's chunks
+    reloaded = asyncio.run(make_indexes(tmp_path).get_or_build('user', load_rows))
+    assert len(reloaded) == 30
+
+
+def test_stale_persisted_index_is_rebuilt(tmp_path):
+    rows, embeddings = make_rows()
+    loads = []
+
+    async def load_rows():
+        loads.append(len(rows))
+        return rows, embeddings
+
+    asyncio.run(make_indexes(tmp_path).get_or_build('user', load_rows))
+
+    # Chunks deleted in the database while the index was on disk
+    del rows[40:], embeddings[40:]
+
+    async def count_rows():
+        return len(rows)
+
+    indexes = make_indexes(tmp_path)
+    index = asyncio.run(indexes.get_or_build('user', load_rows, count_rows))
+    assert len(index) == 40
+    assert loads == [60, 40]
+    assert indexes.get_stats()['stale_loads'] == 1
+
+    # A fresh copy is checked once, then served without counting again
+    async def failing_count():
+        raise AssertionError("counted twice")
+
+    assert asyncio.run(indexes.get_or_build('user', load_rows, failing_count)) is index
+
+
+def test_index_directory_is_private(tmp_path):
+    rows, embeddings = make_rows()
+
+    async def load_rows():
+        return rows, embeddings
+
+    indexes = make_indexes(tmp_path)
+    asyncio.run(indexes.get_or_build('user', load_rows))
+
+    user_dir = indexes._user_dir('user')
+    assert os.path.exists(os.path.join(user_dir, "rows.json"))
+    for directory in (indexes.index_dir, user_dir):
+        assert stat.S_IMODE(os.stat(directory).st_mode) == 0o700
@@ -0,0 +1,78 @@
+"""
+Tests for utils.bm25_index
+BM25 ranking, document removal and reciprocal rank fusion
+"""
+
+import asyncio
+
+import pytest
+
+pytest.importorskip("numpy")
+
+from utils.bm25_index import BM25Index, BM25IndexCache, reciprocal_rank_fusion, tokenize
+
+ROWS = [
+    {'document_id': 'a', 'chunk_index': 0, 'content': "CYP3A4 inhibitors raise simvastatin levels."},
+    {'document_id': 'a', 'chunk_index': 1, 'content': "Statins lower LDL cholesterol."},
+    {'document_id': 'b', 'chunk_index': 0, 'content': "Simvastatin 40mg at night; avoid grapefruit with simvastatin."}
+]
+
+
+def make_index():
+    index = BM25Index()
+    index.add(ROWS)
+    return index
+
+
+def test_tokenize_keeps_codes_and_doses():
+    assert tokenize("The CYP3A4 dose is 2.5mg per mg/kg") == ['cyp3a4', 'dose', '2.5mg', 'per', 'mg/kg']
+
+
+def test_search_ranks_by_bm25():
+    results = make_index().search("simvastatin grapefruit", k=2)
+    assert [(row['document_id'], row['chunk_index']) for row in results] == [('b', 0), ('a', 0)]
+    assert results[0]['bm25_score'] > results[1]['bm25_score'] > 0
+
+
+def test_remove_document_hides_its_chunks():
+    index = make_index()
+    assert index.remove_document('b') == 1
+    assert len(index) == 2
+
+    results = index.search("simvastatin grapefruit", k=5)
+    assert [row['document_id'] for row in results] == ['a']
+    assert index.search("grapefruit", k=5) == []
+
+
+def test_remove_document_then_add():
+    index = make_index()
+    index.remove_document('a')
+    index.add([{'document_id': 'c', 'chunk_index': 0, 'content': "LDL targets for statins."}])
+    assert [row['document_id'] for row in index.search("statins ldl", k=5)] == ['c']
+
+
+def test_reciprocal_rank_fusion_merges_shared_chunks():
+    vector = [{'document_id': 'a', 'chunk_index': 0, 'content': 'x', 'similarity': 0.9},
+              {'document_id': 'a', 'chunk_index': 1, 'content': 'y', 'similarity': 0.8}]
+    lexical = [{'document_id': 'a', 'chunk_index': 1, 'content': 'y', 'bm25_score': 3.0}]
+
+    fused = reciprocal_rank_fusion([vector, lexical], limit=5, k=60)
+    assert [row['chunk_index'] for row in fused] == [1, 0]
+    assert fused[0]['similarity'] == 0.8 and fused[0]['bm25_score'] == 3.0
+    assert fused[0]['rrf_score'] == pytest.approx(1 / 62 + 1 / 61)
+
+
+
+def test_cache_remove_document_and_invalidate():
+    async def load_rows():
+        return list(ROWS)
+
+    cache = BM25IndexCache()
+    index = asyncio.run(cache.get_or_load(('user', 'conv'), load_rows))
+    assert len(index) == 3
+
+    cache.remove_document('b')
+    assert [row['document_id'] for row in cache.search(index, "simvastatin", k=5)] == ['a']
+
+    cache.invalidate(('user', 'conv'))
+    assert cache.get_stats()['indexes'] == 0
@@ -0,0 +1,80 @@
+"""
+Tests for utils.context_packer
+Overlap removal, knapsack selection and packing within a token budget
+"""
+
+import random
+
+from utils.context_packer import _knapsack, pack_chunks, pack_context, strip_overlap
+from utils.tokenizer import count_tokens
+
+
+def test_strip_overlap_removes_shared_prefix():
+    previous = "Warfarin is metabolised by CYP2C9. Dose adjustments are often required"
+    current = "CYP2C9. Dose adjustments are often required with fluconazole."
+    assert strip_overlap(previous, current) == "with fluconazole."
+
+
+def test_strip_overlap_keeps_unrelated_text():
+    assert strip_overlap("First chunk.", "Second chunk.") == "Second chunk."
+    assert strip_overlap("Anything", "") == ""
+
+
+def test_strip_overlap_requires_suffix_match():
+    # The probe occurs in the previous chunk, but not at its end
+    previous = "CYP2C9 inhibitors raise levels. Monitor INR closely."
+    current = "CYP2C9 inhibitors raise levels of warfarin."
+    assert strip_overlap(previous, current) == current
+
+
+def test_knapsack_respects_budget():
+    rng = random.Random(0)
+    for _ in range(50):
+        values = [rng.random() for _ in range(12)]
+        costs = [rng.randint(1, 400) for _ in range(12)]
+        budget = rng.randint(0, 2000)
+        selected = _knapsack(values, costs, budget)
+        assert sum(costs[i] for i in selected) <= budget
+        assert selected == sorted(set(selected))
+
+
+def test_knapsack_prefers_value_over_greed():
+    # One big item beats two small ones that don't fit together with it
+    assert _knapsack([1.0, 0.6, 0.6], [10, 6, 6], 12) == [1, 2]
+    assert _knapsack([1.0, 0.4, 0.4], [10, 6, 6], 12) == [0]
+    assert _knapsack([1.0], [10], 0) == []
+
+
+def make_chunks(count: int):
+    return [
+        {
+            'document_id': 'doc',
+            'chunk_index': i,
+            'content': f"Sentence {i} about dosing and interactions. " * 5,
+            'similarity': 1.0 - i / count
+        }
+        for i in range(count)
+    ]
+
+
+def test_pack_chunks_stays_within_budget():
+    chunks = make_chunks(30)
+    for budget in (0, 40, 200, 1000):
+        passages = pack_chunks(chunks, budget)
+        assert sum(passage['tokens'] for passage in passages) <= budget
+        assert count_tokens(pack_context(chunks, budget)) <= budget
+
+
+def test_pack_chunks_merges_adjacent_chunks():
+    chunks = [
+        {'document_id': 'doc', 'chunk_index': 0, 'content': "Take with food. Avoid grapefruit juice while dosing.",
+         'similarity': 0.9},
+        {'document_id': 'doc', 'chunk_index': 1, 'content': "Avoid grapefruit juice while dosing. Store below 25C.",
+         'similarity': 0.8},
+        {'document_id': 'other', 'chunk_index': 5, 'content': "Unrelated passage.", 'similarity': 0.7}
+    ]
+    passages = pack_chunks(chunks, 1000)
+
+    assert len(passages) == 2
+    assert passages[0]['content'] == "Take with food. Avoid grapefruit juice while dosing.\nStore below 25C."
+    assert len(passages[0]['chunks']) == 2
@@ -0,0 +1,91 @@
+"""
+Tests for utils.document_context_cache
+Per-budget context reuse, document invalidation and the generation guard
+"""
+
+import asyncio
+
+from utils.document_context_cache import DocumentContextCache, MAX_CONTEXTS_PER_CONVERSATION
+
+DOCUMENTS = [('doc-a', 'a.pdf', "Warfarin interactions."), ('doc-b', 'b.txt', "Statin dosing.")]
+
+
+def render(documents, budget):
+    return "\n".join(content for _, _, content in documents)[:budget]
+
+
+def loader(documents, calls):
+    async def load_documents():
+        calls.append(1)
+        return list(documents)
+    return load_documents
+
+
+def test_contexts_are_reused_per_budget():
+    cache = DocumentContextCache()
+    calls = []
+
+    full = asyncio.run(cache.get_or_build('conv', 1000, loader(DOCUMENTS, calls), render))
+    assert asyncio.run(cache.get_or_build('conv', 1000, loader(DOCUMENTS, calls), render)) == full
+    assert asyncio.run(cache.get_or_build('conv', 10, loader(DOCUMENTS, calls), render)) == full[:10]
+    assert calls == [1]
+
+    stats = cache.get_stats()
+    assert (stats['misses'], stats['hits'], stats['document_hits']) == (1, 1, 1)
+    assert stats['characters'] == sum(len(content) for _, _, content in DOCUMENTS)
+
+
+def test_only_the_latest_budgets_are_kept():
+    cache = DocumentContextCache()
+    renders = []
+
+    def counting_render(documents, budget):
+        renders.append(budget)
+        return render(documents, budget)
+
+    for budget in range(MAX_CONTEXTS_PER_CONVERSATION + 1):
+        asyncio.run(cache.get_or_build('conv', budget, loader(DOCUMENTS, []), counting_render))
+    asyncio.run(cache.get_or_build('conv', 0, loader(DOCUMENTS, []), counting_render))
+    assert renders.count(0) == 2
+
+
+def test_invalidate_document_drops_only_conversations_holding_it():
+    cache = DocumentContextCache()
+    calls = []
+    asyncio.run(cache.get_or_build('conv-a', 100, loader(DOCUMENTS[:1], calls), render))
+    asyncio.run(cache.get_or_build('conv-b', 100, loader(DOCUMENTS[1:], calls), render))
+
+    cache.invalidate_document('doc-a')
+    assert cache.get_stats()['conversations'] == 1
+    asyncio.run(cache.get_or_build('conv-a', 100, loader(DOCUMENTS[:1], calls), render))
+    asyncio.run(cache.get_or_build('conv-b', 100, loader(DOCUMENTS[1:], calls), render))
+    assert len(calls) == 3
+
+
+def test_build_overlapping_an_invalidation_is_not_cached():
+    cache = DocumentContextCache()
+
+    async def stale_load():
+        # A document is added while the old ones are being fetched
+        cache.invalidate('conv')
+        return DOCUMENTS[:1]
+
+    assert asyncio.run(cache.get_or_build('conv', 100, stale_load, render)) == "Warfarin interactions."
+    assert cache.get_stats()['conversations'] == 0
+
+    calls = []
+    assert asyncio.run(cache.get_or_build('conv', 100, loader(DOCUMENTS, calls), render)) == render(DOCUMENTS, 100)
+    assert calls == [1]
+
+
+def test_least_recently_used_conversation_is_evicted():
+    cache = DocumentContextCache(max_conversations=2)
+    calls = []
+    for key in ('a', 'b', 'a', 'c'):
+        asyncio.run(cache.get_or_build(key, 100, loader(DOCUMENTS, calls), render))
+    assert cache.get_stats()['evictions'] == 1
+
+    asyncio.run(cache.get_or_build('a', 100, loader(DOCUMENTS, calls), render))
+    assert len(calls) == 3
+    asyncio.run(cache.get_or_build('b', 100, loader(DOCUMENTS, calls), render))
+    assert len(calls) == 4
@@ -0,0 +1,113 @@
+"""
+Tests for utils.embedding_cache
+Hits and misses, LRU eviction, lazy index persistence and reload after a restart
+"""
+
+import asyncio
+import os
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from utils.embedding_cache import EmbeddingCache
+
+MODEL = "mistral-embed"
+
+
+def vector(seed: int):
+    return np.random.default_rng(seed).standard_normal(8).astype(np.float32).tolist()
+
+
+def make_cache(tmp_path, **kwargs):
+    kwargs.setdefault('flush_interval', 3600)
+    return EmbeddingCache(cache_dir=str(tmp_path), **kwargs)
+
+
+def index_path(cache):
+    return os.path.join(cache._get_store(MODEL).directory, "index.json")
+
+
+def test_hits_and_misses(tmp_path):
+    cache = make_cache(tmp_path)
+    cache.put_many(MODEL, ["a", "b"], [vector(1), vector(2)])
+
+    results = cache.get_many(MODEL, ["a", "c", "b"])
+    assert results[0] == vector(1) and results[2] == vector(2)
+    assert results[1] is None
+    assert cache.get_many("other-model", ["a"]) == [None]
+
+    stats = cache.get_stats()
+    assert (stats['hits'], stats['misses'], stats['entries']) == (2, 2, 2)
+
+
+def test_zero_vectors_are_not_cached(tmp_path):
+    cache = make_cache(tmp_path)
+    cache.put_many(MODEL, ["failed"], [[0.0] * 8])
+    assert cache.get_many(MODEL, ["failed"]) == [None]
+
+
+def test_least_recently_used_entry_is_evicted(tmp_path):
+    cache = make_cache(tmp_path, max_entries=2)
+    cache.put_many(MODEL, ["a", "b"], [vector(1), vector(2)])
+    cache.get_many(MODEL, ["a"])
+    cache.put_many(MODEL, ["c"], [vector(3)])
+
+    assert cache.get_many(MODEL, ["a", "b", "c"]) == [vector(1), None, vector(3)]
+    assert cache.get_stats()['evictions'] == 1
+
+
+def test_index_is_persisted_lazily(tmp_path):
+    cache = make_cache(tmp_path)
+    cache.put_many(MODEL, ["a"], [vector(1)])
+    assert not os.path.exists(index_path(cache))
+
+    cache.flush()
+    assert os.path.exists(index_path(cache))
+    modified = os.stat(index_path(cache)).st_mtime_ns
+
+    # Lookups and a flush without new writes leave the file alone
+    cache.get_many(MODEL, ["a"])
+    cache.flush()
+    assert os.stat(index_path(cache)).st_mtime_ns == modified
+    assert cache.get_stats()['flushes'] == 1
+
+
+def test_interval_flush(tmp_path):
+    cache = make_cache(tmp_path, flush_interval=0)
+    cache.put_many(MODEL, ["a"], [vector(1)])
+    assert os.path.exists(index_path(cache))
+
+
+def test_reload_after_restart(tmp_path):
+    cache = make_cache(tmp_path)
+    cache.put_many(MODEL, ["a", "b"], [vector(1), vector(2)])
+    cache.flush()
+
+    restarted = make_cache(tmp_path)
+    assert restarted.get_many(MODEL, ["a", "b", "c"]) == [vector(1), vector(2), None]
+
+
+def test_stale_index_never_returns_another_texts_vector(tmp_path):
+    cache = make_cache(tmp_path, max_entries=1)
+    cache.put_many(MODEL, ["a"], [vector(1)])
+    cache.flush()
+    # "b" reuses a's slot, then the process dies before the index is rewritten
+    cache.put_many(MODEL, ["b"], [vector(2)])
+    cache._get_store(MODEL).vectors.flush()
+    cache._get_store(MODEL).keys.flush()
+
+    restarted = make_cache(tmp_path, max_entries=1)
+    assert restarted.get_many(MODEL, ["a", "b"]) == [None, None]
+    restarted.put_many(MODEL, ["c"], [vector(3)])
+    assert restarted.get_many(MODEL, ["c"]) == [vector(3)]
+
+
+def test_async_variants(tmp_path):
+    cache = make_cache(tmp_path)
+
+    async def run():
+        await cache.put_many_async(MODEL, ["a"], [vector(1)])
+        return await cache.get_many_async(MODEL, ["a", "b"])
+
+    assert asyncio.run(run()) == [vector(1), None]
@@ -0,0 +1,44 @@
+"""
+Tests for utils.embedding_scheduler
+Batching by token budget and failure handling across concurrent batches
+"""
+
+import asyncio
+
+import pytest
+
+from utils.embedding_scheduler import EmbeddingScheduler
+
+
+def test_batches_respect_token_and_size_limits():
+    scheduler = EmbeddingScheduler(lambda batch: [], max_batch_tokens=10, max_batch_size=3,
+                                   token_counter=len)
+    texts = ["aaaa", "bbbb", "cc", "d", "e", "ffffffffffff", "g"]
+    assert scheduler.make_batches(texts) == [[0, 1, 2], [3, 4], [5], [6]]
+
+
+def test_embeddings_keep_input_order():
+    scheduler = EmbeddingScheduler(lambda batch: [[float(len(text))] for text in batch],
+                                   max_batch_size=2, requests_per_second=1000)
+    texts = ["a", "bb", "ccc", "dddd", "eeeee"]
+    assert asyncio.run(scheduler.embed(texts)) == [[1.0], [2.0], [3.0], [4.0], [5.0]]
+
+
+def test_failed_batch_cancels_pending_batches():
+    calls = []
+
+    def embed_fn(batch):
+        calls.append(batch)
+        raise RuntimeError("invalid input")
+
+    scheduler = EmbeddingScheduler(embed_fn, max_concurrency=1, max_batch_size=1,
+                                   requests_per_second=1000)
+
+    async def run():
+        with pytest.raises(RuntimeError):
+            await scheduler.embed(["a", "b", "c", "d"])
+        # Give any batch left running the chance to send a request
+        await asyncio.sleep(0.1)
+
+    asyncio.run(run())
+    assert calls == [["a"]]
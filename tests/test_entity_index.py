@@ -0,0 +1,66 @@
+"""
+Tests for utils.entity_index
+Aho-Corasick whole-word matching and entity lookups
+"""
+
+import asyncio
+
+from utils.entity_index import AhoCorasick, EntityIndex, EntityIndexCache, mine_terms
+
+
+def test_finds_every_pattern_in_one_pass():
+    automaton = AhoCorasick({'warfarin': 'drug:warfarin', 'cyp2c9': 'enzyme:cyp2c9', 'nsaid': 'class:nsaid'})
+    found = automaton.find("Warfarin is cleared by CYP2C9; avoid NSAIDs? No: avoid an NSAID with warfarin.")
+    assert found == {'drug:warfarin': 2, 'enzyme:cyp2c9': 1, 'class:nsaid': 1}
+
+
+def test_matches_whole_words_only():
+    automaton = AhoCorasick({'ace': 'class:ace', 'statin': 'class:statin'})
+    assert automaton.find("Surface acetylation of nystatin") == {}
+    assert automaton.find("ACE, then a statin.") == {'class:ace': 1, 'class:statin': 1}
+
+
+def test_overlapping_patterns_use_failure_links():
+    automaton = AhoCorasick({'valproic acid': 'drug:valproate', 'acid': 'term:acid', 'he': 'x:he', 'she': 'x:she'})
+    assert automaton.find("valproic acid") == {'drug:valproate': 1, 'term:acid': 1}
+    assert automaton.find("she") == {'x:she': 1}
+
+
+def test_mine_terms():
+    assert mine_terms("Atorvastatin and Itraconazole inhibit CYP3A4, not UGT1A1.") == {
+        'atorvastatin', 'itraconazole', 'cyp3a4', 'ugt1a1'
+    }
+
+
+def test_lookup_ranks_by_matched_entities_and_skips_removed_documents():
+    index = EntityIndex({'warfarin': 'drug:warfarin', 'coumadin': 'drug:warfarin', 'fluconazole': 'drug:fluconazole'})
+    index.add([
+        {'document_id': 'a', 'content': "Warfarin with fluconazole raises INR."},
+        {'document_id': 'a', 'content': "Coumadin dosing."},
+        {'document_id': 'b', 'content': "Fluconazole is an antifungal."}
+    ])
+
+    results = index.lookup("Can I take coumadin and fluconazole together?", k=5)
+    assert [row['content'] for row in results][0] == "Warfarin with fluconazole raises INR."
+    assert len(results) == 3
+
+    assert index.remove_document('a') == 2
+    assert [row['document_id'] for row in index.lookup("warfarin fluconazole", k=5)] == ['b']
+
+
+def test_cache_remove_document_and_invalidate():
+    async def load_rows():
+        return [
+            {'document_id': 'a', 'content': "Warfarin with fluconazole raises INR."},
+            {'document_id': 'b', 'content': "Fluconazole is an antifungal."}
+        ]
+
+    cache = EntityIndexCache()
+    index = asyncio.run(cache.get_or_load(('user', 'conv'), load_rows))
+    assert len(cache.lookup(index, "fluconazole", k=5)) == 2
+
+    cache.remove_document('a')
+    assert [row['document_id'] for row in cache.lookup(index, "fluconazole", k=5)] == ['b']
+
+    cache.invalidate(('user', 'conv'))
+    assert cache.get_stats()['indexes'] == 0
@@ -0,0 +1,82 @@
+"""
+Tests for per-event-loop Supabase client pools
+Streamlit reruns call run_async from a new thread with a new loop each time
+"""
+
+import asyncio
+import threading
+import time
+
+from core.utils import run_async
+from supabase_manager import SimpleSupabaseManager
+
+
+class FakeClient:
+    def __init__(self):
+        self.loop = asyncio.get_running_loop()
+        self.closed_on = None
+
+    async def aclose(self):
+        self.closed_on = asyncio.get_running_loop()
+
+
+def make_manager():
+    manager = SimpleSupabaseManager(pool_size=2)
+    manager.created = []
+
+    async def create_client():
+        client = FakeClient()
+        manager.created.append(client)
+        return client
+
+    manager._create_client = create_client
+    return manager
+
+
+def rerun(manager):
+    """One Streamlit script run: a fresh thread borrowing a pooled client via run_async."""
+    async def query():
+        async with manager._client():
+            pass
+
+    thread = threading.Thread(target=run_async, args=(query(),))
+    thread.start()
+    thread.join()
+
+
+def test_repeated_reruns_do_not_grow_pools():
+    manager = make_manager()
+    for _ in range(20):
+        rerun(manager)
+
+    # Pools of finished script threads are dropped when the next one is created
+    assert len(manager._pools) <= 1
+    assert manager.get_stats()['active_pools'] <= 1
+    assert manager.stats['pool_clients_created'] == 20
+
+
+def test_pool_is_reused_within_a_loop():
+    manager = make_manager()
+
+    async def queries():
+        for _ in range(5):
+            async with manager._client():
+                pass
+
+    run_async(queries())
+    assert manager.stats['pool_clients_created'] == 1
+    assert manager.stats['pool_clients_reused'] == 4
+
+
+def test_clients_of_dropped_pools_are_closed_on_their_loop():
+    manager = make_manager()
+    for _ in range(3):
+        rerun(manager)
+    assert len(manager._pools) == 0  # every rerun thread has exited
+
+    dropped = manager.created
+    deadline = time.monotonic() + 5
+    while not all(client.loop.is_closed() for client in dropped) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert all(client.closed_on is client.loop for client in dropped)
+    assert all(client.loop.is_closed() for client in dropped)
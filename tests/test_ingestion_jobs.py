@@ -0,0 +1,125 @@
+"""
+Tests for utils.ingestion_jobs
+Background jobs: submission, progress, outcome and cancellation
+"""
+
+import asyncio
+import threading
+import time
+
+from utils.ingestion_jobs import IngestionJobQueue
+
+
+def wait_for_status(queue, job_id, statuses, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = queue.get_job(job_id)
+        if job['status'] in statuses:
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"job stayed {queue.get_job(job_id)['status']}")
+
+
+def test_job_reports_progress_and_outcome():
+    queue = IngestionJobQueue()
+    release = threading.Event()
+
+    async def job(job_id):
+        queue.update_progress(job_id, 3, 10)
+        while not release.is_set():
+            await asyncio.sleep(0.01)
+        return True, "Indexed", "doc-1"
+
+    job_id = queue.submit(job, owner='user', conversation_id='conv', filename='a.pdf')
+    running = wait_for_status(queue, job_id, ('running',))
+    deadline = time.monotonic() + 5
+    while queue.get_job(job_id)['chunks_done'] != 3 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert (queue.get_job(job_id)['chunks_done'], queue.get_job(job_id)['chunks_total']) == (3, 10)
+    assert running['finished_at'] is None
+
+    release.set()
+    job = wait_for_status(queue, job_id, ('completed',))
+    assert job['message'] == "Indexed" and job['document_id'] == "doc-1"
+    assert job['finished_at'] is not None
+
+
+def test_failed_and_raising_jobs_are_marked_failed():
+    queue = IngestionJobQueue()
+
+    async def unsuccessful(job_id):
+        return False, "No content to process", None
+
+    async def raising(job_id):
+        raise ValueError("Could not decode text file")
+
+    first = queue.submit(unsuccessful, owner='user', conversation_id='conv', filename='a.txt')
+    second = queue.submit(raising, owner='user', conversation_id='conv', filename='b.txt')
+    assert wait_for_status(queue, first, ('failed',))['message'] == "No content to process"
+    assert wait_for_status(queue, second, ('failed',))['message'] == "Could not decode text file"
+
+
+def test_cancel_running_and_queued_jobs():
+    queue = IngestionJobQueue(max_concurrent_jobs=1)
+    cancelled = threading.Event()
+
+    async def slow(job_id):
+        try:
+            await asyncio.sleep(30)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+        return True, "", None
+
+    running = queue.submit(slow, owner='user', conversation_id='conv', filename='a.pdf')
+    wait_for_status(queue, running, ('running',))
+    queued = queue.submit(slow, owner='user', conversation_id='conv', filename='b.pdf')
+    assert queue.get_job(queued)['status'] == 'queued'
+
+    assert queue.cancel(queued)
+    assert queue.cancel(running)
+    assert wait_for_status(queue, running, ('cancelled',))['message'] == 'Cancelled by user'
+    assert queue.get_job(queued)['status'] == 'cancelled'
+    assert cancelled.wait(5)
+    assert not queue.cancel(running)
+
+
+def test_jobs_are_listed_per_owner_and_conversation():
+    queue = IngestionJobQueue()
+
+    async def done(job_id):
+        return True, "", None
+
+    ids = [
+        queue.submit(done, owner='user', conversation_id='conv-1', filename='a.txt'),
+        queue.submit(done, owner='user', conversation_id='conv-2', filename='b.txt'),
+        queue.submit(done, owner='other', conversation_id='conv-1', filename='c.txt')
+    ]
+    for job_id in ids:
+        wait_for_status(queue, job_id, ('completed',))
+
+    assert [job['filename'] for job in queue.list_jobs('user', 'conv-1')] == ['a.txt']
+    assert len(queue.list_jobs('user')) == 2
+    assert queue.clear_finished('user') == 2
+    assert queue.list_jobs('user') == [] and len(queue.list_jobs('other')) == 1
+
+
+def test_submit_document_extracts_text_inside_the_job(monkeypatch):
+    import core.rag as rag
+
+    queue = IngestionJobQueue()
+    seen = {}
+
+    async def process_document_stream(conversation_id, user_id, filename, segments, file_type, file_size,
+                                      content_preview=None, on_progress=None):
+        seen['thread'] = threading.get_ident()
+        seen['segments'] = list(segments)
+        return True, "Indexed", "doc-1"
+
+    monkeypatch.setattr(rag, 'ingestion_jobs', queue)
+    monkeypatch.setattr(rag.conversation_rag, 'process_document_stream', process_document_stream)
+
+    job_id = rag.submit_document('conv', 'user', 'notes.txt', memoryview(b"Take with food."), 'txt', 15)
+    wait_for_status(queue, job_id, ('completed',))
+    assert seen['segments'] == [({}, "Take with food.")]
+    assert seen['thread'] != threading.get_ident()
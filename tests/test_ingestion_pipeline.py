@@ -0,0 +1,94 @@
+"""
+Tests for utils.ingestion_pipeline
+Chunks flow through split, embed and store in order, with progress and error propagation
+"""
+
+import asyncio
+import threading
+
+import pytest
+
+from utils.ingestion_pipeline import IngestionPipeline
+
+SEGMENTS = [({'page': 1}, "alpha beta gamma"), ({'page': 2}, "delta  "), ({'page': 3}, "epsilon zeta")]
+
+
+async def embed(texts):
+    return [[float(len(text))] for text in texts]
+
+
+def run_pipeline(segments=SEGMENTS, split_fn=str.split, embed_fn=embed, **kwargs):
+    stored = []
+    progress = []
+
+    async def store(batch, embeddings):
+        stored.extend(zip(batch, embeddings))
+        return len(batch)
+
+    pipeline = IngestionPipeline(split_fn, embed_fn, store, embed_batch_size=2,
+                                 on_progress=lambda *args: progress.append(args), **kwargs)
+    totals = asyncio.run(pipeline.run(segments))
+    return totals, stored, progress
+
+
+def test_chunks_are_indexed_with_segment_metadata():
+    totals, stored, progress = run_pipeline()
+
+    assert totals['segments'] == 3
+    assert totals['chunks_split'] == totals['chunks_stored'] == 6
+    by_index = {chunk['chunk_index']: (chunk, embedding) for chunk, embedding in stored}
+    assert [by_index[i][0]['content'] for i in range(6)] == ['alpha', 'beta', 'gamma', 'delta', 'epsilon', 'zeta']
+    assert by_index[3][0]['metadata'] == {'page': 2}
+    assert by_index[4][1] == [7.0]
+
+    assert progress[-1] == (6, 6, True)
+    assert all(not finished for _, _, finished in progress[:-1])
+
+
+def test_async_segments_and_blank_chunks():
+    async def segments():
+        yield {}, "one"
+        yield {}, "   "
+
+    totals, stored, _ = run_pipeline(segments(), split_fn=lambda text: [text])
+    assert totals['chunks_split'] == 1
+    assert [chunk['content'] for chunk, _ in stored] == ['one']
+
+
+def test_extract_and_split_run_off_the_event_loop():
+    threads = set()
+    loop_thread = []
+
+    def segments():
+        threads.add(threading.get_ident())
+        yield {}, "a b"
+
+    def split(text):
+        threads.add(threading.get_ident())
+        return text.split()
+
+    async def embed_on_loop(texts):
+        loop_thread.append(threading.get_ident())
+        return await embed(texts)
+
+    run_pipeline(segments(), split_fn=split, embed_fn=embed_on_loop)
+    assert loop_thread and loop_thread[0] not in threads
+
+
+def test_failure_in_a_stage_propagates():
+    async def failing_embed(texts):
+        raise RuntimeError("embedding service down")
+
+    with pytest.raises(RuntimeError, match="embedding service down"):
+        run_pipeline(embed_fn=failing_embed)
+
+
+def test_failing_progress_callback_does_not_stop_ingestion():
+    async def store(batch, embeddings):
+        return len(batch)
+
+    def progress(*args):
+        raise ValueError("UI gone")
+
+    pipeline = IngestionPipeline(str.split, embed, store, on_progress=progress)
+    assert asyncio.run(pipeline.run(SEGMENTS))['chunks_stored'] == 6
@@ -0,0 +1,68 @@
+"""
+Tests for utils.text_splitter
+Chunks must match LangChain's RecursiveCharacterTextSplitter and map back to source offsets
+"""
+
+import pytest
+
+from benchmark_text_splitter import make_document
+from utils.text_splitter import TextSplitter
+
+SEPARATORS = ["\n\n", "\n", ". ", "? ", "! ", " ", ""]
+SIZES = [(1000, 100), (300, 75), (50, 0), (40, 40)]
+
+
+@pytest.fixture(scope="module")
+def document():
+    return make_document(0.05)
+
+
+@pytest.mark.parametrize("chunk_size, chunk_overlap", SIZES)
+def test_same_chunks_as_langchain(document, chunk_size, chunk_overlap):
+    langchain_splitters = pytest.importorskip("langchain_text_splitters")
+    reference = langchain_splitters.RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size, chunk_overlap=chunk_overlap, separators=SEPARATORS
+    )
+    splitter = TextSplitter(chunk_size, chunk_overlap, separators=SEPARATORS)
+    assert splitter.split_text(document) == reference.split_text(document)
+
+
+@pytest.mark.parametrize("chunk_size, chunk_overlap", SIZES)
+def test_spans_index_the_source(document, chunk_size, chunk_overlap):
+    splitter = TextSplitter(chunk_size, chunk_overlap, separators=SEPARATORS)
+    spans = splitter.split_spans(document)
+
+    assert [document[start:end] for start, end in spans] == splitter.split_text(document)
+    for start, end in spans:
+        assert end - start <= chunk_size
+    # Spans move forward through the text
+    assert all(a[0] < b[0] for a, b in zip(spans, spans[1:]))
+
+
+def test_overlap_is_bounded(document):
+    splitter = TextSplitter(300, 75, separators=SEPARATORS)
+    spans = splitter.split_spans(document)
+
+    overlaps = [max(0, previous[1] - current[0]) for previous, current in zip(spans, spans[1:])]
+    assert max(overlaps) <= 75
+    assert any(overlaps)
+
+
+def test_no_overlap_without_chunk_overlap(document):
+    spans = TextSplitter(300, 0, separators=SEPARATORS).split_spans(document)
+    assert all(previous[1] <= current[0] for previous, current in zip(spans, spans[1:]))
+
+
+def test_length_function_bounds_chunks(document):
+    def words(text):
+        return len(text.split())
+
+    splitter = TextSplitter(60, 10, separators=SEPARATORS, length_function=words)
+    assert all(words(chunk) <= 60 for chunk in splitter.split_text(document))
+
+
+def test_invalid_sizes():
+    with pytest.raises(ValueError):
+        TextSplitter(0, 0)
+    with pytest.raises(ValueError):
+        TextSplitter(100, 200)
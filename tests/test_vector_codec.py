@@ -0,0 +1,53 @@
+"""
+Tests for utils.vector_codec
+Vector wire formats round trip
+"""
+
+import json
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from utils.vector_codec import format_vector, pack_vector, parse_vector, unpack_vector
+
+
+@pytest.fixture(scope="module")
+def vector():
+    rng = np.random.default_rng(0)
+    values = (rng.standard_normal(1024) * 0.03).astype(np.float32)
+    values[:3] = [0.0, -0.0, 1e-6]
+    return values
+
+
+def test_pack_unpack_float32_is_exact(vector):
+    packed = pack_vector(vector, 'f32')
+    assert packed.startswith('f32:')
+    assert np.array_equal(unpack_vector(packed), vector)
+
+
+def test_pack_unpack_float16_is_close(vector):
+    packed = pack_vector(vector.tolist(), 'f16')
+    assert len(packed) < len(pack_vector(vector, 'f32')) / 1.9
+    assert np.abs(unpack_vector(packed) - vector).max() < 1e-4
+
+
+def test_unpack_rejects_unknown_type():
+    with pytest.raises(ValueError):
+        unpack_vector('f64:AAAA')
+
+
+def test_pgvector_literal_round_trips_float32(vector):
+    literal = format_vector(vector.tolist())
+    assert literal.startswith('[') and literal.endswith(']')
+    assert len(literal) < len(json.dumps(vector.astype(float).tolist()))
+    assert np.array_equal(np.asarray(parse_vector(literal), dtype=np.float32), vector)
+
+
+def test_parse_vector_inputs(vector):
+    assert parse_vector(None) is None
+    assert parse_vector('[]') is None
+    assert parse_vector('not a vector') is None
+    assert parse_vector([0.5, 0.25]) == [0.5, 0.25]
+    assert np.array_equal(parse_vector(pack_vector(vector, 'f32')), vector)
+
@@ -0,0 +1,106 @@
+"""
+Tests for utils.vector_index
+Cosine search, and the cache's invalidation, generation guard and memory cap
+"""
+
+import asyncio
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from utils.vector_index import ConversationVectorIndex, VectorIndexCache
+
+
+def make_index(document_id: str = 'doc', count: int = 4, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    rows = [{'document_id': document_id, 'chunk_index': i, 'content': f"chunk {i}"} for i in range(count)]
+    return ConversationVectorIndex(rows, rng.standard_normal((count, 8)).tolist())
+
+
+def loader(index, calls=None):
+    async def load():
+        if calls is not None:
+            calls.append(1)
+        return index
+    return load
+
+
+def test_search_returns_cosine_top_k():
+    rng = np.random.default_rng(1)
+    embeddings = rng.standard_normal((50, 8))
+    rows = [{'document_id': 'doc', 'chunk_index': i} for i in range(50)]
+    index = ConversationVectorIndex(rows, embeddings.tolist())
+    query = rng.standard_normal(8)
+
+    results = index.search(query.tolist(), similarity_threshold=-1.0, max_chunks=5)
+    exact = embeddings @ query / (np.linalg.norm(embeddings, axis=1) * np.linalg.norm(query))
+    assert [row['chunk_index'] for row in results] == list(np.argsort(-exact)[:5])
+    assert results[0]['similarity'] == pytest.approx(exact.max(), abs=1e-5)
+    assert all(row['similarity'] >= 0.5 for row in index.search(query.tolist(), 0.5, 50))
+
+
+def test_cached_index_is_reused():
+    cache = VectorIndexCache()
+    calls = []
+    index = make_index()
+
+    assert asyncio.run(cache.get_or_load('conv', loader(index, calls))) is index
+    assert asyncio.run(cache.get_or_load('conv', loader(index, calls))) is index
+    assert len(calls) == 1
+    assert cache.get_stats()['hits'] == 1
+
+
+def test_load_overlapping_an_invalidation_is_not_cached():
+    cache = VectorIndexCache()
+    stale = make_index()
+
+    async def slow_load():
+        # An upload lands while the chunks are being fetched
+        cache.invalidate('conv')
+        return stale
+
+    assert asyncio.run(cache.get_or_load('conv', slow_load)) is stale
+    calls = []
+    fresh = make_index(seed=1)
+    assert asyncio.run(cache.get_or_load('conv', loader(fresh, calls))) is fresh
+    assert calls == [1]
+
+
+def test_invalidate_document_drops_only_indexes_holding_it():
+    cache = VectorIndexCache()
+    asyncio.run(cache.get_or_load('conv-a', loader(make_index('doc-a'))))
+    asyncio.run(cache.get_or_load('conv-b', loader(make_index('doc-b'))))
+
+    cache.invalidate_document('doc-a')
+    calls = []
+    asyncio.run(cache.get_or_load('conv-a', loader(make_index('doc-a'), calls)))
+    asyncio.run(cache.get_or_load('conv-b', loader(make_index('doc-b'), calls)))
+    assert len(calls) == 1
+
+
+def test_memory_cap_evicts_least_recently_used():
+    size = make_index().nbytes
+    cache = VectorIndexCache(max_bytes=2 * size)
+    for key in ('a', 'b'):
+        asyncio.run(cache.get_or_load(key, loader(make_index())))
+    asyncio.run(cache.get_or_load('a', loader(make_index())))   # 'b' is now least recently used
+    asyncio.run(cache.get_or_load('c', loader(make_index())))
+
+    stats = cache.get_stats()
+    assert stats['evictions'] == 1 and stats['indexes'] == 2
+    assert stats['bytes'] <= 2 * size
+    calls = []
+    asyncio.run(cache.get_or_load('a', loader(make_index(), calls)))
+    assert calls == []
+    asyncio.run(cache.get_or_load('b', loader(make_index(), calls)))
+    assert calls == [1]
+
+
+def test_oversized_conversations_fall_back_without_reloading():
+    cache = VectorIndexCache(max_chunks=3)
+    calls = []
+    assert asyncio.run(cache.get_or_load('conv', loader(make_index(count=4), calls))) is None
+    assert asyncio.run(cache.get_or_load('conv', loader(make_index(count=4), calls))) is None
+    assert len(calls) == 1
+    assert cache.get_stats()['oversized'] == 1
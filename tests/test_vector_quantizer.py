@@ -0,0 +1,74 @@
+"""
+Tests for utils.vector_quantizer
+Quantized codes rank like the float vectors; prefiltered search keeps its recall
+"""
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from utils.ann_index import IVFIndex
+from utils.vector_quantizer import make_quantizer
+
+DIMENSIONS = 64
+K = 10
+
+
+def unit_vectors(rng, count: int):
+    vectors = rng.standard_normal((count, DIMENSIONS)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+@pytest.fixture(scope="module")
+def corpus():
+    """Clustered unit vectors, like chunk embeddings of a few documents, and nearby queries."""
+    rng = np.random.default_rng(0)
+    centres = unit_vectors(rng, 40)
+    vectors = centres[rng.integers(0, len(centres), 3000)] + 0.08 * rng.standard_normal((3000, DIMENSIONS))
+    vectors = (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+    queries = vectors[rng.choice(len(vectors), 50, replace=False)] + 0.05 * rng.standard_normal((50, DIMENSIONS))
+    return vectors, queries.astype(np.float32)
+
+
+@pytest.mark.parametrize("kind, width, min_correlation", [('int8', 64, 0.99), ('binary', 8, 0.5)])
+def test_quantized_scores_rank_like_exact_scores(kind, width, min_correlation):
+    rng = np.random.default_rng(1)
+    vectors = unit_vectors(rng, 2000)
+    query = vectors[7] + 0.1 * rng.standard_normal(DIMENSIONS).astype(np.float32)
+    query /= np.linalg.norm(query)
+
+    quantizer = make_quantizer(kind)
+    quantizer.fit(vectors)
+    codes = quantizer.encode(vectors)
+    assert codes.shape == (2000, width)
+
+    approximate = quantizer.scores(codes, np.arange(len(vectors)), query)
+    exact = vectors @ query
+    # The exact nearest neighbour is among the best approximate candidates
+    assert int(np.argmax(exact)) in np.argsort(-approximate)[:20]
+    assert np.corrcoef(approximate, exact)[0, 1] > min_correlation
+
+
+@pytest.mark.parametrize("quantization, min_recall", [(None, 1.0), ('int8', 0.99), ('binary', 0.9)])
+def test_prefilter_and_rescore_recall(corpus, quantization, min_recall):
+    vectors, queries = corpus
+    rows = [{'document_id': str(i // 100), 'chunk_index': i} for i in range(len(vectors))]
+    index = IVFIndex(quantization=quantization)
+    index.add(rows, vectors)
+
+    hits = 0
+    for query in queries:
+        # Scan every list so only the quantized prefilter can lose neighbours
+        ids, scores = index.search_ids(query, K, nprobe=index.nlist)
+        exact = np.argsort(-(vectors @ (query / np.linalg.norm(query))))[:K]
+        hits += len(set(ids.tolist()) & set(exact.tolist()))
+        # Returned scores are exact cosine similarities, best first
+        assert np.all(np.diff(scores) <= 0)
+    assert hits / (K * len(queries)) >= min_recall
+
+
+def test_no_quantizer_by_default():
+    assert make_quantizer(None) is None
+    assert make_quantizer('none') is None
+    with pytest.raises(ValueError):
+        make_quantizer('pq')
@@ -0,0 +1,610 @@
+"""
+ANN Index for PharmGPT
+Per-user inverted-file (IVF) approximate nearest-neighbour index over chunk embeddings
+"""
+
+import os
+import json
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+from utils.vector_quantizer import make_quantizer
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+    logger.warning("NumPy not available, local ANN search disabled. Install with: pip install numpy")
+
+ANN_INDEX_ENABLED = os.getenv("PHARMGPT_ANN_INDEX_ENABLED", "false").lower() in ("1", "true", "yes")
+# Holds chunk text, so it lives in the app's data directory and is readable by its owner only
+DEFAULT_INDEX_DIR = os.getenv("PHARMGPT_ANN_INDEX_DIR", os.path.join("user_data", "ann_index"))
+INDEX_DIR_MODE = 0o700
+DEFAULT_MAX_LOADED_USERS = int(os.getenv("PHARMGPT_ANN_INDEX_MAX_USERS", "8"))
+# 'int8' or 'binary' prefilters candidates with compact codes and keeps the float vectors on disk
+ANN_QUANTIZATION = os.getenv("PHARMGPT_ANN_QUANTIZATION", "none").lower()
+
+DEFAULT_NPROBE = 8
+MIN_TRAIN_SIZE = 1024     # Below this a flat scan is as fast as probing
+VECTORS_PER_LIST = 256    # Target inverted list length when choosing nlist
+RETRAIN_GROWTH = 4        # Re-cluster once the index has grown this much since training
+KMEANS_ITERATIONS = 12
+KMEANS_SAMPLE_PER_LIST = 64
+ASSIGN_BATCH_SIZE = 4096
+INITIAL_CAPACITY = 1024
+RESCORE_FACTORS = {'int8': 4, 'binary': 32}   # Candidates rescored exactly, per result wanted
+MIN_RESCORE_CANDIDATES = 64
+
+
+def _make_private_dir(directory: str):
+    """Create ``directory`` (and missing parents) accessible to the owner only."""
+    os.makedirs(directory, mode=INDEX_DIR_MODE, exist_ok=True)
+    # makedirs applies the umask and leaves existing directories alone
+    os.chmod(directory, INDEX_DIR_MODE)
+
+
+def _normalise(vectors):
+    """L2-normalise rows in place (zero rows are left as is)."""
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    vectors /= norms
+    return vectors
+
+
+def _assign(vectors, centroids):
+    """Index of the most similar centroid for each row, computed in batches."""
+    assignments = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), ASSIGN_BATCH_SIZE):
+        batch = vectors[start:start + ASSIGN_BATCH_SIZE]
+        assignments[start:start + len(batch)] = np.argmax(batch @ centroids.T, axis=1)
+    return assignments
+
+
+def _spherical_kmeans(vectors, nlist: int, seed: int = 0):
+    """Cluster unit vectors into ``nlist`` unit centroids (cosine k-means)."""
+    rng = np.random.default_rng(seed)
+    sample_size = min(len(vectors), nlist * KMEANS_SAMPLE_PER_LIST)
+    sample = vectors[rng.choice(len(vectors), sample_size, replace=False)]
+    centroids = sample[rng.choice(sample_size, nlist, replace=False)].copy()
+
+    for _ in range(KMEANS_ITERATIONS):
+        assignments = _assign(sample, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, sample)
+        counts = np.bincount(assignments, minlength=nlist)
+        # Empty clusters are reseeded from random sample points
+        empty = np.flatnonzero(counts == 0)
+        if len(empty):
+            sums[empty] = sample[rng.choice(sample_size, len(empty), replace=False)]
+        centroids = _normalise(sums)
+    return centroids
+
+
+class IVFIndex:
+    """Inverted-file index: k-means centroids plus one list of row ids per centroid.
+
+    Vectors are stored L2-normalised, so scores are cosine similarities. A
+    search scores the centroids, scans only the ``nprobe`` closest lists and
+    returns the exact top-k among them. Until enough vectors exist to
+    train on, and for ``nprobe >= nlist``, every vector is scanned.
+
+    Rows are added incrementally (assigned to their nearest centroid) and
+    removed by document id; the clustering is retrained once the index has
+    grown ``RETRAIN_GROWTH`` times since it was last trained.
+
+    With a ``quantization`` ('int8' or 'binary') the candidates are first
+    ranked by compact codes of the vectors and only the best few per
+    result are rescored with the float vectors, which a loaded index reads
+    from a memory-mapped file instead of holding in memory.
+    """
+
+    def __init__(self, dimensions: Optional[int] = None, nprobe: int = DEFAULT_NPROBE,
+                 quantization: Optional[str] = None):
+        self.dimensions = dimensions
+        self.nprobe = nprobe
+        self.quantizer = make_quantizer(quantization)
+        self.codes = None
+
+        self.vectors = None
+        self.count = 0
+        self.rows: List[Optional[Dict]] = []  # Chunk payload per row id, None once removed
+        self.alive = np.zeros(0, dtype=bool) if NUMPY_AVAILABLE else None
+
+        self.centroids = None
+        self.assignments = np.zeros(0, dtype=np.int32) if NUMPY_AVAILABLE else None
+        self.trained_size = 0
+        self._lists: List[List[int]] = []
+        self._list_arrays: List[Optional["np.ndarray"]] = []
+
+    def __len__(self) -> int:
+        return int(self.alive[:self.count].sum())
+
+    @property
+    def nlist(self) -> int:
+        return 0 if self.centroids is None else len(self.centroids)
+
+    @property
+    def nbytes(self) -> int:
+        """Memory held by the index; memory-mapped vectors are not counted."""
+        if self.vectors is None:
+            return 0
+        total = self.assignments.nbytes + (self.centroids.nbytes if self.nlist else 0)
+        if not isinstance(self.vectors, np.memmap):
+            total += self.vectors.nbytes
+        if self.codes is not None:
+            total += self.codes.nbytes
+        return total
+
+    def _ensure_capacity(self, rows: int):
+        """Grow the vector and bookkeeping arrays (doubling) to hold ``rows`` vectors."""
+        capacity = 0 if self.vectors is None else len(self.vectors)
+        if rows <= capacity:
+            return
+
+        new_capacity = max(capacity, INITIAL_CAPACITY)
+        while new_capacity < rows:
+            new_capacity *= 2
+
+        vectors = np.zeros((new_capacity, self.dimensions), dtype=np.float32)
+        alive = np.zeros(new_capacity, dtype=bool)
+        assignments = np.zeros(new_capacity, dtype=np.int32)
+        if self.count:
+            vectors[:self.count] = self.vectors[:self.count]
+            alive[:self.count] = self.alive[:self.count]
+            assignments[:self.count] = self.assignments[:self.count]
+        self.vectors, self.alive, self.assignments = vectors, alive, assignments
+
+        if self.quantizer is not None:
+            codes = np.zeros((new_capacity, self.quantizer.code_width(self.dimensions)),
+                             dtype=self.quantizer.code_dtype)
+            if self.codes is not None and self.count:
+                codes[:self.count] = self.codes[:self.count]
+            self.codes = codes
+
+    def _encode_all(self):
+        """Recompute the codes of every row (after the quantizer was refitted)."""
+        for start in range(0, self.count, ASSIGN_BATCH_SIZE):
+            end = min(start + ASSIGN_BATCH_SIZE, self.count)
+            self.codes[start:end] = self.quantizer.encode(self.vectors[start:end])
+
+    def _rebuild_lists(self):
+        self._lists = [[] for _ in range(self.nlist)]
+        for row_id in np.flatnonzero(self.alive[:self.count]):
+            self._lists[self.assignments[row_id]].append(int(row_id))
+        self._list_arrays = [None] * self.nlist
+
+    def train(self):
+        """Cluster the live vectors and reassign every row to its nearest centroid."""
+        live = np.flatnonzero(self.alive[:self.count])
+        if len(live) < MIN_TRAIN_SIZE:
+            self.centroids = None
+            self._lists, self._list_arrays = [], []
+            return
+
+        nlist = max(1, len(live) // VECTORS_PER_LIST)
+        self.centroids = _spherical_kmeans(self.vectors[live], nlist)
+        if self.quantizer is not None and self.quantizer.kind == 'int8':
+            # Rescale to the value range of the grown index
+            self.quantizer.fit(self.vectors[live])
+            self._encode_all()
+        self.assignments[:self.count] = _assign(self.vectors[:self.count], self.centroids)
+        self.trained_size = len(live)
+        self._rebuild_lists()
+        logger.info(f"Trained IVF index: {len(live)} vectors in {nlist} lists")
+
+    def add(self, rows: Sequence[Dict], embeddings: Sequence[Sequence[float]]):
+        """Add chunk rows with their embeddings."""
+        if not len(rows):
+            return
+        vectors = _normalise(np.asarray(embeddings, dtype=np.float32).reshape(len(rows), -1))
+        if self.dimensions is None:
+            self.dimensions = vectors.shape[1]
+        elif vectors.shape[1] != self.dimensions:
+            raise ValueError(f"Got {vectors.shape[1]}-dimensional vectors for a {self.dimensions}-dimensional index")
+
+        start = self.count
+        self._ensure_capacity(start + len(rows))
+        self.vectors[start:start + len(rows)] = vectors
+        if self.quantizer is not None:
+            if not self.quantizer.fitted:
+                self.quantizer.fit(vectors)
+            self.codes[start:start + len(rows)] = self.quantizer.encode(vectors)
+        self.alive[start:start + len(rows)] = True
+        self.rows.extend(dict(row) for row in rows)
+        self.count += len(rows)
+
+        if self.nlist and len(self) < self.trained_size * RETRAIN_GROWTH:
+            assignments = _assign(vectors, self.centroids)
+            self.assignments[start:self.count] = assignments
+            for offset, centroid in enumerate(assignments):
+                self._lists[centroid].append(start + offset)
+                self._list_arrays[centroid] = None
+        else:
+            self.train()
+
+    def remove_document(self, document_id: str) -> int:
+        """Remove every row of a document; returns the number of rows removed."""
+        return self._remove_rows('document_id', document_id)
+
+    def remove_conversation(self, conversation_id: str) -> int:
+        """Remove every row of a conversation; returns the number of rows removed."""
+        return self._remove_rows('conversation_id', conversation_id)
+
+    def _remove_rows(self, field: str, value: str) -> int:
+        removed = 0
+        for row_id, row in enumerate(self.rows):
+            if row is not None and row.get(field) == value:
+                self.rows[row_id] = None
+                self.alive[row_id] = False
+                removed += 1
+        if removed and self.nlist:
+            self._rebuild_lists()
+        return removed
+
+    def _candidates(self, query, nprobe: int):
+        """Row ids to score for a query: the ``nprobe`` closest lists, or every live row."""
+        if not self.nlist or nprobe >= self.nlist:
+            return np.flatnonzero(self.alive[:self.count])
+
+        probes = np.argpartition(self.centroids @ query, -nprobe)[-nprobe:]
+        arrays = []
+        for centroid in probes:
+            if self._list_arrays[centroid] is None:
+                self._list_arrays[centroid] = np.asarray(self._lists[centroid], dtype=np.int64)
+            arrays.append(self._list_arrays[centroid])
+        return np.concatenate(arrays)
+
+    def search_ids(self, query_embedding: Sequence[float], k: int, nprobe: Optional[int] = None,
+                   rescore_factor: Optional[int] = None) -> Tuple["np.ndarray", "np.ndarray"]:
+        """Row ids and cosine similarities of the (approximate) top k, best first.
+
+        With quantization, only the ``rescore_factor * k`` candidates with
+        the best code scores are scored exactly.
+        """
+        if not self.count or k <= 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+
+        query = np.asarray(query_embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm:
+            query = query / norm
+
+        candidates = self._candidates(query, nprobe or self.nprobe)
+        if self.quantizer is not None:
+            rescore = max(k * (rescore_factor or RESCORE_FACTORS[self.quantizer.kind]), MIN_RESCORE_CANDIDATES)
+            if len(candidates) > rescore:
+                approximate = self.quantizer.scores(self.codes, candidates, query)
+                candidates = candidates[np.argpartition(approximate, -rescore)[-rescore:]]
+            # Sorted ids read the memory-mapped vectors in file order
+            candidates = np.sort(candidates)
+        scores = self.vectors[candidates] @ query
+        if len(candidates) > k:
+            top = np.argpartition(scores, -k)[-k:]
+            candidates, scores = candidates[top], scores[top]
+        order = np.argsort(-scores, kind='stable')
+        return candidates[order], scores[order]
+
+    def search(self, query_embedding: Sequence[float], k: int,
+               similarity_threshold: float = 0.0, nprobe: Optional[int] = None) -> List[Dict]:
+        """Top k chunk rows with similarity >= threshold, best first."""
+        row_ids, scores = self.search_ids(query_embedding, k, nprobe)
+        return [
+            {**self.rows[row_id], 'similarity': float(score)}
+            for row_id, score in zip(row_ids, scores)
+            if score >= similarity_threshold
+        ]
+
+    def save(self, directory: str):
+        """Persist the index (arrays plus chunk rows), replacing any previous copy atomically."""
+        _make_private_dir(directory)
+        arrays_path = os.path.join(directory, "index.npz")
+        vectors_path = os.path.join(directory, "vectors.npy")
+        rows_path = os.path.join(directory, "rows.json")
+
+        # Removed rows are compacted away on save
+        live = np.flatnonzero(self.alive[:self.count])
+        vectors = self.vectors[live] if len(live) else np.zeros((0, self.dimensions or 0), dtype=np.float32)
+        arrays = {
+            'assignments': self.assignments[live],
+            'trained_size': np.array([self.trained_size])
+        }
+        if self.nlist:
+            arrays['centroids'] = self.centroids
+        if self.quantizer is not None and self.codes is not None:
+            arrays['quantization'] = np.array(self.quantizer.kind)
+            arrays['codes'] = self.codes[live]
+            if self.quantizer.kind == 'int8':
+                arrays['code_scale'] = self.quantizer.scale
+
+        # Vectors go in a plain .npy file so a quantized index can memory-map them
+        with open(f"{vectors_path}.tmp", "wb") as f:
+            np.save(f, vectors)
+        with open(f"{arrays_path}.tmp", "wb") as f:
+            np.savez(f, **arrays)
+        with open(f"{rows_path}.tmp", "w", encoding="utf-8") as f:
+            json.dump([self.rows[row_id] for row_id in live], f)
+        os.replace(f"{vectors_path}.tmp", vectors_path)
+        os.replace(f"{rows_path}.tmp", rows_path)
+        os.replace(f"{arrays_path}.tmp", arrays_path)
+
+    @classmethod
+    def load(cls, directory: str, nprobe: int = DEFAULT_NPROBE,
+             quantization: Optional[str] = None) -> Optional["IVFIndex"]:
+        """Load an index saved with ``save``, or None if missing or unreadable.
+
+        With a ``quantization`` the float vectors stay memory-mapped and only
+        the codes are held in memory.
+        """
+        arrays_path = os.path.join(directory, "index.npz")
+        vectors_path = os.path.join(directory, "vectors.npy")
+        rows_path = os.path.join(directory, "rows.json")
+        if not os.path.exists(arrays_path) or not os.path.exists(rows_path):
+            return None
+
+        index = cls(nprobe=nprobe, quantization=quantization)
+        try:
+            with np.load(arrays_path) as arrays:
+                assignments = arrays['assignments']
+                trained_size = int(arrays['trained_size'][0])
+                centroids = arrays['centroids'] if 'centroids' in arrays.files else None
+                codes = None
+                if index.quantizer is not None and 'quantization' in arrays.files \
+                        and str(arrays['quantization']) == index.quantizer.kind:
+                    codes = arrays['codes']
+                    if 'code_scale' in arrays.files:
+                        index.quantizer.scale = arrays['code_scale']
+                # Indexes saved before vectors.npy kept the vectors in the archive
+                if 'vectors' in arrays.files:
+                    vectors = arrays['vectors']
+                else:
+                    vectors = np.load(vectors_path, mmap_mode='r' if index.quantizer is not None else None)
+            with open(rows_path, "r", encoding="utf-8") as f:
+                rows = json.load(f)
+            if not len(rows) == len(vectors) == len(assignments):
+                raise ValueError(f"{len(rows)} rows for {len(vectors)} vectors")
+        except Exception as e:
+            logger.warning(f"Discarding unreadable ANN index in {directory}: {e}")
+            return None
+
+        index.dimensions = vectors.shape[1] if len(vectors) else None
+        if len(vectors) and index.quantizer is not None:
+            index.vectors = vectors
+            index.alive = np.ones(len(vectors), dtype=bool)
+            index.assignments = assignments.astype(np.int32)
+            index.count = len(vectors)
+            if codes is not None and len(codes) == len(vectors):
+                index.codes = codes
+            else:
+                index.codes = np.zeros((len(vectors), index.quantizer.code_width(index.dimensions)),
+                                       dtype=index.quantizer.code_dtype)
+                if not index.quantizer.fitted:
+                    index.quantizer.fit(vectors)
+                index._encode_all()
+        elif len(vectors):
+            index._ensure_capacity(len(vectors))
+            index.vectors[:len(vectors)] = vectors
+            index.alive[:len(vectors)] = True
+            index.assignments[:len(vectors)] = assignments
+            index.count = len(vectors)
+        index.rows = rows
+        index.centroids = centroids
+        index.trained_size = trained_size
+        if index.nlist:
+            index._rebuild_lists()
+        return index
+
+
+class UserANNIndexes:
+    """Per-user IVF indexes kept on disk, with the most recently used ones in memory.
+
+    An index is built from the database on a user's first search and
+    persisted; afterwards it is updated as chunks are ingested or deleted
+    and reloaded from disk after a restart. A reloaded index is only
+    served once its chunk count matches the database's, since chunks may
+    have been deleted by paths that never reached this process.
+    """
+
+    def __init__(self, index_dir: str = DEFAULT_INDEX_DIR,
+                 max_loaded_users: int = DEFAULT_MAX_LOADED_USERS,
+                 enabled: bool = ANN_INDEX_ENABLED,
+                 quantization: str = ANN_QUANTIZATION):
+        self.index_dir = index_dir
+        self.max_loaded_users = max_loaded_users
+        self.enabled = enabled and NUMPY_AVAILABLE
+        self.quantization = None if quantization == 'none' else quantization
+
+        # user -> index, least recently used first
+        self._indexes: "OrderedDict[str, IVFIndex]" = OrderedDict()
+        self._dirty = set()
+        self._verified = set()  # Users whose loaded index was built here or checked against the database
+        self._lock = threading.RLock()
+        self.stats = {
+            'searches': 0,
+            'builds': 0,
+            'loads': 0,
+            'stale_loads': 0,
+            'rows_added': 0,
+            'rows_removed': 0
+        }
+
+    def _user_dir(self, user_uuid: str) -> str:
+        return os.path.join(self.index_dir, hashlib.sha256(str(user_uuid).encode("utf-8")).hexdigest()[:32])
+
+    def _remember(self, user_uuid: str, index: IVFIndex):
+        self._indexes[user_uuid] = index
+        self._indexes.move_to_end(user_uuid)
+        while len(self._indexes) > self.max_loaded_users:
+            evicted_user, evicted = self._indexes.popitem(last=False)
+            self._verified.discard(evicted_user)
+            if evicted_user in self._dirty:
+                self._save(evicted_user, evicted)
+
+    def _save(self, user_uuid: str, index: IVFIndex):
+        try:
+            _make_private_dir(self.index_dir)
+            index.save(self._user_dir(user_uuid))
+            self._dirty.discard(user_uuid)
+        except Exception as e:
+            logger.warning(f"Could not persist ANN index: {e}")
+            return
+
+        # A quantized index built or grown in memory swaps back to memory-mapped vectors
+        if index.quantizer is not None and self._indexes.get(user_uuid) is index \
+                and not isinstance(index.vectors, np.memmap):
+            reloaded = IVFIndex.load(self._user_dir(user_uuid), quantization=self.quantization)
+            if reloaded is not None:
+                self._indexes[user_uuid] = reloaded
+
+    def _get_loaded(self, user_uuid: str) -> Optional[IVFIndex]:
+        """The user's index from memory or disk, without building it."""
+        with self._lock:
+            index = self._indexes.get(user_uuid)
+            if index is None:
+                index = IVFIndex.load(self._user_dir(user_uuid), quantization=self.quantization)
+                if index is None:
+                    return None
+                self.stats['loads'] += 1
+            self._remember(user_uuid, index)
+            return index
+
+    async def get_or_build(self, user_uuid: str,
+                           load_rows: Callable[[], Awaitable[Tuple[List[Dict], List[List[float]]]]],
+                           count_rows: Optional[Callable[[], Awaitable[int]]] = None
+                           ) -> Optional[IVFIndex]:
+        """Return the user's index, building it from ``load_rows()`` the first time.
+
+        ``load_rows`` returns the user's chunk rows and their embeddings;
+        ``count_rows``, if given, returns how many the database holds and is
+        used to discard a stale index loaded from disk.
+        Returns None when disabled or when the rows could not be loaded.
+        """
+        if not self.enabled:
+            return None
+
+        index = self._get_loaded(user_uuid)
+        if index is not None:
+            if count_rows is None or user_uuid in self._verified:
+                return index
+            try:
+                expected = await count_rows()
+            except Exception as e:
+                logger.warning(f"Could not check ANN index freshness: {e}")
+                return index
+            if expected == len(index):
+                self._verified.add(user_uuid)
+                return index
+            logger.info(f"Rebuilding stale ANN index ({len(index)} chunks, database has {expected})")
+            self.stats['stale_loads'] += 1
+            self.drop(user_uuid)
+
+        try:
+            rows, embeddings = await load_rows()
+            index = IVFIndex(quantization=self.quantization)
+            index.add(rows, embeddings)
+        except Exception as e:
+            logger.warning(f"Could not build ANN index: {e}")
+            return None
+
+        with self._lock:
+            # Ingest may have created the index while the rows were loading
+            existing = self._get_loaded(user_uuid)
+            if existing is not None:
+                return existing
+            self.stats['builds'] += 1
+            self._verified.add(user_uuid)
+            self._remember(user_uuid, index)
+            self._save(user_uuid, index)
+            index = self._indexes.get(user_uuid, index)
+        logger.info(f"Built ANN index of {len(index)} chunks ({index.nlist} lists)")
+        return index
+
+    def search(self, index: IVFIndex, query_embedding: Sequence[float], k: int,
+               similarity_threshold: float) -> List[Dict]:
+        """Search a user's index."""
+        self.stats['searches'] += 1
+        with self._lock:
+            return index.search(query_embedding, k, similarity_threshold)
+
+    def add(self, user_uuid: str, rows: Sequence[Dict], embeddings: Sequence[Sequence[float]]):
+        """Add newly ingested chunks to the user's index, if one has been built."""
+        if not self.enabled:
+            return
+        with self._lock:
+            index = self._get_loaded(user_uuid)
+            if index is None:
+                return
+            try:
+                index.add(rows, embeddings)
+            except ValueError as e:
+                logger.warning(f"Dropping ANN index after a failed update: {e}")
+                self.drop(user_uuid)
+                return
+            self._dirty.add(user_uuid)
+            self.stats['rows_added'] += len(rows)
+
+    def remove_document(self, user_uuid: str, document_id: str):
+        """Remove a deleted document's chunks from the user's index."""
+        if not self.enabled:
+            return
+        with self._lock:
+            index = self._get_loaded(user_uuid)
+            if index is None:
+                return
+            removed = index.remove_document(document_id)
+            if removed:
+                self.stats['rows_removed'] += removed
+                self._save(user_uuid, index)
+
+    def remove_conversation(self, user_uuid: str, conversation_id: str):
+        """Remove a deleted conversation's chunks from the user's index."""
+        if not self.enabled:
+            return
+        with self._lock:
+            index = self._get_loaded(user_uuid)
+            if index is None:
+                return
+            removed = index.remove_conversation(conversation_id)
+            if removed:
+                self.stats['rows_removed'] += removed
+                self._save(user_uuid, index)
+
+    def flush(self, user_uuid: str):
+        """Persist the user's index if it has unsaved updates."""
+        with self._lock:
+            index = self._indexes.get(user_uuid)
+            if index is not None and user_uuid in self._dirty:
+                self._save(user_uuid, index)
+
+    def drop(self, user_uuid: str):
+        """Forget the user's index in memory and on disk; it is rebuilt on next search."""
+        with self._lock:
+            self._indexes.pop(user_uuid, None)
+            self._dirty.discard(user_uuid)
+            self._verified.discard(user_uuid)
+            for name in ("index.npz", "vectors.npy", "rows.json"):
+                try:
+                    os.remove(os.path.join(self._user_dir(user_uuid), name))
+                except OSError:
+                    pass
+
+    def get_stats(self) -> Dict:
+        """Get ANN index statistics."""
+        stats = self.stats.copy()
+        stats['enabled'] = self.enabled
+        stats['quantization'] = self.quantization or 'none'
+        with self._lock:
+            stats['loaded_users'] = len(self._indexes)
+            stats['loaded_vectors'] = sum(len(index) for index in self._indexes.values())
+            stats['bytes'] = sum(index.nbytes for index in self._indexes.values())
+        return stats
+
+
+# Global per-user ANN indexes
+user_ann_indexes = UserANNIndexes()
@@ -0,0 +1,259 @@
+"""
+BM25 Index for PharmGPT
+Per-conversation lexical index over chunk text, fused with vector search by reciprocal rank
+"""
+
+import re
+import os
+import logging
+import threading
+from array import array
+from collections import Counter, OrderedDict
+from typing import Awaitable, Callable, Dict, Hashable, List, Optional, Sequence, Tuple
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+    logger.warning("NumPy not available, lexical search disabled. Install with: pip install numpy")
+
+DEFAULT_MAX_CONVERSATIONS = int(os.getenv("PHARMGPT_BM25_MAX_CONVERSATIONS", "64"))
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+RRF_K = 60
+
+# Keeps drug codes, enzymes and doses whole: "cyp3a4", "5-ht3", "2.5mg", "mg/kg"
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[-./][a-z0-9]+)*")
+STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from has have how in is it its of on or "
+    "should that the their there these this to was what when where which who why will with".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased word, code and dose tokens without stopwords."""
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+
+class BM25Index:
+    """Okapi BM25 over the chunks of one conversation.
+
+    Postings are kept per term as two compact typed arrays (chunk ids and
+    term frequencies) that only ever grow, so chunks can be added as they
+    are ingested; scoring reads them zero-copy through NumPy.
+    """
+
+    def __init__(self, k1: float = BM25_K1, b: float = BM25_B):
+        self.k1 = k1
+        self.b = b
+        self.rows: List[Optional[Dict]] = []  # Chunk payload per chunk id, None once removed
+        self.doc_lengths = array('I')
+        self.alive = array('B')
+        self.live_count = 0
+        self.live_length = 0
+        # term -> (chunk ids, term frequencies)
+        self.postings: Dict[str, Tuple[array, array]] = {}
+
+    def __len__(self) -> int:
+        return self.live_count
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate memory held by the index (postings plus chunk text)."""
+        postings = sum(ids.itemsize * len(ids) + tfs.itemsize * len(tfs) for ids, tfs in self.postings.values())
+        return postings + sum(len(row.get('content') or '') for row in self.rows if row is not None)
+
+    def add(self, rows: Sequence[Dict]):
+        """Index chunk rows (dicts with at least ``content``)."""
+        for row in rows:
+            chunk_id = len(self.rows)
+            terms = Counter(tokenize(row.get('content') or ''))
+            length = sum(terms.values())
+
+            self.rows.append(row)
+            self.doc_lengths.append(length)
+            self.alive.append(1)
+            self.live_count += 1
+            self.live_length += length
+
+            for term, frequency in terms.items():
+                posting = self.postings.get(term)
+                if posting is None:
+                    posting = self.postings[term] = (array('I'), array('H'))
+                posting[0].append(chunk_id)
+                posting[1].append(min(frequency, 65535))
+
+    def remove_document(self, document_id: str) -> int:
+        """Remove a document's chunks; their postings are skipped at query time."""
+        removed = 0
+        for chunk_id, row in enumerate(self.rows):
+            if row is not None and row.get('document_id') == document_id:
+                self.rows[chunk_id] = None
+                self.alive[chunk_id] = 0
+                self.live_count -= 1
+                self.live_length -= self.doc_lengths[chunk_id]
+                removed += 1
+        return removed
+
+    def search(self, query: str, k: int) -> List[Dict]:
+        """Top k chunks by BM25 score, best first, each with a ``bm25_score``."""
+        terms = set(tokenize(query))
+        if not self.live_count or not terms or k <= 0:
+            return []
+
+        lengths = np.frombuffer(self.doc_lengths, dtype=np.uint32).astype(np.float32)
+        alive = np.frombuffer(self.alive, dtype=np.uint8).astype(bool)
+        norm = self.k1 * (1 - self.b + self.b * lengths / max(self.live_length / self.live_count, 1e-9))
+        scores = np.zeros(len(self.rows), dtype=np.float32)
+
+        for term in terms:
+            posting = self.postings.get(term)
+            if posting is None:
+                continue
+            ids = np.frombuffer(posting[0], dtype=np.uint32)
+            tfs = np.frombuffer(posting[1], dtype=np.uint16).astype(np.float32)
+            live = alive[ids]
+            frequency = int(live.sum())
+            if not frequency:
+                continue
+            idf = np.log(1 + (self.live_count - frequency + 0.5) / (frequency + 0.5))
+            ids, tfs = ids[live], tfs[live]
+            scores[ids] += idf * tfs * (self.k1 + 1) / (tfs + norm[ids])
+
+        matched = np.flatnonzero(scores)
+        if len(matched) > k:
+            matched = matched[np.argpartition(scores[matched], -k)[-k:]]
+        matched = matched[np.argsort(-scores[matched], kind='stable')]
+        return [{**self.rows[i], 'bm25_score': float(scores[i])} for i in matched]
+
+
+def _fusion_key(chunk: Dict) -> Hashable:
+    """Identity of a chunk across result lists (RPC rows and index rows differ in columns)."""
+    if chunk.get('document_id') is not None and chunk.get('chunk_index') is not None:
+        return (chunk['document_id'], chunk['chunk_index'])
+    return chunk.get('content')
+
+
+def reciprocal_rank_fusion(result_lists: Sequence[Sequence[Dict]], limit: int,
+                           k: int = RRF_K) -> List[Dict]:
+    """Merge ranked result lists by reciprocal rank fusion, sum(1 / (k + rank)).
+
+    Chunks found by several lists are merged (fields of earlier lists win)
+    and carry their fused score as ``rrf_score``.
+    """
+    fused: Dict[Hashable, Dict] = {}
+    for results in result_lists:
+        for rank, chunk in enumerate(results, start=1):
+            key = _fusion_key(chunk)
+            entry = fused.get(key)
+            if entry is None:
+                entry = fused[key] = {**chunk, 'rrf_score': 0.0}
+            else:
+                for field, value in chunk.items():
+                    entry.setdefault(field, value)
+            entry['rrf_score'] += 1.0 / (k + rank)
+
+    ranked = sorted(fused.values(), key=lambda chunk: chunk['rrf_score'], reverse=True)
+    return ranked[:limit]
+
+
+class BM25IndexCache:
+    """LRU cache of per-conversation BM25 indexes.
+
+    An index is loaded from the database on a conversation's first lexical
+    search and then kept current by adding chunks as they are ingested.
+    """
+
+    def __init__(self, max_conversations: int = DEFAULT_MAX_CONVERSATIONS):
+        self.max_conversations = max_conversations
+        self.enabled = NUMPY_AVAILABLE and max_conversations > 0
+
+        # key -> index, least recently used first
+        self._indexes: "OrderedDict[Hashable, BM25Index]" = OrderedDict()
+        # Bumped by every update; loads that saw it change are not cached
+        self._generation = 0
+        self._lock = threading.Lock()
+        self.stats = {
+            'hits': 0,
+            'misses': 0,
+            'chunks_added': 0,
+            'evictions': 0
+        }
+
+    async def get_or_load(self, key: Hashable,
+                          load_rows: Callable[[], Awaitable[List[Dict]]]) -> Optional[BM25Index]:
+        """Return the index for ``key``, building it from ``load_rows()`` the first time."""
+        if not self.enabled:
+            return None
+
+        with self._lock:
+            index = self._indexes.get(key)
+            if index is not None:
+                self._indexes.move_to_end(key)
+                self.stats['hits'] += 1
+                return index
+            generation = self._generation
+        self.stats['misses'] += 1
+
+        try:
+            index = BM25Index()
+            index.add(await load_rows())
+        except Exception as e:
+            logger.warning(f"Could not build BM25 index: {e}")
+            return None
+
+        with self._lock:
+            if self._generation == generation:
+                self._indexes[key] = index
+                while len(self._indexes) > self.max_conversations:
+                    self._indexes.popitem(last=False)
+                    self.stats['evictions'] += 1
+        return index
+
+    def search(self, index: BM25Index, query: str, k: int) -> List[Dict]:
+        """Search a conversation's index (serialised with ingest, which grows the postings)."""
+        with self._lock:
+            return index.search(query, k)
+
+    def add(self, key: Hashable, rows: Sequence[Dict]):
+        """Add newly ingested chunks to the conversation's index, if it is loaded."""
+        with self._lock:
+            self._generation += 1
+            index = self._indexes.get(key)
+            if index is not None:
+                index.add(rows)
+                self.stats['chunks_added'] += len(rows)
+
+    def invalidate(self, key: Hashable):
+        """Drop the index for ``key``, e.g. after the conversation was deleted."""
+        with self._lock:
+            self._generation += 1
+            self._indexes.pop(key, None)
+
+    def remove_document(self, document_id: str):
+        """Remove a deleted document's chunks from every loaded index."""
+        with self._lock:
+            self._generation += 1
+            for index in self._indexes.values():
+                index.remove_document(document_id)
+
+    def get_stats(self) -> Dict:
+        """Get cache statistics including hit rate."""
+        stats = self.stats.copy()
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        stats['enabled'] = self.enabled
+        with self._lock:
+            stats['indexes'] = len(self._indexes)
+            stats['chunks'] = sum(len(index) for index in self._indexes.values())
+            stats['bytes'] = sum(index.nbytes for index in self._indexes.values())
+        return stats
+
+
+# Global BM25 index cache
+bm25_index_cache = BM25IndexCache()
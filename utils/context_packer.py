@@ -0,0 +1,184 @@
+"""
+Context Packer for PharmGPT
+Selects retrieved chunks into a prompt token budget and merges overlapping neighbours
+"""
+
+import logging
+from typing import Callable, Dict, List, Optional, Sequence
+
+from utils.tokenizer import count_tokens
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+PASSAGE_SEPARATOR = "\n\n"
+KNAPSACK_BUCKETS = 1000        # Token costs are scaled to at most this many capacity steps
+OVERLAP_PROBE_CHARS = 32       # Leading characters of a chunk searched for in its predecessor
+MAX_OVERLAP_CHARS = 4000
+
+
+def strip_overlap(previous: str, current: str) -> str:
+    """``current`` without the prefix it shares with the end of ``previous``.
+
+    Adjacent chunks from the splitter repeat up to ``chunk_overlap`` of the
+    preceding text; the longest suffix of ``previous`` that ``current``
+    starts with is removed.
+    """
+    probe = current[:OVERLAP_PROBE_CHARS]
+    if not probe:
+        return current
+
+    position = previous.find(probe, max(0, len(previous) - MAX_OVERLAP_CHARS))
+    while position != -1:
+        overlap = len(previous) - position
+        if current.startswith(previous[position:]):
+            return current[overlap:].lstrip()
+        position = previous.find(probe, position + 1)
+    return current
+
+
+def _chunk_score(chunk: Dict, rank: int, score_key: str) -> float:
+    """Relevance of a chunk: its score field, else a rank-based weight."""
+    score = chunk.get(score_key)
+    if score is None:
+        score = chunk.get('rrf_score')
+    if score is None:
+        score = 1.0 / (rank + 1)
+    return max(float(score), 1e-6)
+
+
+def _knapsack(values: Sequence[float], costs: Sequence[int], budget: int) -> List[int]:
+    """Indices maximising total value within the budget (0/1 knapsack, bucketed costs)."""
+    if budget <= 0:
+        return []
+    scale = max(1.0, budget / KNAPSACK_BUCKETS)
+    capacity = int(budget / scale)
+    weights = [int(-(-cost // scale)) for cost in costs]  # Rounded up, so the budget is never exceeded
+
+    best = [0.0] * (capacity + 1)
+    keep = [[False] * (capacity + 1) for _ in values]
+    for i, (value, weight) in enumerate(zip(values, weights)):
+        if weight > capacity:
+            continue
+        for c in range(capacity, weight - 1, -1):
+            candidate = best[c - weight] + value
+            if candidate > best[c]:
+                best[c] = candidate
+                keep[i][c] = True
+
+    selected = []
+    c = capacity
+    for i in range(len(values) - 1, -1, -1):
+        if keep[i][c]:
+            selected.append(i)
+            c -= weights[i]
+    return selected[::-1]
+
+
+def _chunk_position(chunk: Dict):
+    """(document, chunk index) of a chunk, or None when unknown."""
+    metadata = chunk.get('metadata') if isinstance(chunk.get('metadata'), dict) else {}
+    document = chunk.get('document_id') or metadata.get('filename') or chunk.get('filename')
+    index = chunk.get('chunk_index', metadata.get('chunk_index'))
+    if document is None or index is None:
+        return None
+    return document, index
+
+
+def _merge_adjacent(chunks: List[Dict], scores: List[float]) -> List[Dict]:
+    """Group selected chunks into passages of consecutive chunks, overlaps removed."""
+    positions = [_chunk_position(chunk) for chunk in chunks]
+    # Document order; chunks without a known position stay separate, at the end
+    order = sorted(
+        range(len(chunks)),
+        key=lambda i: (0, str(positions[i][0]), positions[i][1]) if positions[i] else (1, '', i)
+    )
+
+    passages = []
+    previous_position = None
+    for i in order:
+        chunk = chunks[i]
+        position = positions[i]
+        content = chunk.get('content') or ''
+        if (passages and position is not None and previous_position is not None
+                and position[0] == previous_position[0] and position[1] == previous_position[1] + 1):
+            passage = passages[-1]
+            passage['parts'].append(strip_overlap(passage['parts'][-1], content))
+            passage['chunks'].append(chunk)
+            passage['score'] = max(passage['score'], scores[i])
+        else:
+            passages.append({'parts': [content], 'chunks': [chunk], 'score': scores[i]})
+        previous_position = position
+
+    for passage in passages:
+        passage['content'] = "\n".join(part for part in passage.pop('parts') if part)
+    return passages
+
+
+def pack_chunks(chunks: Sequence[Dict], max_tokens: int,
+                format_passage: Optional[Callable[[Dict], str]] = None,
+                score_key: str = 'similarity',
+                separator: str = PASSAGE_SEPARATOR) -> List[Dict]:
+    """Choose the most relevant chunks that fit ``max_tokens`` and merge neighbours.
+
+    Each chunk costs the tokens of its formatted text plus a separator; the
+    selection maximises total relevance (``score_key``, else ``rrf_score``,
+    else rank) within the budget. Selected chunks that are consecutive in
+    the same document are merged into one passage with the repeated overlap
+    removed, and the tokens saved are used for more chunks.
+
+    Returns passages, most relevant first, as dicts with ``content``,
+    ``chunks``, ``score``, ``tokens`` and the formatted ``text``.
+    """
+    format_passage = format_passage or (lambda passage: passage['content'])
+    chunks = [chunk for chunk in chunks if (chunk.get('content') or '').strip()]
+    if not chunks or max_tokens <= 0:
+        return []
+
+    scores = [_chunk_score(chunk, rank, score_key) for rank, chunk in enumerate(chunks)]
+    separator_tokens = count_tokens(separator)
+    costs = [
+        count_tokens(format_passage({'content': chunk['content'], 'chunks': [chunk], 'score': score})) + separator_tokens
+        for chunk, score in zip(chunks, scores)
+    ]
+
+    selected = _knapsack(scores, costs, max_tokens)
+    passages = []
+    while True:
+        passages = _merge_adjacent([chunks[i] for i in selected], [scores[i] for i in selected])
+        for passage in passages:
+            passage['text'] = format_passage(passage)
+            passage['tokens'] = count_tokens(passage['text']) + separator_tokens
+        used = sum(passage['tokens'] for passage in passages)
+
+        # Spend tokens freed by merging on the next most valuable chunks that fit
+        remaining = max_tokens - used
+        chosen = set(selected)
+        added = []
+        for i in sorted(range(len(chunks)), key=lambda i: scores[i] / costs[i], reverse=True):
+            if i not in chosen and costs[i] <= remaining:
+                added.append(i)
+                remaining -= costs[i]
+        if not added:
+            break
+        selected = sorted(chosen.union(added))
+
+    passages.sort(key=lambda passage: passage['score'], reverse=True)
+    # Token counts of joined text can differ slightly from the sum; drop the tail if over
+    while passages and sum(passage['tokens'] for passage in passages) > max_tokens:
+        passages.pop()
+    return passages
+
+
+def pack_context(chunks: Sequence[Dict], max_tokens: int,
+                 format_passage: Optional[Callable[[Dict], str]] = None,
+                 score_key: str = 'similarity',
+                 separator: str = PASSAGE_SEPARATOR) -> str:
+    """Packed context string for a prompt; see ``pack_chunks``."""
+    passages = pack_chunks(chunks, max_tokens, format_passage, score_key, separator)
+    if passages:
+        logger.info(
+            f"Packed {sum(len(p['chunks']) for p in passages)}/{len(chunks)} chunks into "
+            f"{len(passages)} passages ({sum(p['tokens'] for p in passages)}/{max_tokens} tokens)"
+        )
+    return separator.join(passage['text'] for passage in passages)
@@ -0,0 +1,121 @@
+"""
+Document Context Cache for PharmGPT
+Per-conversation cache of reassembled documents and the full-document contexts built from them
+"""
+
+import os
+import logging
+import threading
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Hashable, List, Tuple
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_CONVERSATIONS = int(os.getenv("PHARMGPT_CONTEXT_CACHE_MAX_CONVERSATIONS", "32"))
+MAX_CONTEXTS_PER_CONVERSATION = 4  # Distinct context budgets kept per conversation
+
+
+class DocumentContextCache:
+    """LRU cache of a conversation's reassembled documents and rendered contexts.
+
+    An entry holds the conversation's documents as ``(document_id,
+    filename, content)`` in first-seen order, plus the context strings
+    rendered from them per length budget. Entries are only dropped when a
+    document of the conversation is added or deleted.
+    """
+
+    def __init__(self, max_conversations: int = DEFAULT_MAX_CONVERSATIONS):
+        self.max_conversations = max_conversations
+        self.enabled = max_conversations > 0
+
+        # key -> {'documents': [...], 'contexts': OrderedDict(budget -> str)}, least recently used first
+        self._entries: "OrderedDict[Hashable, Dict]" = OrderedDict()
+        # Bumped by every invalidation; loads that saw it change are not cached
+        self._generation = 0
+        self._lock = threading.Lock()
+        self.stats = {
+            'hits': 0,
+            'document_hits': 0,
+            'misses': 0,
+            'invalidations': 0,
+            'evictions': 0
+        }
+
+    async def get_or_build(self, key: Hashable, budget: int,
+                           load_documents: Callable[[], Awaitable[List[Tuple[str, str, str]]]],
+                           render: Callable[[List[Tuple[str, str, str]], int], str]) -> str:
+        """Context for ``key`` within ``budget``.
+
+        Served from the cache when rendered before; otherwise rendered with
+        ``render(documents, budget)`` from the cached documents, loading them
+        with ``load_documents()`` on first use.
+        """
+        if not self.enabled:
+            return render(await load_documents(), budget)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                context = entry['contexts'].get(budget)
+                if context is not None:
+                    entry['contexts'].move_to_end(budget)
+                    self.stats['hits'] += 1
+                    return context
+                documents = entry['documents']
+                self.stats['document_hits'] += 1
+            else:
+                documents = None
+                self.stats['misses'] += 1
+            generation = self._generation
+
+        if documents is None:
+            documents = await load_documents()
+        context = render(documents, budget)
+
+        with self._lock:
+            if self._generation == generation:
+                entry = self._entries.get(key)
+                if entry is None:
+                    entry = self._entries[key] = {'documents': documents, 'contexts': OrderedDict()}
+                entry['contexts'][budget] = context
+                while len(entry['contexts']) > MAX_CONTEXTS_PER_CONVERSATION:
+                    entry['contexts'].popitem(last=False)
+                while len(self._entries) > self.max_conversations:
+                    self._entries.popitem(last=False)
+                    self.stats['evictions'] += 1
+        return context
+
+    def invalidate(self, key: Hashable):
+        """Drop the entry for ``key``, e.g. after a document was added to the conversation."""
+        with self._lock:
+            self._generation += 1
+            self._entries.pop(key, None)
+            self.stats['invalidations'] += 1
+
+    def invalidate_document(self, document_id: str):
+        """Drop every entry containing ``document_id``."""
+        with self._lock:
+            self._generation += 1
+            for key, entry in list(self._entries.items()):
+                if any(doc_id == document_id for doc_id, _, _ in entry['documents']):
+                    del self._entries[key]
+            self.stats['invalidations'] += 1
+
+    def get_stats(self) -> Dict:
+        """Get cache statistics including hit rate."""
+        stats = self.stats.copy()
+        lookups = stats['hits'] + stats['document_hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        stats['enabled'] = self.enabled
+        with self._lock:
+            stats['conversations'] = len(self._entries)
+            stats['characters'] = sum(
+                len(content) for entry in self._entries.values() for _, _, content in entry['documents']
+            )
+        return stats
+
+
+# Global document context cache
+document_context_cache = DocumentContextCache()
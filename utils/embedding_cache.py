@@ -0,0 +1,440 @@
+"""
+Embedding Cache for PharmGPT
+Content-addressed, persistent cache of document embeddings shared by both RAG engines,
+plus an in-memory LRU cache for query embeddings
+"""
+
+import os
+import time
+import json
+import atexit
+import asyncio
+import hashlib
+import logging
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+    logger.warning("NumPy not available, embedding cache disabled. Install with: pip install numpy")
+
+DEFAULT_CACHE_DIR = os.getenv(
+    "PHARMGPT_EMBEDDING_CACHE_DIR",
+    os.path.join(tempfile.gettempdir(), "pharmgpt_embedding_cache")
+)
+DEFAULT_MAX_ENTRIES = int(os.getenv("PHARMGPT_EMBEDDING_CACHE_MAX_ENTRIES", "20000"))
+# The index is rewritten at most this often (and at exit), not on every write
+DEFAULT_FLUSH_INTERVAL_SECONDS = float(os.getenv("PHARMGPT_EMBEDDING_CACHE_FLUSH_SECONDS", "30"))
+INITIAL_CAPACITY = 1024
+KEY_DIGEST_BYTES = 16
+
+DEFAULT_QUERY_CACHE_SIZE = 1024
+DEFAULT_QUERY_CACHE_TTL_SECONDS = 3600
+
+
+def make_cache_key(model: str, text: str) -> str:
+    """Hash of (model, text) used to address a cached embedding."""
+    return hashlib.sha256(f"{model}\0{text}".encode("utf-8")).hexdigest()
+
+
+def _key_digest(key: str):
+    """Leading bytes of a cache key, stored next to its vector."""
+    return np.frombuffer(bytes.fromhex(key[:KEY_DIGEST_BYTES * 2]), dtype=np.uint8)
+
+
+class _ModelStore:
+    """Vectors for one embedding model: a float32 memmap plus an LRU slot index.
+
+    Each slot also records a digest of its key, written together with the
+    vector. The index is only persisted now and then, so after a crash it
+    can map a key to a slot that has since been reused; such entries are
+    dropped on load instead of returning another text's vector.
+    """
+
+    def __init__(self, directory: str, max_entries: int):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.vectors_path = os.path.join(directory, "vectors.f32")
+        self.keys_path = os.path.join(directory, "keys.bin")
+        self.index_path = os.path.join(directory, "index.json")
+
+        self.dimensions: Optional[int] = None
+        self.capacity = 0
+        self.vectors = None
+        self.keys = None
+        self.dirty = False
+
+        # key -> slot, least recently used first
+        self.slots: "OrderedDict[str, int]" = OrderedDict()
+        self.free_slots: List[int] = []
+        self.next_slot = 0
+
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+
+    def _load(self):
+        """Load the index and map the vector file, discarding it if inconsistent."""
+        if not all(os.path.exists(path) for path in (self.index_path, self.vectors_path, self.keys_path)):
+            return
+
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                index = json.load(f)
+
+            dimensions = int(index["dimensions"])
+            capacity = min(os.path.getsize(self.vectors_path) // (dimensions * 4),
+                           os.path.getsize(self.keys_path) // KEY_DIGEST_BYTES)
+
+            self.dimensions = dimensions
+            self.capacity = capacity
+            self.vectors = np.memmap(self.vectors_path, dtype=np.float32, mode="r+",
+                                     shape=(capacity, dimensions))
+            self.keys = np.memmap(self.keys_path, dtype=np.uint8, mode="r+",
+                                  shape=(capacity, KEY_DIGEST_BYTES))
+            self.slots = OrderedDict(
+                (key, int(slot)) for key, slot in index["entries"]
+                if int(slot) < capacity and np.array_equal(self.keys[int(slot)], _key_digest(key))
+            )
+
+            used = set(self.slots.values())
+            self.next_slot = max(used) + 1 if used else 0
+            self.free_slots = [slot for slot in range(self.next_slot) if slot not in used]
+            logger.info(f"Loaded embedding cache with {len(self.slots)} entries from {self.directory}")
+
+        except Exception as e:
+            logger.warning(f"Discarding unreadable embedding cache in {self.directory}: {e}")
+            self.dimensions = None
+            self.capacity = 0
+            self.vectors = None
+            self.keys = None
+            self.slots = OrderedDict()
+            self.free_slots = []
+            self.next_slot = 0
+
+    def _ensure_capacity(self, rows: int):
+        """Grow the memmap file (doubling) so it can hold at least ``rows`` vectors."""
+        if rows <= self.capacity:
+            return
+
+        new_capacity = max(self.capacity, INITIAL_CAPACITY)
+        while new_capacity < rows:
+            new_capacity *= 2
+        new_capacity = min(new_capacity, self.max_entries)
+
+        if self.vectors is not None:
+            self.vectors.flush()
+            self.keys.flush()
+            self.vectors = self.keys = None
+
+        with open(self.vectors_path, "ab") as f:
+            f.truncate(new_capacity * self.dimensions * 4)
+        with open(self.keys_path, "ab") as f:
+            f.truncate(new_capacity * KEY_DIGEST_BYTES)
+
+        self.vectors = np.memmap(self.vectors_path, dtype=np.float32, mode="r+",
+                                 shape=(new_capacity, self.dimensions))
+        self.keys = np.memmap(self.keys_path, dtype=np.uint8, mode="r+",
+                              shape=(new_capacity, KEY_DIGEST_BYTES))
+        self.capacity = new_capacity
+
+    def get(self, key: str):
+        """Return the cached vector (as a float32 row) or None."""
+        slot = self.slots.get(key)
+        if slot is None:
+            return None
+        self.slots.move_to_end(key)
+        return self.vectors[slot]
+
+    def put(self, key: str, vector) -> bool:
+        """Store a vector, evicting the least recently used entry when full.
+
+        Returns True when an entry had to be evicted.
+        """
+        if self.dimensions is None:
+            self.dimensions = len(vector)
+        elif len(vector) != self.dimensions:
+            raise ValueError(f"Embedding has {len(vector)} dimensions, cache expects {self.dimensions}")
+
+        evicted = False
+        slot = self.slots.get(key)
+        if slot is None:
+            if self.free_slots:
+                slot = self.free_slots.pop()
+            elif self.next_slot < self.max_entries:
+                slot = self.next_slot
+                self.next_slot += 1
+            else:
+                _, slot = self.slots.popitem(last=False)
+                evicted = True
+            self._ensure_capacity(slot + 1)
+
+        self.vectors[slot] = np.asarray(vector, dtype=np.float32)
+        self.keys[slot] = _key_digest(key)
+        self.slots[key] = slot
+        self.slots.move_to_end(key)
+        self.dirty = True
+        return evicted
+
+    def flush(self):
+        """Persist vectors and the index (atomically replaced) if anything changed."""
+        if self.vectors is None or not self.dirty:
+            return
+
+        self.vectors.flush()
+        self.keys.flush()
+
+        tmp_path = f"{self.index_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "dimensions": self.dimensions,
+                "entries": list(self.slots.items())
+            }, f)
+        os.replace(tmp_path, self.index_path)
+        self.dirty = False
+
+
+class EmbeddingCache:
+    """Persistent embedding cache keyed by a hash of (model, chunk text).
+
+    Vectors are stored as float32 rows in a memory-mapped file per model, with
+    a JSON index mapping keys to rows. The cache is bounded by ``max_entries``
+    per model and evicts the least recently used entries. The index is
+    persisted at most every ``flush_interval`` seconds and by ``flush``
+    (called at exit); the async variants of the lookups run the file IO in
+    an executor.
+    """
+
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR, max_entries: int = DEFAULT_MAX_ENTRIES,
+                 flush_interval: float = DEFAULT_FLUSH_INTERVAL_SECONDS):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.flush_interval = flush_interval
+        self.enabled = NUMPY_AVAILABLE and max_entries > 0
+
+        self._stores: Dict[str, _ModelStore] = {}
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+        self.stats = {
+            'hits': 0,
+            'misses': 0,
+            'writes': 0,
+            'evictions': 0,
+            'flushes': 0
+        }
+
+    def _get_store(self, model: str) -> _ModelStore:
+        """Get (or open) the store for an embedding model."""
+        store = self._stores.get(model)
+        if store is None:
+            directory = os.path.join(self.cache_dir, hashlib.sha256(model.encode("utf-8")).hexdigest()[:16])
+            store = _ModelStore(directory, self.max_entries)
+            self._stores[model] = store
+        return store
+
+    def get_many(self, model: str, texts: List[str]) -> List[Optional[List[float]]]:
+        """Look up embeddings for texts; missing entries are returned as None."""
+        if not self.enabled:
+            self.stats['misses'] += len(texts)
+            return [None] * len(texts)
+
+        results: List[Optional[List[float]]] = []
+        try:
+            with self._lock:
+                store = self._get_store(model)
+                for text in texts:
+                    vector = store.get(make_cache_key(model, text))
+                    results.append(vector.tolist() if vector is not None else None)
+        except Exception as e:
+            logger.warning(f"Embedding cache lookup failed: {e}")
+            results = [None] * len(texts)
+
+        hits = sum(1 for vector in results if vector is not None)
+        self.stats['hits'] += hits
+        self.stats['misses'] += len(texts) - hits
+        return results
+
+    def put_many(self, model: str, texts: List[str], embeddings: List[List[float]]):
+        """Store embeddings for texts; the index is persisted once the flush interval has passed."""
+        if not self.enabled or not texts:
+            return
+
+        try:
+            with self._lock:
+                store = self._get_store(model)
+                for text, embedding in zip(texts, embeddings):
+                    # Zero vectors are the embedding managers' failure placeholders
+                    if not embedding or not any(embedding):
+                        continue
+                    if store.put(make_cache_key(model, text), embedding):
+                        self.stats['evictions'] += 1
+                    self.stats['writes'] += 1
+                if time.monotonic() - self._last_flush >= self.flush_interval:
+                    self._flush_stores()
+        except Exception as e:
+            logger.warning(f"Embedding cache write failed: {e}")
+
+    async def get_many_async(self, model: str, texts: List[str]) -> List[Optional[List[float]]]:
+        """``get_many`` off the event loop (reads may fault in memory-mapped pages)."""
+        return await asyncio.get_running_loop().run_in_executor(None, self.get_many, model, texts)
+
+    async def put_many_async(self, model: str, texts: List[str], embeddings: List[List[float]]):
+        """``put_many`` off the event loop."""
+        await asyncio.get_running_loop().run_in_executor(None, self.put_many, model, texts, embeddings)
+
+    def _flush_stores(self):
+        for store in self._stores.values():
+            if store.dirty:
+                store.flush()
+                self.stats['flushes'] += 1
+        self._last_flush = time.monotonic()
+
+    def flush(self):
+        """Persist every store with unsaved writes."""
+        try:
+            with self._lock:
+                self._flush_stores()
+        except Exception as e:
+            logger.warning(f"Embedding cache flush failed: {e}")
+
+    def get_stats(self) -> Dict:
+        """Get cache statistics including hit rate."""
+        stats = self.stats.copy()
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        stats['enabled'] = self.enabled
+        with self._lock:
+            stats['entries'] = sum(len(store.slots) for store in self._stores.values())
+        return stats
+
+
+class QueryEmbeddingCache:
+    """Bounded, TTL-aware LRU cache for query embeddings.
+
+    Queries are normalised (case and whitespace) before lookup, and identical
+    queries that arrive while one is still being embedded share that single
+    API call instead of issuing their own.
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_QUERY_CACHE_SIZE,
+                 ttl_seconds: float = DEFAULT_QUERY_CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+
+        # (model, normalised query) -> (expires_at, embedding), least recently used first
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, List[float]]]" = OrderedDict()
+        # In-flight computations; futures belong to the loop that created them
+        self._in_flight: Dict[Tuple[asyncio.AbstractEventLoop, str, str], asyncio.Future] = {}
+        self._lock = threading.Lock()
+        self.stats = {
+            'hits': 0,
+            'misses': 0,
+            'coalesced': 0,
+            'expired': 0,
+            'evictions': 0
+        }
+
+    @staticmethod
+    def normalize(query: str) -> str:
+        """Normalise a query for cache lookups."""
+        return " ".join(query.lower().split())
+
+    def get(self, model: str, query: str) -> Optional[List[float]]:
+        """Return a cached, unexpired embedding or None."""
+        key = (model, self.normalize(query))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+
+            expires_at, embedding = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self.stats['expired'] += 1
+                return None
+
+            self._entries.move_to_end(key)
+            return embedding
+
+    def put(self, model: str, query: str, embedding: List[float]):
+        """Cache an embedding, evicting the least recently used entry when full."""
+        key = (model, self.normalize(query))
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, embedding)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats['evictions'] += 1
+
+    async def get_or_compute(self, model: str, query: str,
+                             compute: Callable[[str], Awaitable[List[float]]]) -> List[float]:
+        """Return the cached embedding for a query or compute it once."""
+        embedding = self.get(model, query)
+        if embedding is not None:
+            self.stats['hits'] += 1
+            return embedding
+
+        loop = asyncio.get_running_loop()
+        flight_key = (loop, model, self.normalize(query))
+
+        with self._lock:
+            future = self._in_flight.get(flight_key)
+            owner = future is None
+            if owner:
+                future = loop.create_future()
+                self._in_flight[flight_key] = future
+
+        if not owner:
+            self.stats['coalesced'] += 1
+            return await asyncio.shield(future)
+
+        self.stats['misses'] += 1
+        try:
+            embedding = await compute(query)
+            if embedding and any(embedding):
+                self.put(model, query, embedding)
+            future.set_result(embedding)
+            return embedding
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark the exception retrieved when nobody else was waiting
+            future.exception()
+            raise
+        finally:
+            with self._lock:
+                self._in_flight.pop(flight_key, None)
+
+    def get_stats(self) -> Dict:
+        """Get cache statistics including hit rate."""
+        stats = self.stats.copy()
+        lookups = stats['hits'] + stats['misses'] + stats['coalesced']
+        stats['hit_rate'] = (stats['hits'] + stats['coalesced']) / lookups if lookups else 0.0
+        with self._lock:
+            stats['entries'] = len(self._entries)
+        return stats
+
+
+# Global cache instances
+embedding_cache = EmbeddingCache()
+query_embedding_cache = QueryEmbeddingCache()
+
+# Persist writes made since the last interval flush
+atexit.register(embedding_cache.flush)
+
+
+def get_embedding_cache_stats() -> Dict:
+    """Get embedding cache statistics."""
+    return {
+        'documents': embedding_cache.get_stats(),
+        'queries': query_embedding_cache.get_stats()
+    }
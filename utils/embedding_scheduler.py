@@ -0,0 +1,239 @@
+"""
+Embedding Scheduler for PharmGPT
+Token-aware, concurrent and rate-limited batching of embedding requests
+"""
+
+import time
+import random
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Defaults tuned to Mistral's embedding API limits
+DEFAULT_MAX_CONCURRENCY = 4
+DEFAULT_REQUESTS_PER_SECOND = 5.0
+DEFAULT_TOKENS_PER_MINUTE = 500_000
+DEFAULT_MAX_BATCH_TOKENS = 16_000
+DEFAULT_MAX_BATCH_SIZE = 128
+DEFAULT_MAX_RETRIES = 5
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token estimate (about 4 characters per token)."""
+    return max(1, len(text) // 4)
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """Check whether an exception is an HTTP 429 / rate limit error."""
+    status = getattr(error, 'status_code', None)
+    response = getattr(error, 'response', None)
+    if status is None and response is not None:
+        status = getattr(response, 'status_code', None)
+    if status == 429:
+        return True
+
+    message = str(error).lower()
+    return '429' in message or 'rate limit' in message or 'too many requests' in message
+
+
+class TokenBucket:
+    """Thread-safe token bucket for pacing requests.
+
+    ``acquire`` reserves tokens immediately (the balance may go negative) and
+    sleeps until the reservation is covered, so callers are served in order.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self, amount: float) -> float:
+        """Reserve tokens and return how long the caller has to wait."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+
+            self._tokens -= min(amount, self.capacity)
+            return -self._tokens / self.rate if self._tokens < 0 else 0.0
+
+    async def acquire(self, amount: float = 1.0):
+        """Wait until ``amount`` tokens are available."""
+        delay = self._reserve(amount)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+class EmbeddingScheduler:
+    """Runs embedding batches concurrently under rate limits.
+
+    Texts are grouped into batches by token count, batches run concurrently up
+    to an adaptive concurrency limit, and every request is paced by a request
+    bucket and a token bucket. On rate limit errors the concurrency limit is
+    halved and all batches pause with exponential backoff; successful requests
+    slowly raise the limit again (AIMD).
+    """
+
+    def __init__(self,
+                 embed_fn: Callable[[List[str]], List[List[float]]],
+                 max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+                 requests_per_second: float = DEFAULT_REQUESTS_PER_SECOND,
+                 tokens_per_minute: int = DEFAULT_TOKENS_PER_MINUTE,
+                 max_batch_tokens: int = DEFAULT_MAX_BATCH_TOKENS,
+                 max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+                 max_retries: int = DEFAULT_MAX_RETRIES,
+                 token_counter: Callable[[str], int] = estimate_tokens):
+        self.embed_fn = embed_fn
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_batch_tokens = max_batch_tokens
+        self.max_batch_size = max_batch_size
+        self.max_retries = max_retries
+        self.token_counter = token_counter
+
+        self.request_bucket = TokenBucket(requests_per_second, max(1.0, requests_per_second))
+        self.token_bucket = TokenBucket(tokens_per_minute / 60.0, max_batch_tokens)
+
+        # Dedicated threads so embedding calls don't starve the default executor
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_concurrency, thread_name_prefix="embedding"
+        )
+        self._concurrency_limit = float(self.max_concurrency)
+        self._cooldown_until = 0.0
+        self._lock = threading.Lock()
+
+        self.stats = {
+            'requests': 0,
+            'texts': 0,
+            'tokens': 0,
+            'rate_limited': 0,
+            'retries': 0
+        }
+
+    def make_batches(self, texts: List[str]) -> List[List[int]]:
+        """Group text indices into batches bounded by token count and size."""
+        batches: List[List[int]] = []
+        current: List[int] = []
+        current_tokens = 0
+
+        for i, text in enumerate(texts):
+            tokens = self.token_counter(text)
+            if current and (current_tokens + tokens > self.max_batch_tokens
+                            or len(current) >= self.max_batch_size):
+                batches.append(current)
+                current, current_tokens = [], 0
+            current.append(i)
+            current_tokens += tokens
+
+        if current:
+            batches.append(current)
+        return batches
+
+    @property
+    def concurrency_limit(self) -> int:
+        """Current adaptive concurrency limit."""
+        return max(1, int(self._concurrency_limit))
+
+    def _on_success(self):
+        with self._lock:
+            self._concurrency_limit = min(
+                float(self.max_concurrency),
+                self._concurrency_limit + 1.0 / max(1.0, self._concurrency_limit)
+            )
+
+    def _on_rate_limit(self, attempt: int) -> float:
+        """Shrink concurrency and start a shared cooldown; returns the backoff delay."""
+        delay = min(30.0, 2 ** attempt) * (0.5 + random.random() / 2)
+        with self._lock:
+            self._concurrency_limit = max(1.0, self._concurrency_limit / 2)
+            self._cooldown_until = max(self._cooldown_until, time.monotonic() + delay)
+        self.stats['rate_limited'] += 1
+        return delay
+
+    async def _wait_for_cooldown(self):
+        delay = self._cooldown_until - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        """Embed texts, preserving input order."""
+        if not texts:
+            return []
+
+        batches = self.make_batches(texts)
+        results: List[Optional[List[float]]] = [None] * len(texts)
+
+        # Slot accounting is per call because asyncio primitives are loop-bound
+        in_flight = 0
+        failed = False
+        slot_freed = asyncio.Condition()
+
+        async def run_batch(indices: List[int]):
+            nonlocal in_flight, failed
+            batch = [texts[i] for i in indices]
+            tokens = sum(self.token_counter(text) for text in batch)
+
+            for attempt in range(self.max_retries):
+                async with slot_freed:
+                    await slot_freed.wait_for(lambda: failed or in_flight < self.concurrency_limit)
+                    if failed:
+                        return
+                    in_flight += 1
+
+                try:
+                    await self._wait_for_cooldown()
+                    await self.request_bucket.acquire(1)
+                    await self.token_bucket.acquire(tokens)
+
+                    self.stats['requests'] += 1
+                    loop = asyncio.get_running_loop()
+                    embeddings = await loop.run_in_executor(self._executor, self.embed_fn, batch)
+
+                    for i, embedding in zip(indices, embeddings):
+                        results[i] = embedding
+                    self.stats['texts'] += len(batch)
+                    self.stats['tokens'] += tokens
+                    self._on_success()
+                    return
+
+                except Exception as e:
+                    if not is_rate_limit_error(e) or attempt == self.max_retries - 1:
+                        failed = True
+                        raise
+                    delay = self._on_rate_limit(attempt)
+                    self.stats['retries'] += 1
+                    logger.warning(
+                        f"Embedding rate limited, backing off {delay:.1f}s "
+                        f"(concurrency now {self.concurrency_limit})"
+                    )
+
+                finally:
+                    async with slot_freed:
+                        in_flight -= 1
+                        slot_freed.notify_all()
+
+        tasks = [asyncio.ensure_future(run_batch(indices)) for indices in batches]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            # A failed batch fails the call, so stop the sibling batches from spending quota
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+        logger.info(f"Embedded {len(texts)} texts in {len(batches)} batches")
+        return results
+
+    def get_stats(self) -> Dict:
+        """Get scheduler statistics."""
+        stats = self.stats.copy()
+        stats['concurrency_limit'] = self.concurrency_limit
+        stats['max_concurrency'] = self.max_concurrency
+        return stats
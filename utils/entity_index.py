@@ -0,0 +1,324 @@
+"""
+Entity Index for PharmGPT
+Aho-Corasick drug-entity tagging of chunks and per-conversation entity -> chunk lookups
+"""
+
+import re
+import os
+import logging
+import threading
+from collections import Counter, OrderedDict, deque
+from typing import Awaitable, Callable, Dict, Hashable, Iterable, List, Optional, Sequence, Set, Tuple
+
+from utils.pharma_lexicon import load_lexicon
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_CONVERSATIONS = int(os.getenv("PHARMGPT_ENTITY_INDEX_MAX_CONVERSATIONS", "64"))
+
+# Drug-like words by INN stem, and enzyme/transporter codes, mined from uploaded documents
+DRUG_STEM_PATTERN = re.compile(
+    r"\b[a-z]{3,}(?:mab|tinib|nib|pril|sartan|olol|statin|azole|cillin|mycin|floxacin|cycline|"
+    r"vir|tidine|prazole|dipine|gliptin|gliflozin|parin|xaban|gatran|triptan|setron|lukast|"
+    r"afil|azepam|azolam|barbital|oxetine|triptyline|semide|profen|coxib|dronate|glitazone)\b"
+)
+ENZYME_CODE_PATTERN = re.compile(r"\b(?:cyp\d{1,2}[a-z]\d{1,2}|ugt\d[a-z]\d{1,2}|oatp\d[a-z]\d)\b")
+MINED_ENTITY_PREFIX = "term:"
+
+
+class AhoCorasick:
+    """Aho-Corasick automaton over lowercase surface forms, matching whole words.
+
+    All surface forms are found in one left-to-right pass over the text,
+    in time linear in the text length plus the number of matches.
+    """
+
+    def __init__(self, patterns: Dict[str, str]):
+        """Build the automaton from surface form -> entity id."""
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[List[Tuple[int, str]]] = [[]]
+
+        for pattern, entity_id in patterns.items():
+            state = 0
+            for char in pattern:
+                next_state = self._goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto[state][char] = next_state
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append([])
+                state = next_state
+            self._output[state].append((len(pattern), entity_id))
+
+        # Failure links, breadth first; outputs of the failure state are inherited
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(char, 0)
+                self._fail[next_state] = target if target != next_state else 0
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+
+    def __len__(self) -> int:
+        return len(self._goto)
+
+    def find(self, text: str) -> Counter:
+        """Entity id -> number of whole-word mentions in text (case-insensitive)."""
+        text = text.lower()
+        goto, fail, output = self._goto, self._fail, self._output
+        found = Counter()
+        state = 0
+        last = len(text) - 1
+        for i, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if not output[state]:
+                continue
+            if i < last and text[i + 1].isalnum():
+                continue
+            for length, entity_id in output[state]:
+                start = i - length + 1
+                if start == 0 or not text[start - 1].isalnum():
+                    found[entity_id] += 1
+        return found
+
+
+def mine_terms(text: str) -> Set[str]:
+    """Drug-like words and enzyme codes in text, lowercased."""
+    text = text.lower()
+    return set(DRUG_STEM_PATTERN.findall(text)) | set(ENZYME_CODE_PATTERN.findall(text))
+
+
+class EntityIndex:
+    """Entity -> chunk postings for one conversation.
+
+    Chunks are tagged with the built-in lexicon plus terms mined from the
+    conversation's own documents; a question is matched with the same
+    automaton and its entities are looked up directly.
+    """
+
+    def __init__(self, lexicon_patterns: Dict[str, str]):
+        self._lexicon_patterns = lexicon_patterns
+        self.mined_terms: Set[str] = set()
+        self._automaton: Optional[AhoCorasick] = None
+
+        self.rows: List[Optional[Dict]] = []  # Chunk payload per chunk id, None once removed
+        # entity id -> {chunk id: mentions}
+        self.postings: Dict[str, Dict[int, int]] = {}
+
+    def __len__(self) -> int:
+        return sum(1 for row in self.rows if row is not None)
+
+    @property
+    def automaton(self) -> AhoCorasick:
+        if self._automaton is None:
+            patterns = {term: MINED_ENTITY_PREFIX + term for term in self.mined_terms}
+            patterns.update(self._lexicon_patterns)
+            self._automaton = AhoCorasick(patterns)
+        return self._automaton
+
+    def learn_terms(self, texts: Iterable[str]):
+        """Add terms mined from document text to the automaton."""
+        new_terms = set()
+        for text in texts:
+            new_terms |= mine_terms(text)
+        new_terms -= self.mined_terms
+        new_terms.difference_update(self._lexicon_patterns)
+        if new_terms:
+            self.mined_terms |= new_terms
+            self._automaton = None
+
+    def tag(self, text: str) -> Dict[str, int]:
+        """Entity id -> mentions in text."""
+        return dict(self.automaton.find(text))
+
+    def add(self, rows: Sequence[Dict], tags: Optional[Sequence[Dict[str, int]]] = None) -> List[Dict[str, int]]:
+        """Index chunk rows, tagging them unless ``tags`` are given; returns the tags."""
+        if tags is None:
+            self.learn_terms(row.get('content') or '' for row in rows)
+            tags = [self.tag(row.get('content') or '') for row in rows]
+
+        for row, entities in zip(rows, tags):
+            chunk_id = len(self.rows)
+            self.rows.append(row)
+            for entity_id, mentions in entities.items():
+                self.postings.setdefault(entity_id, {})[chunk_id] = mentions
+        return list(tags)
+
+    def remove_document(self, document_id: str) -> int:
+        """Remove a document's chunks from the postings."""
+        removed = set()
+        for chunk_id, row in enumerate(self.rows):
+            if row is not None and row.get('document_id') == document_id:
+                self.rows[chunk_id] = None
+                removed.add(chunk_id)
+        if removed:
+            for entity_id in list(self.postings):
+                chunks = self.postings[entity_id]
+                for chunk_id in removed.intersection(chunks):
+                    del chunks[chunk_id]
+                if not chunks:
+                    del self.postings[entity_id]
+        return len(removed)
+
+    def lookup(self, query: str, k: int) -> List[Dict]:
+        """Chunks mentioning the entities named in a query.
+
+        Ranked by how many of the query's entities a chunk mentions, then
+        by total mentions; each result carries its matched ``entities``.
+        """
+        entities = [entity_id for entity_id in self.tag(query) if entity_id in self.postings]
+        if not entities or k <= 0:
+            return []
+
+        matched: Dict[int, List[str]] = {}
+        mentions: Counter = Counter()
+        for entity_id in entities:
+            for chunk_id, count in self.postings[entity_id].items():
+                matched.setdefault(chunk_id, []).append(entity_id)
+                mentions[chunk_id] += count
+
+        ranked = sorted(matched, key=lambda chunk_id: (len(matched[chunk_id]), mentions[chunk_id]), reverse=True)
+        return [{**self.rows[chunk_id], 'entities': matched[chunk_id]} for chunk_id in ranked[:k]]
+
+
+class EntityIndexCache:
+    """LRU cache of per-conversation entity indexes.
+
+    Also tags chunks at ingest; once stored, chunks of a conversation whose
+    index is loaded are added to it right away.
+    """
+
+    def __init__(self, max_conversations: int = DEFAULT_MAX_CONVERSATIONS):
+        self.max_conversations = max_conversations
+        self.enabled = max_conversations > 0
+        self._lexicon_patterns: Optional[Dict[str, str]] = None
+
+        # key -> index, least recently used first
+        self._indexes: "OrderedDict[Hashable, EntityIndex]" = OrderedDict()
+        # Bumped by every update; loads that saw it change are not cached
+        self._generation = 0
+        self._lock = threading.Lock()
+        self.stats = {
+            'hits': 0,
+            'misses': 0,
+            'chunks_tagged': 0,
+            'lookups': 0,
+            'entity_hits': 0
+        }
+
+    def _new_index(self) -> EntityIndex:
+        if self._lexicon_patterns is None:
+            patterns = {}
+            for entity_id, surface_forms in load_lexicon().items():
+                for surface_form in surface_forms:
+                    patterns.setdefault(surface_form.lower(), entity_id)
+            self._lexicon_patterns = patterns
+        return EntityIndex(self._lexicon_patterns)
+
+    async def get_or_load(self, key: Hashable,
+                          load_rows: Callable[[], Awaitable[List[Dict]]]) -> Optional[EntityIndex]:
+        """Return the index for ``key``, building it from ``load_rows()`` the first time.
+
+        Rows whose metadata already carries ``entities`` tags from ingest are
+        not scanned again.
+        """
+        if not self.enabled:
+            return None
+
+        with self._lock:
+            index = self._indexes.get(key)
+            if index is not None:
+                self._indexes.move_to_end(key)
+                self.stats['hits'] += 1
+                return index
+            generation = self._generation
+        self.stats['misses'] += 1
+
+        try:
+            rows = await load_rows()
+            with self._lock:
+                index = self._new_index()
+            index.learn_terms(row.get('content') or '' for row in rows)
+            tags = []
+            for row in rows:
+                stored = (row.get('metadata') or {}).get('entities')
+                tags.append(stored if isinstance(stored, dict) else index.tag(row.get('content') or ''))
+            index.add(rows, tags)
+        except Exception as e:
+            logger.warning(f"Could not build entity index: {e}")
+            return None
+
+        with self._lock:
+            if self._generation == generation:
+                self._indexes[key] = index
+                while len(self._indexes) > self.max_conversations:
+                    self._indexes.popitem(last=False)
+        return index
+
+    def tag_chunks(self, key: Hashable, rows: Sequence[Dict]) -> List[Dict[str, int]]:
+        """Entity id -> mentions for each newly ingested chunk.
+
+        Uses the conversation's loaded index (learning the chunks' terms),
+        or the lexicon plus the chunks' own terms when none is loaded.
+        """
+        with self._lock:
+            index = self._indexes.get(key) or self._new_index()
+            index.learn_terms(row.get('content') or '' for row in rows)
+            tags = [index.tag(row.get('content') or '') for row in rows]
+            self.stats['chunks_tagged'] += len(rows)
+        return tags
+
+    def add(self, key: Hashable, rows: Sequence[Dict], tags: Sequence[Dict[str, int]]):
+        """Add stored, tagged chunks to the conversation's index, if it is loaded."""
+        with self._lock:
+            self._generation += 1
+            index = self._indexes.get(key)
+            if index is not None:
+                index.add(rows, tags)
+
+    def lookup(self, index: EntityIndex, query: str, k: int) -> List[Dict]:
+        """Chunks mentioning the entities named in a query."""
+        with self._lock:
+            results = index.lookup(query, k)
+        self.stats['lookups'] += 1
+        if results:
+            self.stats['entity_hits'] += 1
+        return results
+
+    def invalidate(self, key: Hashable):
+        """Drop the index for ``key``, e.g. after the conversation was deleted."""
+        with self._lock:
+            self._generation += 1
+            self._indexes.pop(key, None)
+
+    def remove_document(self, document_id: str):
+        """Remove a deleted document's chunks from every loaded index."""
+        with self._lock:
+            self._generation += 1
+            for index in self._indexes.values():
+                index.remove_document(document_id)
+
+    def get_stats(self) -> Dict:
+        """Get entity index statistics."""
+        stats = self.stats.copy()
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        stats['enabled'] = self.enabled
+        with self._lock:
+            stats['indexes'] = len(self._indexes)
+            stats['mined_terms'] = sum(len(index.mined_terms) for index in self._indexes.values())
+            stats['lexicon_terms'] = len(self._lexicon_patterns or {})
+        return stats
+
+
+# Global entity index cache
+entity_index_cache = EntityIndexCache()
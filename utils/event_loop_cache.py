@@ -0,0 +1,110 @@
+"""
+Event Loop Cache for PharmGPT
+Per-event-loop objects (Supabase clients and pools) that are closed and dropped once their loop is gone
+"""
+
+import asyncio
+import logging
+import threading
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Sub-clients of a supabase AsyncClient that own an HTTP session
+SUPABASE_SESSION_ATTRIBUTES = ('_postgrest', '_storage', '_functions')
+
+
+async def aclose_client(client: Any):
+    """Close the HTTP sessions held by a Supabase (or httpx) async client."""
+    closers = [getattr(client, 'aclose', None)]
+    closers += [getattr(getattr(client, name, None), 'aclose', None) for name in SUPABASE_SESSION_ATTRIBUTES]
+    for closer in closers:
+        if closer is None:
+            continue
+        try:
+            await closer()
+        except Exception as e:
+            logger.debug(f"Error closing client session: {e}")
+
+
+class EventLoopCache:
+    """Thread-safe map from the running event loop to a loop-bound object.
+
+    Streamlit runs every rerun in a new script thread whose ``run_async``
+    helper creates a fresh loop and never closes it, so entries are dropped
+    when their loop is closed or the thread that stored them has exited.
+    Weak keys would not help: the cached clients' transports reference the
+    loop, keeping it alive.
+
+    ``aclose(value)``, when given, is awaited for every dropped value so its
+    HTTP sessions are closed rather than left to the garbage collector. It
+    runs on the value's own loop from a short-lived thread, which then
+    closes the abandoned loop as well.
+    """
+
+    def __init__(self, aclose: Optional[Callable[[Any], Awaitable[None]]] = None):
+        # loop -> (thread that stored the value, value)
+        self._entries: Dict[asyncio.AbstractEventLoop, Tuple[threading.Thread, Any]] = {}
+        self._aclose = aclose
+        self._lock = threading.Lock()
+
+    def _pop_stale(self) -> List[Tuple[asyncio.AbstractEventLoop, Any]]:
+        """Remove entries whose loop or thread is gone; call with the lock held."""
+        stale = [
+            loop for loop, (thread, _) in self._entries.items()
+            if loop.is_closed() or not thread.is_alive()
+        ]
+        return [(loop, self._entries.pop(loop)[1]) for loop in stale]
+
+    def _close_stale(self, stale: List[Tuple[asyncio.AbstractEventLoop, Any]]):
+        """Close dropped values on their own loops without blocking the caller."""
+        if not stale or self._aclose is None:
+            return
+        threading.Thread(target=self._close_values, args=(stale,), name="event-loop-cache-close", daemon=True).start()
+
+    def _close_values(self, stale: List[Tuple[asyncio.AbstractEventLoop, Any]]):
+        for loop, value in stale:
+            try:
+                if loop.is_closed():
+                    # Nothing can run on the value's loop any more; close what can be closed
+                    asyncio.run(self._aclose(value))
+                elif not loop.is_running():
+                    loop.run_until_complete(self._aclose(value))
+                    loop.close()
+            except Exception as e:
+                logger.debug(f"Error closing value of a dropped event loop: {e}")
+
+    def get(self) -> Optional[Any]:
+        """The object stored for the running loop, or None."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            entry = self._entries.get(loop)
+        return entry[1] if entry is not None else None
+
+    def setdefault(self, value: Any) -> Any:
+        """Store ``value`` for the running loop unless one is already stored; returns the stored one."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            entry = self._entries.get(loop)
+            if entry is not None:
+                return entry[1]
+            stale = self._pop_stale()
+            self._entries[loop] = (threading.current_thread(), value)
+        self._close_stale(stale)
+        return value
+
+    def values(self):
+        """Objects of loops that are still usable."""
+        with self._lock:
+            stale = self._pop_stale()
+            values = [value for _, value in self._entries.values()]
+        self._close_stale(stale)
+        return values
+
+    def __len__(self) -> int:
+        with self._lock:
+            stale = self._pop_stale()
+            count = len(self._entries)
+        self._close_stale(stale)
+        return count
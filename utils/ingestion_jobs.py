@@ -0,0 +1,160 @@
+"""
+Ingestion Job Queue for PharmGPT
+Runs document ingestion on a background event loop so the Streamlit script never blocks
+"""
+
+import uuid
+import asyncio
+import logging
+import threading
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_CONCURRENT_JOBS = 2
+
+ACTIVE_STATUSES = ('queued', 'running')
+
+
+class IngestionJobQueue:
+    """In-process queue of ingestion jobs executed on a background event loop.
+
+    Jobs are coroutine functions that receive their job id and return a
+    ``(success, message, document_id)`` tuple. They report progress through
+    ``update_progress`` and can be cancelled from any thread. Job records are
+    plain dicts so the UI can poll them cheaply on every rerun.
+    """
+
+    def __init__(self, max_concurrent_jobs: int = DEFAULT_MAX_CONCURRENT_JOBS):
+        self.max_concurrent_jobs = max_concurrent_jobs
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._futures: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+
+    def _ensure_worker(self) -> asyncio.AbstractEventLoop:
+        """Start the background event loop thread on first use."""
+        with self._lock:
+            if self._loop is None or not self._thread.is_alive():
+                self._loop = asyncio.new_event_loop()
+                self._slots = None
+                self._thread = threading.Thread(
+                    target=self._loop.run_forever, name="ingestion-worker", daemon=True
+                )
+                self._thread.start()
+                logger.info("Ingestion worker started")
+            return self._loop
+
+    def submit(self, job_fn: Callable[[str], Awaitable[tuple]], owner: str,
+               conversation_id: str, filename: str) -> str:
+        """Queue a job and return its id."""
+        job_id = str(uuid.uuid4())
+        job = {
+            'id': job_id,
+            'owner': owner,
+            'conversation_id': conversation_id,
+            'filename': filename,
+            'status': 'queued',
+            'chunks_done': 0,
+            'chunks_total': 0,
+            'message': '',
+            'document_id': None,
+            'created_at': datetime.now().isoformat(),
+            'finished_at': None
+        }
+
+        loop = self._ensure_worker()
+        with self._lock:
+            self._jobs[job_id] = job
+            self._futures[job_id] = asyncio.run_coroutine_threadsafe(self._run(job_id, job_fn), loop)
+
+        logger.info(f"Queued ingestion job {job_id} for {filename}")
+        return job_id
+
+    async def _run(self, job_id: str, job_fn: Callable[[str], Awaitable[tuple]]):
+        """Run a job once a slot is free and record its outcome."""
+        # Created on the worker loop so it binds to the right loop on every Python version
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_concurrent_jobs)
+
+        try:
+            async with self._slots:
+                self._update(job_id, status='running')
+                success, message, document_id = await job_fn(job_id)
+                self._update(
+                    job_id,
+                    status='completed' if success else 'failed',
+                    message=message,
+                    document_id=document_id
+                )
+        except asyncio.CancelledError:
+            self._update(job_id, status='cancelled', message='Cancelled by user')
+            raise
+        except Exception as e:
+            logger.error(f"Ingestion job {job_id} failed: {e}")
+            self._update(job_id, status='failed', message=str(e))
+        finally:
+            self._update(job_id, finished_at=datetime.now().isoformat())
+            with self._lock:
+                self._futures.pop(job_id, None)
+
+    def _update(self, job_id: str, **fields):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                job.update(fields)
+
+    def update_progress(self, job_id: str, chunks_done: int, chunks_total: int):
+        """Record chunks done / total for a job."""
+        self._update(job_id, chunks_done=chunks_done, chunks_total=chunks_total)
+
+    def cancel(self, job_id: str) -> bool:
+        """Cancel a queued or running job."""
+        with self._lock:
+            future = self._futures.get(job_id)
+        if future is None:
+            return False
+
+        # Cancelling the concurrent future cancels the task on the worker loop
+        cancelled = future.cancel()
+        if cancelled:
+            self._update(job_id, status='cancelled', message='Cancelled by user')
+        return cancelled
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Get a snapshot of a job."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def list_jobs(self, owner: str, conversation_id: str = None) -> List[Dict[str, Any]]:
+        """Get snapshots of a user's jobs, newest first."""
+        with self._lock:
+            jobs = [
+                dict(job) for job in self._jobs.values()
+                if job['owner'] == owner
+                and (conversation_id is None or job['conversation_id'] == conversation_id)
+            ]
+        return sorted(jobs, key=lambda job: job['created_at'], reverse=True)
+
+    def clear_finished(self, owner: str, conversation_id: str = None) -> int:
+        """Forget a user's finished jobs."""
+        with self._lock:
+            finished = [
+                job_id for job_id, job in self._jobs.items()
+                if job['owner'] == owner
+                and job['status'] not in ACTIVE_STATUSES
+                and (conversation_id is None or job['conversation_id'] == conversation_id)
+            ]
+            for job_id in finished:
+                del self._jobs[job_id]
+        return len(finished)
+
+
+# Global ingestion job queue
+ingestion_jobs = IngestionJobQueue()
@@ -0,0 +1,169 @@
+"""
+Ingestion Pipeline for PharmGPT
+Streams document text through split, embed and store stages connected by bounded queues
+"""
+
+import time
+import asyncio
+import inspect
+import logging
+from typing import Any, AsyncIterable, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# A segment is a piece of source text (e.g. one PDF page) plus metadata for its chunks
+Segment = Tuple[Dict[str, Any], str]
+
+DEFAULT_EMBED_BATCH_SIZE = 32
+DEFAULT_QUEUE_SIZE = 4
+DEFAULT_EMBED_WORKERS = 2
+
+_DONE = object()
+
+
+class IngestionPipeline:
+    """Concurrent extract -> split -> embed -> store pipeline.
+
+    Each stage runs as its own task and hands work to the next through a
+    bounded queue, so only a few batches are held in memory at any time and
+    the first chunks are stored while later pages are still being extracted.
+
+    ``split_fn`` turns segment text into chunk strings, ``embed_fn`` embeds a
+    list of strings and ``store_fn`` writes a batch of chunk dicts with their
+    embeddings and returns how many rows were stored. ``on_progress`` (sync
+    or async) is called with (chunks_stored, chunks_split, finished) after
+    every write.
+    """
+
+    def __init__(self,
+                 split_fn: Callable[[str], List[str]],
+                 embed_fn: Callable[[List[str]], Awaitable[List[List[float]]]],
+                 store_fn: Callable[[List[Dict], List[List[float]]], Awaitable[int]],
+                 embed_batch_size: int = DEFAULT_EMBED_BATCH_SIZE,
+                 queue_size: int = DEFAULT_QUEUE_SIZE,
+                 embed_workers: int = DEFAULT_EMBED_WORKERS,
+                 on_progress: Optional[Callable[[int, int, bool], Any]] = None):
+        self.split_fn = split_fn
+        self.embed_fn = embed_fn
+        self.store_fn = store_fn
+        self.embed_batch_size = embed_batch_size
+        self.queue_size = queue_size
+        self.embed_workers = max(1, embed_workers)
+        self.on_progress = on_progress
+
+    async def run(self, segments: Union[Iterable[Segment], AsyncIterable[Segment]]) -> Dict[str, Any]:
+        """Run the pipeline over segments and return ingestion totals."""
+        segment_queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        embed_queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        store_queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+
+        totals = {
+            'segments': 0,
+            'chunks_split': 0,
+            'chunks_stored': 0,
+            'first_chunk_stored_after': None,
+            'elapsed': 0.0
+        }
+        started = time.perf_counter()
+
+        async def extract():
+            if hasattr(segments, '__aiter__'):
+                async for segment in segments:
+                    await segment_queue.put(segment)
+                    totals['segments'] += 1
+            else:
+                # Extraction is blocking (PDF parsing), so pull segments off the loop
+                loop = asyncio.get_running_loop()
+                iterator = iter(segments)
+                while True:
+                    segment = await loop.run_in_executor(None, next, iterator, _DONE)
+                    if segment is _DONE:
+                        break
+                    await segment_queue.put(segment)
+                    totals['segments'] += 1
+            await segment_queue.put(_DONE)
+
+        def split_segment(text: str) -> List[str]:
+            return list(self.split_fn(text))
+
+        async def split():
+            # Splitting (and token counting) is CPU-bound, so it runs off the loop like extraction
+            loop = asyncio.get_running_loop()
+            batch: List[Dict] = []
+            while True:
+                segment = await segment_queue.get()
+                if segment is _DONE:
+                    break
+
+                metadata, text = segment
+                for content in await loop.run_in_executor(None, split_segment, text):
+                    if not content.strip():
+                        continue
+                    batch.append({
+                        'chunk_index': totals['chunks_split'],
+                        'content': content,
+                        'metadata': dict(metadata)
+                    })
+                    totals['chunks_split'] += 1
+
+                    if len(batch) >= self.embed_batch_size:
+                        await embed_queue.put(batch)
+                        batch = []
+
+            if batch:
+                await embed_queue.put(batch)
+            for _ in range(self.embed_workers):
+                await embed_queue.put(_DONE)
+
+        async def embed():
+            while True:
+                batch = await embed_queue.get()
+                if batch is _DONE:
+                    break
+                embeddings = await self.embed_fn([chunk['content'] for chunk in batch])
+                await store_queue.put((batch, embeddings))
+            await store_queue.put(_DONE)
+
+        async def store():
+            finished_workers = 0
+            while finished_workers < self.embed_workers:
+                item = await store_queue.get()
+                if item is _DONE:
+                    finished_workers += 1
+                    continue
+
+                batch, embeddings = item
+                totals['chunks_stored'] += await self.store_fn(batch, embeddings)
+                if totals['first_chunk_stored_after'] is None and totals['chunks_stored']:
+                    totals['first_chunk_stored_after'] = time.perf_counter() - started
+                await self._report_progress(totals['chunks_stored'], totals['chunks_split'], False)
+
+        tasks = [asyncio.ensure_future(stage) for stage in
+                 [extract(), split(), store()] + [embed() for _ in range(self.embed_workers)]]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+
+        totals['elapsed'] = time.perf_counter() - started
+        await self._report_progress(totals['chunks_stored'], totals['chunks_split'], True)
+        logger.info(
+            f"Ingested {totals['chunks_stored']}/{totals['chunks_split']} chunks from "
+            f"{totals['segments']} segments in {totals['elapsed']:.2f}s"
+        )
+        return totals
+
+    async def _report_progress(self, stored: int, split: int, finished: bool):
+        """Call the (sync or async) progress callback, never letting it break ingestion."""
+        if not self.on_progress:
+            return
+        try:
+            result = self.on_progress(stored, split, finished)
+            if inspect.isawaitable(result):
+                await result
+        except Exception as e:
+            logger.warning(f"Ingestion progress callback failed: {e}")
@@ -0,0 +1,173 @@
+"""
+OCR Cache for PharmGPT
+Persistent cache of OCR results keyed by image content and OCR configuration
+"""
+
+import os
+import json
+import hashlib
+import logging
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = os.getenv(
+    "PHARMGPT_OCR_CACHE_DIR",
+    os.path.join(tempfile.gettempdir(), "pharmgpt_ocr_cache")
+)
+DEFAULT_MAX_ENTRIES = int(os.getenv("PHARMGPT_OCR_CACHE_MAX_ENTRIES", "5000"))
+DEFAULT_MAX_BYTES = int(os.getenv("PHARMGPT_OCR_CACHE_MAX_MB", "50")) * 1024 * 1024
+
+
+def make_ocr_cache_key(image_bytes: bytes, config: str) -> str:
+    """Hash of the image bytes plus the OCR configuration that produced the text."""
+    digest = hashlib.sha256()
+    digest.update(config.encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(image_bytes)
+    return digest.hexdigest()
+
+
+class OCRCache:
+    """On-disk cache of OCR text, one file per entry plus a JSON LRU index.
+
+    The cache is bounded both by entry count and by total text size and
+    evicts the least recently used entries first. Identical images uploaded
+    again, by any user, are served without running Tesseract. Lookups only
+    update the in-memory LRU order; the index is written by ``put``.
+    """
+
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR,
+                 max_entries: int = DEFAULT_MAX_ENTRIES,
+                 max_bytes: int = DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.enabled = max_entries > 0 and max_bytes > 0
+        self.index_path = os.path.join(cache_dir, "index.json")
+
+        # key -> size in bytes, least recently used first
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._total_bytes = 0
+        self._loaded = False
+        self._lock = threading.Lock()
+        self.stats = {
+            'hits': 0,
+            'misses': 0,
+            'writes': 0,
+            'evictions': 0
+        }
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.txt")
+
+    def _load(self):
+        """Load the index on first use, dropping entries whose files are gone."""
+        if self._loaded:
+            return
+        self._loaded = True
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+        if not os.path.exists(self.index_path):
+            return
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                entries = json.load(f)
+            self._entries = OrderedDict(
+                (key, int(size)) for key, size in entries if os.path.exists(self._entry_path(key))
+            )
+            self._total_bytes = sum(self._entries.values())
+            logger.info(f"Loaded OCR cache with {len(self._entries)} entries from {self.cache_dir}")
+        except Exception as e:
+            logger.warning(f"Discarding unreadable OCR cache index in {self.cache_dir}: {e}")
+            self._entries = OrderedDict()
+            self._total_bytes = 0
+
+    def _flush(self):
+        """Persist the index (atomically replaced)."""
+        tmp_path = f"{self.index_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(list(self._entries.items()), f)
+        os.replace(tmp_path, self.index_path)
+
+    def _evict(self):
+        """Drop least recently used entries until both limits are met."""
+        while self._entries and (len(self._entries) > self.max_entries
+                                 or self._total_bytes > self.max_bytes):
+            key, size = self._entries.popitem(last=False)
+            self._total_bytes -= size
+            self.stats['evictions'] += 1
+            try:
+                os.remove(self._entry_path(key))
+            except OSError:
+                pass
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached OCR text or None."""
+        if not self.enabled:
+            self.stats['misses'] += 1
+            return None
+
+        try:
+            with self._lock:
+                self._load()
+                if key not in self._entries:
+                    self.stats['misses'] += 1
+                    return None
+                with open(self._entry_path(key), "r", encoding="utf-8") as f:
+                    text = f.read()
+                # Recency is kept in memory and persisted with the next write
+                self._entries.move_to_end(key)
+        except Exception as e:
+            logger.warning(f"OCR cache lookup failed: {e}")
+            self.stats['misses'] += 1
+            return None
+
+        self.stats['hits'] += 1
+        return text
+
+    def put(self, key: str, text: str):
+        """Store OCR text, evicting the least recently used entries when full."""
+        if not self.enabled:
+            return
+
+        data = text.encode("utf-8")
+        if len(data) > self.max_bytes:
+            return
+
+        try:
+            with self._lock:
+                self._load()
+                tmp_path = f"{self._entry_path(key)}.tmp"
+                with open(tmp_path, "wb") as f:
+                    f.write(data)
+                os.replace(tmp_path, self._entry_path(key))
+
+                self._total_bytes += len(data) - self._entries.pop(key, 0)
+                self._entries[key] = len(data)
+                self.stats['writes'] += 1
+                self._evict()
+                self._flush()
+        except Exception as e:
+            logger.warning(f"OCR cache write failed: {e}")
+
+    def get_stats(self) -> Dict:
+        """Get cache statistics including hit rate."""
+        stats = self.stats.copy()
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        stats['enabled'] = self.enabled
+        with self._lock:
+            if self.enabled:
+                self._load()
+            stats['entries'] = len(self._entries)
+            stats['bytes'] = self._total_bytes
+        return stats
+
+
+# Global OCR cache instance
+ocr_cache = OCRCache()
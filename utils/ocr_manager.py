@@ -4,26 +4,181 @@ Handles text extraction from images using Tesseract OCR
 Optimized for Streamlit Cloud deployment
 """
 
-import logging
-import tempfile
+import io
 import os
-from PIL import Image, ImageEnhance, ImageFilter
+import json
+import time
+import logging
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+from PIL import Image, ImageEnhance, ImageFilter, ImageOps
+
+from utils.ocr_cache import ocr_cache, make_ocr_cache_key
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
+try:
+    from pdf2image import convert_from_bytes
+    PDF2IMAGE_AVAILABLE = True
+except ImportError:
+    PDF2IMAGE_AVAILABLE = False
+
+# Scanned PDF OCR limits
+PDF_OCR_MAX_WORKERS = min(2, os.cpu_count() or 1)
+PDF_OCR_DPI = 200
+PDF_OCR_PAGE_TIMEOUT_SECONDS = 30
+PDF_OCR_CPU_BUDGET_SECONDS = 300
+
+
+# OCR strategy defaults: page segmentation modes in order of preference, the
+# mean word confidence that accepts the first mode's result, and normalisation
+OCR_PSM_MODES = (6, 3)
+OCR_CONFIDENCE_THRESHOLD = 80.0
+OCR_TARGET_DPI = 300
+OCR_ASSUMED_SOURCE_DPI = 96  # Screenshots rarely carry DPI metadata
+OCR_MAX_SIDE_PIXELS = 3000
+
+
+def _otsu_threshold(image: Image.Image) -> int:
+    """Otsu threshold of a grayscale image from its histogram."""
+    histogram = image.histogram()
+    total = sum(histogram)
+    sum_all = sum(i * count for i, count in enumerate(histogram))
+    
+    sum_background = 0.0
+    weight_background = 0
+    best_threshold, best_variance = 127, 0.0
+    for i, count in enumerate(histogram):
+        weight_background += count
+        if weight_background == 0:
+            continue
+        weight_foreground = total - weight_background
+        if weight_foreground == 0:
+            break
+        sum_background += i * count
+        mean_background = sum_background / weight_background
+        mean_foreground = (sum_all - sum_background) / weight_foreground
+        variance = weight_background * weight_foreground * (mean_background - mean_foreground) ** 2
+        if variance > best_variance:
+            best_threshold, best_variance = i, variance
+    return best_threshold
+
+
+def normalize_image(image: Image.Image, target_dpi: int = OCR_TARGET_DPI,
+                    binarize: bool = True) -> Image.Image:
+    """Prepare an image for OCR: downscale to the target DPI, grayscale and binarise.
+    
+    Images are only ever scaled down; Tesseract gains nothing from pixels
+    beyond ~300 DPI but its run time grows with image area.
+    """
+    source_dpi = image.info.get('dpi', (OCR_ASSUMED_SOURCE_DPI,))[0] or OCR_ASSUMED_SOURCE_DPI
+    scale = min(1.0, target_dpi / float(source_dpi), OCR_MAX_SIDE_PIXELS / float(max(image.size)))
+    size = (max(1, int(image.width * scale)), max(1, int(image.height * scale)))
+    if scale < 1.0:
+        # JPEGs can decode straight to a reduced, grayscale image
+        image.draft('L', size)
+    
+    image = image.convert('L')  # Grayscale
+    if scale < 1.0 and image.size != size:
+        image = image.resize(size, Image.LANCZOS)
+    image = ImageOps.autocontrast(image)  # Full contrast range
+    if binarize:
+        threshold = _otsu_threshold(image)
+        image = image.point(lambda p: 255 if p > threshold else 0)
+    return image
+
+
+def _text_and_confidence(data: Dict[str, list]) -> Tuple[str, float]:
+    """Rebuild text and mean word confidence from pytesseract ``image_to_data`` output."""
+    lines: Dict[tuple, List[str]] = {}
+    confidences = []
+    for i, word in enumerate(data['text']):
+        confidence = float(data['conf'][i])
+        if confidence < 0 or not word.strip():
+            continue
+        line_key = (data['block_num'][i], data['par_num'][i], data['line_num'][i])
+        lines.setdefault(line_key, []).append(word)
+        confidences.append(confidence)
+    
+    text = "\n".join(" ".join(words) for words in lines.values())
+    return text, sum(confidences) / len(confidences) if confidences else 0.0
+
+
+def _cpu_seconds() -> float:
+    """CPU time of this process and its finished children (tesseract, pdftoppm)."""
+    times = os.times()
+    return times.user + times.system + times.children_user + times.children_system
+
+
+# PDF bytes of the current OCR worker process (see PDFPageOCR)
+_ocr_worker_pdf: Optional[bytes] = None
+
+
+def _init_pdf_ocr_worker(file_content: bytes):
+    """Receive the PDF once per OCR worker process."""
+    global _ocr_worker_pdf
+    _ocr_worker_pdf = file_content
+
+
+def _rasterise_pdf_page(file_content: bytes, page_number: int, dpi: int) -> List[Image.Image]:
+    """Render a PDF page to images, falling back to the page's embedded images."""
+    if PDF2IMAGE_AVAILABLE:
+        try:
+            return convert_from_bytes(file_content, dpi=dpi, first_page=page_number, last_page=page_number)
+        except Exception as e:
+            # pdf2image needs poppler's pdftoppm on the PATH
+            logger.debug(f"Could not rasterise page {page_number}: {e}")
+    
+    # Scanned pages are usually one embedded full-page image
+    import PyPDF2
+    page = PyPDF2.PdfReader(io.BytesIO(file_content)).pages[page_number - 1]
+    return [Image.open(io.BytesIO(image_file.data)) for image_file in page.images]
+
+
+def _ocr_pdf_page(page_number: int, dpi: int, timeout: int) -> Tuple[str, float]:
+    """OCR one page of the worker's PDF; returns (text, CPU seconds used)."""
+    import pytesseract
+    
+    started = _cpu_seconds()
+    texts = []
+    for image in _rasterise_pdf_page(_ocr_worker_pdf, page_number, dpi):
+        try:
+            texts.append(pytesseract.image_to_string(
+                normalize_image(image, target_dpi=dpi), config='--psm 3', timeout=timeout
+            ))
+        except RuntimeError as e:
+            # pytesseract kills tesseract and raises RuntimeError on timeout
+            logger.warning(f"OCR of page {page_number} stopped: {e}")
+    return "\n".join(texts), _cpu_seconds() - started
+
 class OCRManager:
     """Manages OCR operations using Tesseract (pre-installed on Streamlit Cloud)."""
     
-    def __init__(self):
+    def __init__(self,
+                 psm_modes: Sequence[int] = OCR_PSM_MODES,
+                 confidence_threshold: float = OCR_CONFIDENCE_THRESHOLD,
+                 target_dpi: int = OCR_TARGET_DPI,
+                 binarize: bool = True):
+        self.psm_modes = tuple(psm_modes)
+        self.confidence_threshold = confidence_threshold
+        self.target_dpi = target_dpi
+        self.binarize = binarize
+        self.tesseract_version = None
         self.tesseract_available = self._check_tesseract()
+        self.stats = {
+            'images': 0,
+            'early_exits': 0,
+            'fallback_runs': 0
+        }
     
     def _check_tesseract(self) -> bool:
         """Check if Tesseract OCR is available."""
         try:
             import pytesseract
             # Try to get version to verify it's working
-            pytesseract.get_tesseract_version()
+            self.tesseract_version = str(pytesseract.get_tesseract_version())
             logger.info("✅ Tesseract OCR available")
             return True
         except ImportError:
@@ -35,11 +190,15 @@ class OCRManager:
     
     def extract_text_from_image(self, image_path: str, image_info: str = "") -> str:
         """Extract text from image using Tesseract OCR."""
+        return self._extract_and_format(lambda: self._extract_with_tesseract(image_path), image_info)
+    
+    def _extract_and_format(self, extract: Callable[[], str], image_info: str) -> str:
+        """Run an OCR extraction and format its result for the chat context."""
         if not self.tesseract_available:
             return f"{image_info}OCR not available. Tesseract OCR is not installed or not in the system's PATH. Please install it to enable OCR functionality."
         
         try:
-            text = self._extract_with_tesseract(image_path)
+            text = extract()
             
             if text and text.strip():
                 logger.info(f"✅ Text extracted: {len(text)} characters")
@@ -51,60 +210,83 @@ class OCRManager:
             logger.error(f"OCR extraction failed: {e}")
             return f"{image_info}❌ Text extraction failed: {str(e)}"
     
+    @property
+    def cache_signature(self) -> str:
+        """Everything besides the image that determines OCR output."""
+        return json.dumps({
+            'tesseract': self.tesseract_version,
+            'psm_modes': list(self.psm_modes),
+            'confidence_threshold': self.confidence_threshold,
+            'target_dpi': self.target_dpi,
+            'binarize': self.binarize
+        }, sort_keys=True)
+    
+    def _extract_cached(self, file_content: bytes, image: Image.Image) -> str:
+        """OCR an image, reusing the result for identical image bytes and settings."""
+        key = make_ocr_cache_key(file_content, self.cache_signature)
+        text = ocr_cache.get(key)
+        if text is None:
+            text = self._ocr_image(image)
+            ocr_cache.put(key, text)
+        return text
+    
     def _extract_with_tesseract(self, image_path: str) -> str:
         """Extract text using Tesseract OCR with optimized settings."""
+        return self._ocr_image(Image.open(image_path))
+    
+    def _run_psm(self, image: Image.Image, psm: int) -> Tuple[str, float]:
+        """OCR with one page segmentation mode; returns (text, mean confidence)."""
         import pytesseract
-        from PIL import Image, ImageEnhance, ImageFilter
         
-        # Open and process image
-        image = Image.open(image_path)
+        data = pytesseract.image_to_data(
+            image, config=f'--psm {psm}', output_type=pytesseract.Output.DICT
+        )
+        return _text_and_confidence(data)
+    
+    def _ocr_image(self, image: Image.Image) -> str:
+        """OCR an image with the configured strategy.
+        
+        The first PSM runs alone and is accepted when its confidence reaches
+        the threshold; only low-confidence images pay for the alternative
+        modes, which then run in parallel (each is a separate tesseract process).
+        """
+        image = normalize_image(image, self.target_dpi, self.binarize)
+        self.stats['images'] += 1
         
-        # Preprocessing
-        image = image.convert('L')  # Grayscale
-        image = ImageEnhance.Contrast(image).enhance(2) # Increase contrast
-
-        # Try different OCR configurations for better results
-        configs = [
-            '--psm 6',  # Uniform block of text
-            '--psm 3',  # Fully automatic page segmentation (default)
-        ]
+        best_text, best_confidence = "", -1.0
+        try:
+            best_text, best_confidence = self._run_psm(image, self.psm_modes[0])
+        except Exception as e:
+            logger.debug(f"PSM {self.psm_modes[0]} failed: {e}")
         
-        best_text = ""
-        max_length = 0
+        if best_confidence >= self.confidence_threshold or len(self.psm_modes) == 1:
+            self.stats['early_exits'] += 1
+            return best_text
         
-        for config in configs:
-            try:
-                text = pytesseract.image_to_string(image, config=config)
-                if text and len(text.strip()) > max_length:
-                    best_text = text
-                    max_length = len(text.strip())
-            except Exception as e:
-                logger.debug(f"Config {config} failed: {e}")
-                continue
+        self.stats['fallback_runs'] += 1
+        alternatives = self.psm_modes[1:]
+        with ThreadPoolExecutor(max_workers=len(alternatives)) as executor:
+            futures = {psm: executor.submit(self._run_psm, image, psm) for psm in alternatives}
+            for psm, future in futures.items():
+                try:
+                    text, confidence = future.result()
+                except Exception as e:
+                    logger.debug(f"PSM {psm} failed: {e}")
+                    continue
+                if confidence > best_confidence:
+                    best_text, best_confidence = text, confidence
         
         return best_text
     
     def process_image_file(self, uploaded_file, file_content: bytes) -> str:
         """Process an uploaded image file and extract text."""
         try:
-            # Create temporary file
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.png') as tmp_file:
-                tmp_file.write(file_content)
-                tmp_path = tmp_file.name
+            # Decode from memory; Image.open only parses the header until pixels are needed
+            image = Image.open(io.BytesIO(file_content))
+            image_info = f"Image: {uploaded_file.name}\nSize: {image.size[0]}x{image.size[1]} pixels\nFormat: {image.format}\n\n"
             
-            try:
-                # Open and get image info
-                image = Image.open(tmp_path)
-                image_info = f"Image: {uploaded_file.name}\nSize: {image.size[0]}x{image.size[1]} pixels\nFormat: {image.format}\n\n"
-                
-                # Extract text using OCR
-                result = self.extract_text_from_image(tmp_path, image_info)
-                
-                return result
-                
-            finally:
-                # Clean up temporary file
-                os.unlink(tmp_path)
+            # Extract text using OCR
+            return self._extract_and_format(lambda: self._extract_cached(file_content, image), image_info)
                 
         except Exception as e:
             logger.error(f"Image processing failed: {e}")
@@ -116,8 +298,118 @@ class OCRManager:
             'tesseract_available': self.tesseract_available,
             'ocr_working': self.tesseract_available,
             'engine': 'tesseract',
-            'note': 'Only text content will be extracted from images for processing'
+            'note': 'Only text content will be extracted from images for processing',
+            'strategy': {
+                'psm_modes': list(self.psm_modes),
+                'confidence_threshold': self.confidence_threshold,
+                'target_dpi': self.target_dpi,
+                'binarize': self.binarize
+            },
+            'stats': self.stats.copy(),
+            'cache': ocr_cache.get_stats()
+        }
+
+class PDFPageOCR:
+    """OCR of image-only PDF pages in a process pool of tesseract workers.
+    
+    Pages are requested in reading order and collected in the same order.
+    At most ``max_workers`` pages are in flight, each page is bounded by
+    ``page_timeout`` and no new pages are started once the OCR work for the
+    document has used up ``cpu_budget`` CPU seconds.
+    """
+    
+    def __init__(self, file_content: bytes,
+                 max_workers: int = PDF_OCR_MAX_WORKERS,
+                 page_timeout: int = PDF_OCR_PAGE_TIMEOUT_SECONDS,
+                 cpu_budget: float = PDF_OCR_CPU_BUDGET_SECONDS,
+                 dpi: int = PDF_OCR_DPI):
+        self.max_workers = max(1, max_workers)
+        self.page_timeout = page_timeout
+        self.cpu_budget = cpu_budget
+        self.dpi = dpi
+        
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.max_workers, initializer=_init_pdf_ocr_worker, initargs=(file_content,)
+        )
+        self._queued: deque = deque()
+        self._futures: Dict[int, object] = {}
+        self._submitted_at: Dict[int, float] = {}
+        self.stats = {
+            'pages_ocred': 0,
+            'pages_timed_out': 0,
+            'pages_skipped': 0,
+            'cpu_seconds': 0.0
         }
+    
+    @property
+    def budget_exhausted(self) -> bool:
+        return self.stats['cpu_seconds'] >= self.cpu_budget
+    
+    def _fill(self):
+        """Start queued pages while workers and budget are available."""
+        while self._queued and len(self._futures) < self.max_workers and not self.budget_exhausted:
+            page_number = self._queued.popleft()
+            self._futures[page_number] = self._executor.submit(
+                _ocr_pdf_page, page_number, self.dpi, self.page_timeout
+            )
+            self._submitted_at[page_number] = time.monotonic()
+    
+    def request(self, page_number: int):
+        """Queue a page for OCR."""
+        self._queued.append(page_number)
+        self._fill()
+    
+    def is_done(self, page_number: int) -> bool:
+        """Whether a requested page's result can be collected without waiting."""
+        future = self._futures.get(page_number)
+        if future is None:
+            return self.budget_exhausted
+        return future.done()
+    
+    def result(self, page_number: int) -> str:
+        """Wait for a page's OCR text ('' if skipped, timed out or failed)."""
+        if page_number not in self._futures and page_number in self._queued:
+            # Still queued, so it only runs if the budget allows
+            self._queued.remove(page_number)
+            self._queued.appendleft(page_number)
+            self._fill()
+        
+        future = self._futures.pop(page_number, None)
+        if future is None:
+            self.stats['pages_skipped'] += 1
+            logger.warning(f"OCR budget exhausted, skipping page {page_number}")
+            return ""
+        
+        # Generous margin over tesseract's own timeout for rasterising and startup
+        deadline = self._submitted_at.pop(page_number) + self.page_timeout * 2
+        text = ""
+        try:
+            text, cpu_used = future.result(timeout=max(0.0, deadline - time.monotonic()))
+            self.stats['cpu_seconds'] += cpu_used
+            self.stats['pages_ocred'] += 1
+        except FutureTimeoutError:
+            future.cancel()
+            self.stats['pages_timed_out'] += 1
+            self.stats['cpu_seconds'] += self.page_timeout
+            logger.warning(f"OCR of page {page_number} timed out")
+        except Exception as e:
+            logger.warning(f"OCR of page {page_number} failed: {e}")
+        
+        self._fill()
+        return text
+    
+    def close(self):
+        """Stop the worker pool, dropping pages that have not started."""
+        self._queued.clear()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        logger.info(f"PDF OCR finished: {self.stats}")
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
+
 
 # Global OCR manager instance
 ocr_manager = OCRManager()
@@ -130,6 +422,13 @@ def process_image_file(uploaded_file, file_content: bytes) -> str:
     """Process uploaded image file and extract text."""
     return ocr_manager.process_image_file(uploaded_file, file_content)
 
+def create_pdf_page_ocr(file_content) -> Optional[PDFPageOCR]:
+    """Create a page OCR pool for a PDF, or None when Tesseract is unavailable."""
+    if not ocr_manager.tesseract_available:
+        return None
+    # Workers need their own copy; bytes(...) is free when it already is bytes
+    return PDFPageOCR(bytes(file_content))
+
 def get_ocr_status() -> dict:
     """Get OCR engine availability status."""
     return ocr_manager.get_ocr_status()
\ No newline at end of file
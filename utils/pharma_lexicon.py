@@ -0,0 +1,245 @@
+"""
+Pharmacology Lexicon for PharmGPT
+Drug, drug class and enzyme/transporter entities with their synonyms for exact entity matching
+"""
+
+import os
+import json
+import logging
+from typing import Dict, List
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Optional JSON file of extra entities: {"entity_id": ["synonym", ...], ...}
+LEXICON_PATH = os.getenv("PHARMGPT_PHARMA_LEXICON")
+
+# Drugs by generic name, with common alternative names and brands
+DRUGS: Dict[str, List[str]] = {
+    'acetaminophen': ['paracetamol', 'tylenol'],
+    'acetylsalicylic acid': ['aspirin'],
+    'acyclovir': ['aciclovir'],
+    'adalimumab': ['humira'],
+    'adrenaline': ['epinephrine'],
+    'albuterol': ['salbutamol', 'ventolin'],
+    'allopurinol': [],
+    'alprazolam': ['xanax'],
+    'amiodarone': [],
+    'amitriptyline': [],
+    'amlodipine': ['norvasc'],
+    'amoxicillin': [],
+    'ampicillin': [],
+    'apixaban': ['eliquis'],
+    'aripiprazole': [],
+    'atenolol': [],
+    'atorvastatin': ['lipitor'],
+    'azithromycin': [],
+    'baclofen': [],
+    'bisoprolol': [],
+    'budesonide': [],
+    'bupropion': [],
+    'buprenorphine': [],
+    'captopril': [],
+    'carbamazepine': ['tegretol'],
+    'carvedilol': [],
+    'cefalexin': ['cephalexin'],
+    'ceftriaxone': [],
+    'cetirizine': [],
+    'ciclosporin': ['cyclosporine', 'ciclosporine'],
+    'ciprofloxacin': [],
+    'citalopram': [],
+    'clarithromycin': [],
+    'clindamycin': [],
+    'clonazepam': [],
+    'clonidine': [],
+    'clopidogrel': ['plavix'],
+    'clozapine': [],
+    'codeine': [],
+    'colchicine': [],
+    'dabigatran': ['pradaxa'],
+    'dexamethasone': [],
+    'diazepam': ['valium'],
+    'diclofenac': [],
+    'digoxin': [],
+    'diltiazem': [],
+    'diphenhydramine': [],
+    'doxycycline': [],
+    'duloxetine': [],
+    'enalapril': [],
+    'enoxaparin': ['lovenox'],
+    'erythromycin': [],
+    'escitalopram': [],
+    'esomeprazole': ['nexium'],
+    'ethinylestradiol': ['ethinyl estradiol'],
+    'fentanyl': [],
+    'fluconazole': [],
+    'fluoxetine': ['prozac'],
+    'furosemide': ['frusemide', 'lasix'],
+    'gabapentin': [],
+    'gentamicin': [],
+    'glibenclamide': ['glyburide'],
+    'gliclazide': [],
+    'glipizide': [],
+    'haloperidol': [],
+    'heparin': [],
+    'hydrochlorothiazide': ['hctz'],
+    'hydrocortisone': [],
+    'hydroxychloroquine': [],
+    'ibuprofen': ['advil', 'nurofen'],
+    'imatinib': [],
+    'indomethacin': ['indometacin'],
+    'insulin': [],
+    'isoniazid': [],
+    'itraconazole': [],
+    'ketoconazole': [],
+    'lamotrigine': [],
+    'lansoprazole': [],
+    'levetiracetam': [],
+    'levofloxacin': [],
+    'levothyroxine': ['thyroxine'],
+    'lisinopril': [],
+    'lithium': [],
+    'loratadine': [],
+    'lorazepam': [],
+    'losartan': [],
+    'metformin': ['glucophage'],
+    'methadone': [],
+    'methotrexate': [],
+    'metoclopramide': [],
+    'metoprolol': [],
+    'metronidazole': [],
+    'midazolam': [],
+    'mirtazapine': [],
+    'montelukast': [],
+    'morphine': [],
+    'naloxone': [],
+    'naproxen': [],
+    'nifedipine': [],
+    'nitroglycerin': ['glyceryl trinitrate', 'gtn'],
+    'olanzapine': [],
+    'omeprazole': [],
+    'ondansetron': [],
+    'oxycodone': [],
+    'pantoprazole': [],
+    'paroxetine': [],
+    'penicillin': [],
+    'phenobarbital': ['phenobarbitone'],
+    'phenytoin': [],
+    'pioglitazone': [],
+    'prednisolone': [],
+    'prednisone': [],
+    'pregabalin': [],
+    'propranolol': [],
+    'quetiapine': [],
+    'ramipril': [],
+    'ranitidine': [],
+    'rifampicin': ['rifampin'],
+    'risperidone': [],
+    'ritonavir': [],
+    'rivaroxaban': ['xarelto'],
+    'rosuvastatin': ['crestor'],
+    'sertraline': ['zoloft'],
+    'sildenafil': ['viagra'],
+    'simvastatin': ['zocor'],
+    'sitagliptin': [],
+    'sotalol': [],
+    'spironolactone': [],
+    'sumatriptan': [],
+    'tacrolimus': [],
+    'tamoxifen': [],
+    'tamsulosin': [],
+    'theophylline': [],
+    'tramadol': [],
+    'trimethoprim': [],
+    'valproate': ['valproic acid', 'sodium valproate'],
+    'vancomycin': [],
+    'venlafaxine': [],
+    'verapamil': [],
+    'voriconazole': [],
+    'warfarin': ['coumadin'],
+    'zolpidem': []
+}
+
+# Drug classes, with singular/plural and abbreviation variants
+DRUG_CLASSES: Dict[str, List[str]] = {
+    'ace inhibitor': ['ace inhibitors', 'angiotensin-converting enzyme inhibitor', 'angiotensin-converting enzyme inhibitors'],
+    'aminoglycoside': ['aminoglycosides'],
+    'angiotensin receptor blocker': ['angiotensin receptor blockers', 'arb', 'arbs'],
+    'anticoagulant': ['anticoagulants'],
+    'antiplatelet': ['antiplatelets', 'antiplatelet agents'],
+    'antipsychotic': ['antipsychotics'],
+    'benzodiazepine': ['benzodiazepines'],
+    'beta blocker': ['beta blockers', 'beta-blocker', 'beta-blockers'],
+    'bisphosphonate': ['bisphosphonates'],
+    'calcium channel blocker': ['calcium channel blockers', 'ccb', 'ccbs'],
+    'carbapenem': ['carbapenems'],
+    'cephalosporin': ['cephalosporins'],
+    'corticosteroid': ['corticosteroids', 'glucocorticoid', 'glucocorticoids'],
+    'direct oral anticoagulant': ['direct oral anticoagulants', 'doac', 'doacs', 'noac', 'noacs'],
+    'dpp-4 inhibitor': ['dpp-4 inhibitors', 'gliptin', 'gliptins'],
+    'fluoroquinolone': ['fluoroquinolones', 'quinolone', 'quinolones'],
+    'glp-1 receptor agonist': ['glp-1 receptor agonists', 'glp-1 agonist', 'glp-1 agonists'],
+    'loop diuretic': ['loop diuretics'],
+    'macrolide': ['macrolides'],
+    'maoi': ['maois', 'monoamine oxidase inhibitor', 'monoamine oxidase inhibitors'],
+    'nsaid': ['nsaids', 'non-steroidal anti-inflammatory drug', 'non-steroidal anti-inflammatory drugs'],
+    'opioid': ['opioids', 'opiate', 'opiates'],
+    'penicillins': ['beta-lactam', 'beta-lactams'],
+    'proton pump inhibitor': ['proton pump inhibitors', 'ppi', 'ppis'],
+    'sglt2 inhibitor': ['sglt2 inhibitors', 'sglt-2 inhibitor', 'sglt-2 inhibitors', 'gliflozin', 'gliflozins'],
+    'snri': ['snris', 'serotonin-norepinephrine reuptake inhibitor', 'serotonin-norepinephrine reuptake inhibitors'],
+    'ssri': ['ssris', 'selective serotonin reuptake inhibitor', 'selective serotonin reuptake inhibitors'],
+    'statin': ['statins', 'hmg-coa reductase inhibitor', 'hmg-coa reductase inhibitors'],
+    'sulfonylurea': ['sulfonylureas', 'sulphonylurea', 'sulphonylureas'],
+    'tetracycline': ['tetracyclines'],
+    'thiazide diuretic': ['thiazide diuretics', 'thiazide', 'thiazides'],
+    'tricyclic antidepressant': ['tricyclic antidepressants', 'tca', 'tcas'],
+    'tyrosine kinase inhibitor': ['tyrosine kinase inhibitors', 'tki', 'tkis']
+}
+
+# Drug-metabolising enzymes and transporters
+ENZYMES: Dict[str, List[str]] = {
+    'cyp1a2': ['cytochrome p450 1a2'],
+    'cyp2b6': ['cytochrome p450 2b6'],
+    'cyp2c8': ['cytochrome p450 2c8'],
+    'cyp2c9': ['cytochrome p450 2c9'],
+    'cyp2c19': ['cytochrome p450 2c19'],
+    'cyp2d6': ['cytochrome p450 2d6'],
+    'cyp2e1': ['cytochrome p450 2e1'],
+    'cyp3a4': ['cytochrome p450 3a4', 'cyp3a'],
+    'cyp3a5': ['cytochrome p450 3a5'],
+    'ugt1a1': [],
+    'tpmt': ['thiopurine methyltransferase'],
+    'dpyd': ['dihydropyrimidine dehydrogenase', 'dpd'],
+    'nat2': ['n-acetyltransferase 2'],
+    'p-gp': ['p-glycoprotein', 'pgp', 'abcb1', 'mdr1'],
+    'bcrp': ['abcg2'],
+    'oatp1b1': ['slco1b1'],
+    'oatp1b3': ['slco1b3'],
+    'oct2': [],
+    'mao-a': ['monoamine oxidase a'],
+    'mao-b': ['monoamine oxidase b']
+}
+
+
+def _entries(prefix: str, names: Dict[str, List[str]]) -> Dict[str, List[str]]:
+    return {f"{prefix}:{name}": [name] + synonyms for name, synonyms in names.items()}
+
+
+def load_lexicon() -> Dict[str, List[str]]:
+    """Entity id -> surface forms, built-in entries plus any from PHARMGPT_PHARMA_LEXICON."""
+    lexicon = {}
+    lexicon.update(_entries('drug', DRUGS))
+    lexicon.update(_entries('class', DRUG_CLASSES))
+    lexicon.update(_entries('enzyme', ENZYMES))
+
+    if LEXICON_PATH:
+        try:
+            with open(LEXICON_PATH, "r", encoding="utf-8") as f:
+                for entity_id, synonyms in json.load(f).items():
+                    lexicon.setdefault(entity_id, []).extend(synonyms)
+            logger.info(f"Loaded extra lexicon entries from {LEXICON_PATH}")
+        except Exception as e:
+            logger.warning(f"Could not load pharmacology lexicon from {LEXICON_PATH}: {e}")
+
+    return lexicon
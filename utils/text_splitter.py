@@ -0,0 +1,147 @@
+"""
+Text Splitter for PharmGPT
+Recursive separator-based chunking over (start, end) offsets of the source text
+"""
+
+import re
+import logging
+from functools import lru_cache
+from typing import Callable, Iterator, List, Optional, Sequence, Tuple
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+DEFAULT_SEPARATORS = ["\n\n", "\n", " ", ""]
+
+Span = Tuple[int, int]
+
+
+@lru_cache(maxsize=64)
+def _separator_pattern(separator: str):
+    return re.compile(re.escape(separator))
+
+
+class TextSplitter:
+    """Drop-in replacement for LangChain's ``RecursiveCharacterTextSplitter``.
+
+    Produces the same chunks (separators tried in order, kept at the start of
+    the following piece, pieces merged up to ``chunk_size`` with
+    ``chunk_overlap``, whitespace stripped) but works on offsets into the
+    source string: no intermediate substrings are built, and chunk strings
+    are only created when asked for.
+
+    ``length_function`` measures a piece of text; by default lengths are
+    character counts computed from the offsets.
+    """
+
+    def __init__(self, chunk_size: int = 4000, chunk_overlap: int = 200,
+                 separators: Optional[Sequence[str]] = None,
+                 length_function: Optional[Callable[[str], int]] = None):
+        if chunk_size <= 0:
+            raise ValueError(f"chunk_size must be > 0, got {chunk_size}")
+        if chunk_overlap < 0:
+            raise ValueError(f"chunk_overlap must be >= 0, got {chunk_overlap}")
+        if chunk_overlap > chunk_size:
+            raise ValueError(
+                f"Got a larger chunk overlap ({chunk_overlap}) than chunk size ({chunk_size}), should be smaller."
+            )
+
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.separators = list(separators) if separators is not None else list(DEFAULT_SEPARATORS)
+        self.length_function = length_function
+
+    def _length(self, text: str, start: int, end: int) -> int:
+        if self.length_function is None:
+            return end - start
+        return self.length_function(text[start:end])
+
+    def split_spans(self, text: str) -> List[Span]:
+        """Split text into chunks, returned as (start, end) offsets into ``text``."""
+        spans: List[Span] = []
+        if text:
+            self._split(text, 0, len(text), self.separators, spans)
+        return spans
+
+    def iter_chunks(self, text: str) -> Iterator[str]:
+        """Yield chunk strings one at a time."""
+        for start, end in self.split_spans(text):
+            yield text[start:end]
+
+    def split_text(self, text: str) -> List[str]:
+        """Split text into chunk strings."""
+        return list(self.iter_chunks(text))
+
+    def _split(self, text: str, start: int, end: int, separators: List[str], spans: List[Span]):
+        """Recursively split text[start:end], appending chunk spans."""
+        # Use the first separator present in this range; finer ones are for oversized pieces
+        separator = separators[-1]
+        finer_separators: List[str] = []
+        for i, candidate in enumerate(separators):
+            if not candidate:
+                separator = candidate
+                break
+            if text.find(candidate, start, end) != -1:
+                separator = candidate
+                finer_separators = separators[i + 1:]
+                break
+
+        good_pieces: List[Span] = []
+        good_lengths: List[int] = []
+        for piece_start, piece_end in self._split_on_separator(text, start, end, separator):
+            length = self._length(text, piece_start, piece_end)
+            if length < self.chunk_size:
+                good_pieces.append((piece_start, piece_end))
+                good_lengths.append(length)
+                continue
+
+            if good_pieces:
+                self._merge(text, good_pieces, good_lengths, spans)
+                good_pieces, good_lengths = [], []
+            if finer_separators:
+                self._split(text, piece_start, piece_end, finer_separators, spans)
+            else:
+                # Nothing left to split on; emitted as is, like LangChain
+                spans.append((piece_start, piece_end))
+
+        if good_pieces:
+            self._merge(text, good_pieces, good_lengths, spans)
+
+    @staticmethod
+    def _split_on_separator(text: str, start: int, end: int, separator: str) -> List[Span]:
+        """Pieces of text[start:end] with each separator kept at the start of the next piece."""
+        if not separator:
+            return [(i, i + 1) for i in range(start, end)]
+
+        bounds = [start]
+        bounds.extend(match.start() for match in _separator_pattern(separator).finditer(text, start, end))
+        bounds.append(end)
+        return [(a, b) for a, b in zip(bounds, bounds[1:]) if b > a]
+
+    def _merge(self, text: str, pieces: List[Span], lengths: List[int], spans: List[Span]):
+        """Merge adjacent pieces into chunks of up to chunk_size with chunk_overlap."""
+        first = 0
+        total = 0
+        for i, length in enumerate(lengths):
+            if total + length > self.chunk_size:
+                if total > self.chunk_size:
+                    logger.warning(f"Created a chunk of size {total}, which is longer than the specified {self.chunk_size}")
+                if i > first:
+                    self._emit(text, pieces[first][0], pieces[i - 1][1], spans)
+                    # Drop pieces from the front until only the overlap remains and the next piece fits
+                    while total > self.chunk_overlap or (total + length > self.chunk_size and total > 0):
+                        total -= lengths[first]
+                        first += 1
+            total += length
+
+        self._emit(text, pieces[first][0], pieces[-1][1], spans)
+
+    @staticmethod
+    def _emit(text: str, start: int, end: int, spans: List[Span]):
+        """Append a chunk span with surrounding whitespace stripped, skipping blank chunks."""
+        while start < end and text[start].isspace():
+            start += 1
+        while end > start and text[end - 1].isspace():
+            end -= 1
+        if end > start:
+            spans.append((start, end))
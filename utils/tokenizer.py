@@ -0,0 +1,99 @@
+"""
+Tokenizer for PharmGPT
+Cached token counting for chunk sizing, embedding batches and prompt budgets
+"""
+
+import os
+import logging
+import threading
+from functools import lru_cache
+from typing import Callable, List, Optional
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Mistral's own tokenizer (mistral-common, pinned in requirements.txt, ships its model files),
+# else a close BPE (tiktoken, whose encodings are downloaded on first use), else a length heuristic
+TOKENIZER_ENCODING = os.getenv("PHARMGPT_TOKENIZER_ENCODING", "cl100k_base")
+TOKEN_COUNT_CACHE_SIZE = 65536
+TOKEN_COUNT_CACHE_MAX_CHARS = 8192  # Don't pin whole documents in the cache
+CHARS_PER_TOKEN = 4
+
+_encode: Optional[Callable[[str], List[int]]] = None
+_tokenizer_name: Optional[str] = None
+_tokenizer_lock = threading.Lock()
+
+
+def _load_tokenizer():
+    """Load the best available tokenizer once per process."""
+    global _encode, _tokenizer_name
+
+    try:
+        from mistral_common.tokens.tokenizers.mistral import MistralTokenizer
+        tokenizer = MistralTokenizer.v1().instruct_tokenizer.tokenizer
+        _encode = lambda text: tokenizer.encode(text, bos=False, eos=False)
+        _tokenizer_name = "mistral-v1"
+        return
+    except Exception as e:
+        logger.debug(f"Mistral tokenizer not available: {e}")
+
+    try:
+        import tiktoken
+        encoding = tiktoken.get_encoding(TOKENIZER_ENCODING)
+        _encode = lambda text: encoding.encode(text, disallowed_special=())
+        _tokenizer_name = f"tiktoken-{TOKENIZER_ENCODING}"
+        return
+    except Exception as e:
+        logger.debug(f"tiktoken encoding {TOKENIZER_ENCODING} not available: {e}")
+
+    _encode = None
+    _tokenizer_name = "estimate"
+    # Token-sized chunks and prompt budgets are then only approximate
+    logger.error(
+        f"No tokenizer available, estimating tokens as characters / {CHARS_PER_TOKEN}; "
+        "token-sized chunking and context packing are approximate. Install with: pip install mistral-common"
+    )
+
+
+def get_tokenizer_name() -> str:
+    """Name of the tokenizer used for counting."""
+    if _tokenizer_name is None:
+        with _tokenizer_lock:
+            if _tokenizer_name is None:
+                _load_tokenizer()
+    return _tokenizer_name
+
+
+def _count(text: str) -> int:
+    if get_tokenizer_name() == "estimate":
+        return max(1, len(text) // CHARS_PER_TOKEN) if text else 0
+    return len(_encode(text))
+
+
+@lru_cache(maxsize=TOKEN_COUNT_CACHE_SIZE)
+def _cached_count(text: str) -> int:
+    return _count(text)
+
+
+def count_tokens(text: str) -> int:
+    """Number of tokens in text.
+    
+    Counts of chunk-sized texts are cached: the splitter and the embedding
+    scheduler measure the same pieces repeatedly.
+    """
+    if len(text) > TOKEN_COUNT_CACHE_MAX_CHARS:
+        return _count(text)
+    return _cached_count(text)
+
+
+def get_tokenizer_stats() -> dict:
+    """Get tokenizer and count cache statistics."""
+    info = _cached_count.cache_info()
+    lookups = info.hits + info.misses
+    return {
+        'tokenizer': get_tokenizer_name(),
+        'cache_hits': info.hits,
+        'cache_misses': info.misses,
+        'cache_hit_rate': info.hits / lookups if lookups else 0.0,
+        'cache_entries': info.currsize
+    }
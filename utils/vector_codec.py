@@ -0,0 +1,109 @@
+"""
+Vector Codec for PharmGPT
+Compact wire formats for embeddings: pgvector text literals and packed base64 float32/float16
+"""
+
+import os
+import json
+import base64
+import logging
+from typing import Any, Dict, Optional, Sequence
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+    logger.warning("NumPy not available, packed vector transport disabled. Install with: pip install numpy")
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+# How embeddings are sent to Supabase:
+#   'literal' - pgvector text literal '[0.1,0.2,...]' (any schema)
+#   'f32'/'f16' - packed base64 in document_chunks.embedding_packed (needs vector_transport.sql)
+#   'json'    - JSON list of floats, as before
+TRANSPORTS = ('literal', 'f32', 'f16', 'json')
+PACKED_DTYPES = {'f32': '>f4', 'f16': '>f2'}  # Big-endian, as decoded by decode_packed_vector()
+PACKED_COLUMN = 'embedding_packed'
+EMBEDDING_COLUMNS = ('embedding', PACKED_COLUMN)
+
+VECTOR_TRANSPORT = os.getenv("PHARMGPT_VECTOR_TRANSPORT", "literal").lower()
+if VECTOR_TRANSPORT not in TRANSPORTS:
+    logger.warning(f"Unknown PHARMGPT_VECTOR_TRANSPORT '{VECTOR_TRANSPORT}', using 'literal'")
+    VECTOR_TRANSPORT = 'literal'
+elif VECTOR_TRANSPORT in PACKED_DTYPES and not NUMPY_AVAILABLE:
+    VECTOR_TRANSPORT = 'literal'
+
+
+def dumps(value: Any) -> str:
+    """Compact JSON text, encoded with orjson when it is installed."""
+    if ORJSON_AVAILABLE:
+        try:
+            return orjson.dumps(value, option=orjson.OPT_SERIALIZE_NUMPY).decode("utf-8")
+        except TypeError:
+            pass
+    return json.dumps(value, separators=(',', ':'), ensure_ascii=False)
+
+
+def format_vector(vector: Sequence[float]) -> str:
+    """pgvector text literal of a vector at float32 precision.
+
+    About half the size of a JSON list of Python floats, whose repr
+    spells out float64 digits the vector column discards anyway.
+    """
+    if ORJSON_AVAILABLE and NUMPY_AVAILABLE:
+        # Shortest repr that round-trips each float32
+        return orjson.dumps(np.asarray(vector, dtype=np.float32), option=orjson.OPT_SERIALIZE_NUMPY).decode("ascii")
+    return "[" + ",".join("%.9g" % value for value in vector) + "]"
+
+
+def pack_vector(vector: Sequence[float], dtype: str = 'f16') -> str:
+    """Vector as '<dtype>:<base64>', e.g. 'f16:...' for half precision."""
+    packed = np.asarray(vector, dtype=PACKED_DTYPES[dtype]).tobytes()
+    return f"{dtype}:{base64.b64encode(packed).decode('ascii')}"
+
+
+def unpack_vector(text: str) -> "np.ndarray":
+    """float32 array of a vector packed by ``pack_vector``."""
+    dtype, _, payload = text.partition(':')
+    if dtype not in PACKED_DTYPES:
+        raise ValueError(f"Unknown packed vector type '{dtype}'")
+    return np.frombuffer(base64.b64decode(payload), dtype=PACKED_DTYPES[dtype]).astype(np.float32)
+
+
+def parse_vector(value: Any) -> Optional[Sequence[float]]:
+    """Vector from a list, a pgvector literal or a packed string; None if empty or unreadable."""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        try:
+            if value[:4] in ('f32:', 'f16:'):
+                value = unpack_vector(value)
+            elif ORJSON_AVAILABLE:
+                value = orjson.loads(value)
+            else:
+                value = json.loads(value)
+        except ValueError:
+            return None
+    return value if len(value) else None
+
+
+def vector_param(vector: Sequence[float]) -> Any:
+    """A query vector as an RPC argument; pgvector parses the literal into its vector parameter."""
+    if VECTOR_TRANSPORT == 'json':
+        return list(vector)
+    return format_vector(vector)
+
+
+def embedding_columns(vector: Sequence[float]) -> Dict[str, Any]:
+    """Column(s) carrying a chunk embedding in a document_chunks insert."""
+    if VECTOR_TRANSPORT in PACKED_DTYPES:
+        return {PACKED_COLUMN: pack_vector(vector, VECTOR_TRANSPORT)}
+    return {'embedding': vector_param(vector)}
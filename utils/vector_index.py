@@ -0,0 +1,195 @@
+"""
+Vector Index for PharmGPT
+In-memory NumPy similarity search over the chunks of active conversations
+"""
+
+import os
+import logging
+import threading
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Hashable, List, Optional, Sequence
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+    logger.warning("NumPy not available, in-memory vector search disabled. Install with: pip install numpy")
+
+DEFAULT_MAX_MB = int(os.getenv("PHARMGPT_VECTOR_INDEX_MAX_MB", "256"))
+# Larger conversations are left to the pgvector index
+DEFAULT_MAX_CHUNKS = int(os.getenv("PHARMGPT_VECTOR_INDEX_MAX_CHUNKS", "20000"))
+
+
+class ConversationVectorIndex:
+    """Chunk embeddings of one conversation as a contiguous, row-normalised float32 matrix.
+
+    Rows are L2-normalised once at build time, so a search is a single
+    matrix-vector product giving cosine similarities, the same score the
+    ``search_document_chunks`` RPC returns.
+    """
+
+    def __init__(self, rows: Sequence[Dict], embeddings: Sequence[Sequence[float]]):
+        if len(rows) != len(embeddings):
+            raise ValueError(f"Got {len(rows)} rows for {len(embeddings)} embeddings")
+
+        self.rows = list(rows)
+        if self.rows:
+            matrix = np.asarray(embeddings, dtype=np.float32)
+        else:
+            matrix = np.zeros((0, 0), dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        matrix /= norms
+        self.matrix = np.ascontiguousarray(matrix)
+        self.document_ids = {row.get('document_id') for row in self.rows}
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate memory held by the index (matrix plus chunk text)."""
+        return self.matrix.nbytes + sum(len(row.get('content') or '') for row in self.rows)
+
+    def search(self, query_embedding: Sequence[float], similarity_threshold: float,
+               max_chunks: int) -> List[Dict]:
+        """Top ``max_chunks`` rows with cosine similarity >= threshold, best first."""
+        if not self.rows or max_chunks <= 0:
+            return []
+
+        query = np.asarray(query_embedding, dtype=np.float32)
+        if query.shape[0] != self.matrix.shape[1]:
+            raise ValueError(
+                f"Query has {query.shape[0]} dimensions, index has {self.matrix.shape[1]}"
+            )
+        norm = np.linalg.norm(query)
+        if norm == 0:
+            return []
+
+        scores = self.matrix @ (query / norm)
+        candidates = np.flatnonzero(scores >= similarity_threshold)
+        if len(candidates) > max_chunks:
+            top = np.argpartition(scores[candidates], -max_chunks)[-max_chunks:]
+            candidates = candidates[top]
+        candidates = candidates[np.argsort(-scores[candidates], kind='stable')]
+
+        return [{**self.rows[i], 'similarity': float(scores[i])} for i in candidates]
+
+
+class VectorIndexCache:
+    """LRU cache of per-conversation vector indexes bounded by total memory.
+
+    Indexes are built on first search and dropped when the conversation's
+    documents change. An index whose load overlapped an invalidation is
+    returned to its caller but not cached, so a stale index never outlives
+    the upload or delete that made it stale.
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_MB * 1024 * 1024,
+                 max_chunks: int = DEFAULT_MAX_CHUNKS):
+        self.max_bytes = max_bytes
+        self.max_chunks = max_chunks
+        self.enabled = NUMPY_AVAILABLE and max_bytes > 0 and max_chunks > 0
+
+        # key -> index (None when the conversation is too large to hold), least recently used first
+        self._indexes: "OrderedDict[Hashable, Optional[ConversationVectorIndex]]" = OrderedDict()
+        self._total_bytes = 0
+        # Bumped by every invalidation; loads that saw it change are not cached
+        self._generation = 0
+        self._lock = threading.Lock()
+        self.stats = {
+            'hits': 0,
+            'misses': 0,
+            'loads': 0,
+            'oversized': 0,
+            'invalidations': 0,
+            'evictions': 0
+        }
+
+    def _drop(self, key: Hashable):
+        index = self._indexes.pop(key, None)
+        if index is not None:
+            self._total_bytes -= index.nbytes
+
+    def _evict(self):
+        """Drop least recently used indexes until the memory cap is met."""
+        while self._indexes and self._total_bytes > self.max_bytes:
+            _, index = self._indexes.popitem(last=False)
+            if index is not None:
+                self._total_bytes -= index.nbytes
+            self.stats['evictions'] += 1
+
+    async def get_or_load(self, key: Hashable,
+                          load: Callable[[], Awaitable[Optional[ConversationVectorIndex]]]
+                          ) -> Optional[ConversationVectorIndex]:
+        """Return the cached index for ``key`` or build it with ``load()``.
+
+        Returns None when the cache is disabled, the conversation is too
+        large or the index could not be built; callers then fall back to the
+        database search.
+        """
+        if not self.enabled:
+            return None
+
+        with self._lock:
+            if key in self._indexes:
+                self._indexes.move_to_end(key)
+                self.stats['hits'] += 1
+                return self._indexes[key]
+            generation = self._generation
+        self.stats['misses'] += 1
+
+        index = await load()
+        if index is None:
+            return None
+        self.stats['loads'] += 1
+
+        if len(index) > self.max_chunks or index.nbytes > self.max_bytes:
+            logger.info(f"Not caching vector index of {len(index)} chunks ({index.nbytes} bytes): over the limits")
+            self.stats['oversized'] += 1
+            index = None
+
+        with self._lock:
+            if self._generation == generation:
+                self._drop(key)
+                self._indexes[key] = index
+                if index is not None:
+                    self._total_bytes += index.nbytes
+                self._evict()
+        return index
+
+    def invalidate(self, key: Hashable):
+        """Drop the index for ``key``, e.g. after a document was added to the conversation."""
+        with self._lock:
+            self._generation += 1
+            self._drop(key)
+            self.stats['invalidations'] += 1
+
+    def invalidate_document(self, document_id: str):
+        """Drop every index that may hold chunks of ``document_id``."""
+        with self._lock:
+            self._generation += 1
+            for key, index in list(self._indexes.items()):
+                # Oversized entries hold no chunk list, so they are dropped too
+                if index is None or document_id in index.document_ids:
+                    self._drop(key)
+            self.stats['invalidations'] += 1
+
+    def get_stats(self) -> Dict:
+        """Get cache statistics including hit rate."""
+        stats = self.stats.copy()
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        stats['enabled'] = self.enabled
+        with self._lock:
+            stats['indexes'] = sum(1 for index in self._indexes.values() if index is not None)
+            stats['bytes'] = self._total_bytes
+        return stats
+
+
+# Global vector index cache
+vector_index_cache = VectorIndexCache()
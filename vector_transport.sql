@@ -0,0 +1,55 @@
+-- PharmGPT packed vector transport
+-- Run in the Supabase SQL Editor, then set PHARMGPT_VECTOR_TRANSPORT=f16 (or f32)
+
+-- Decode a vector packed by utils/vector_codec.pack_vector: 'f32:' or 'f16:'
+-- followed by base64 of big-endian IEEE 754 floats
+CREATE OR REPLACE FUNCTION decode_packed_vector(packed TEXT)
+RETURNS vector
+LANGUAGE sql
+IMMUTABLE
+STRICT
+AS $$
+    SELECT array_agg(
+        CASE WHEN w.bits >> (f.e + f.m) = 1 THEN -1 ELSE 1 END
+        * CASE WHEN (w.bits >> f.m) & ((1 << f.e) - 1) = 0
+               -- Zero and subnormals
+               THEN (w.bits & ((1 << f.m) - 1)) * power(2::float8, 1 - f.bias - f.m)
+               ELSE (1 + (w.bits & ((1 << f.m) - 1)) / power(2::float8, f.m))
+                    * power(2::float8, ((w.bits >> f.m) & ((1 << f.e) - 1)) - f.bias)
+          END
+        ORDER BY w.n
+    )::real[]::vector
+    FROM (
+        SELECT decode(substr(packed, 5), 'base64') AS bytes,
+               CASE left(packed, 4) WHEN 'f16:' THEN 2 ELSE 4 END AS width,
+               CASE left(packed, 4) WHEN 'f16:' THEN 5 ELSE 8 END AS e,
+               CASE left(packed, 4) WHEN 'f16:' THEN 10 ELSE 23 END AS m,
+               CASE left(packed, 4) WHEN 'f16:' THEN 15 ELSE 127 END AS bias
+    ) f
+    CROSS JOIN LATERAL (
+        SELECT n,
+               ('x' || lpad(encode(substring(f.bytes FROM n * f.width + 1 FOR f.width), 'hex'), 16, '0'))::bit(64)::bigint AS bits
+        FROM generate_series(0, length(f.bytes) / f.width - 1) AS n
+    ) w
+$$;
+
+-- Inserts may carry the embedding packed; it is decoded into the vector column
+ALTER TABLE document_chunks ADD COLUMN IF NOT EXISTS embedding_packed TEXT;
+
+CREATE OR REPLACE FUNCTION unpack_chunk_embedding()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    IF NEW.embedding_packed IS NOT NULL THEN
+        NEW.embedding := decode_packed_vector(NEW.embedding_packed);
+        NEW.embedding_packed := NULL;
+    END IF;
+    RETURN NEW;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS unpack_chunk_embedding ON document_chunks;
+CREATE TRIGGER unpack_chunk_embedding
+    BEFORE INSERT OR UPDATE ON document_chunks
+    FOR EACH ROW EXECUTE FUNCTION unpack_chunk_embedding();